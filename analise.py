@@ -0,0 +1,101 @@
+from sqlalchemy import Integer, case, func, literal, select
+from models import db, ResumoMensal
+from relatorio import MESES_NOMES
+
+# Comparação entre períodos (/geral/analise): crescimento mês a mês e ano a ano, comissão
+# acumulada em 12 meses e melhor/pior mês, calculados no banco com funções de janela
+# sobre o resumo mensal, numa query só (SQLite >= 3.25 e PostgreSQL).
+#
+# Meses são numerados como ano * 12 + mes - 1. A série é densa (meses sem lançamento entram
+# com 0), senão LAG(..., 12) e a janela de 12 linhas pulariam meses.
+
+MESES_PADRAO = 12
+MAX_MESES = 120
+
+
+def _indice(ano, mes):
+    return ano * 12 + mes - 1
+
+
+def _consulta(user_id, primeiro, ultimo):
+    indice = (ResumoMensal.ano * 12 + ResumoMensal.mes - 1).label('indice')
+    do_usuario = ResumoMensal.user_id == user_id
+    primeiro = literal(primeiro, Integer)
+    ultimo = literal(ultimo, Integer)
+
+    # Todos os meses desde o início do histórico (ou do período, se for anterior) até o fim do período
+    inicio_historico = func.coalesce(func.min(indice), primeiro)
+    meses = select(case((inicio_historico < primeiro, inicio_historico), else_=primeiro).label('indice')
+                   ).where(do_usuario).cte('meses', recursive=True)
+    meses = meses.union_all(select((meses.c.indice + 1).label('indice')).where(meses.c.indice < ultimo))
+
+    totais = select(indice, func.sum(ResumoMensal.qtd).label('qtd'),
+                    func.sum(ResumoMensal.bruto_centavos).label('bruto'),
+                    func.sum(ResumoMensal.comissao_centavos).label('comissao'),
+                    ).where(do_usuario).group_by(ResumoMensal.ano, ResumoMensal.mes).subquery()
+
+    serie = select(meses.c.indice, func.coalesce(totais.c.qtd, 0).label('qtd'),
+                   func.coalesce(totais.c.bruto, 0).label('bruto'),
+                   func.coalesce(totais.c.comissao, 0).label('comissao'),
+                   ).select_from(meses.outerjoin(totais, totais.c.indice == meses.c.indice)).subquery()
+
+    # Janelas sobre a série inteira, para que o começo do período tenha mês/ano anterior
+    ordem = serie.c.indice
+    janela = select(
+        serie,
+        func.lag(serie.c.comissao, 1).over(order_by=ordem).label('mes_anterior'),
+        func.lag(serie.c.comissao, 12).over(order_by=ordem).label('ano_anterior'),
+        func.sum(serie.c.comissao).over(order_by=ordem, rows=(-11, 0)).label('acumulado_12m'),
+        func.count().over(order_by=ordem, rows=(-11, 0)).label('meses_12m'),
+    ).subquery()
+
+    def crescimento(anterior):
+        return ((janela.c.comissao - anterior) * 100.0 / func.nullif(anterior, 0))
+
+    # Ranking e total só entre os meses do período (a janela roda depois do WHERE)
+    return select(
+        janela.c.indice, janela.c.qtd, janela.c.bruto, janela.c.comissao,
+        janela.c.mes_anterior, janela.c.ano_anterior, janela.c.acumulado_12m, janela.c.meses_12m,
+        crescimento(janela.c.mes_anterior).label('crescimento_mes'),
+        crescimento(janela.c.ano_anterior).label('crescimento_ano'),
+        func.rank().over(order_by=janela.c.comissao.desc()).label('posicao'),
+        func.sum(janela.c.comissao).over().label('total_periodo'),
+    ).where(janela.c.indice >= primeiro, janela.c.indice <= ultimo).order_by(janela.c.indice)
+
+
+def _percentual(valor):
+    return None if valor is None else round(float(valor), 1)
+
+
+def montar(user_id, ano, mes, meses=MESES_PADRAO):
+    """Os `meses` meses terminados em mes/ano, com comparações e acumulados. Valores em centavos."""
+    ultimo = _indice(ano, mes)
+    primeiro = ultimo - meses + 1
+    linhas = []
+    total = 0
+    for row in db.session.execute(_consulta(user_id, primeiro, ultimo)):
+        a, m = divmod(row.indice, 12)
+        m += 1
+        total = int(row.total_periodo or 0)
+        linhas.append({
+            'ano': a, 'mes': m, 'label': f'{MESES_NOMES[m]}/{a}',
+            'qtd': int(row.qtd), 'bruto': int(row.bruto), 'comissao': int(row.comissao),
+            'mes_anterior': None if row.mes_anterior is None else int(row.mes_anterior),
+            'ano_anterior': None if row.ano_anterior is None else int(row.ano_anterior),
+            'crescimento_mes': _percentual(row.crescimento_mes),
+            'crescimento_ano': _percentual(row.crescimento_ano),
+            # Só é um acumulado de 12 meses quando o histórico já tem 12 meses até aqui
+            'acumulado_12m': int(row.acumulado_12m) if row.meses_12m == 12 else None,
+            'posicao': int(row.posicao),
+        })
+    # Empates: o mês mais recente
+    melhor = max(linhas, key=lambda l: (-l['posicao'], l['ano'], l['mes']), default=None)
+    pior = max(linhas, key=lambda l: (l['posicao'], l['ano'], l['mes']), default=None)
+    return {
+        'inicio': {'ano': primeiro // 12, 'mes': primeiro % 12 + 1},
+        'fim': {'ano': ano, 'mes': mes},
+        'meses': linhas,
+        'total': total,
+        'melhor': melhor,
+        'pior': pior,
+    }
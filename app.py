@@ -1,26 +1,212 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, make_response, Response, stream_with_context, jsonify, send_file
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from sqlalchemy import func, extract
+from sqlalchemy import func, or_
 from config import Config
-from models import db, User, Vendas, Cobrancas, Consultas, Procedimentos
-from datetime import datetime
-from collections import defaultdict
+from models import db, User, Vendas, Cobrancas, Consultas, Procedimentos, Tarefa
+from datetime import datetime, timedelta
+import click
+import logging
+import os
+import resumo
+import periodos
+import relatorio
+import analise
+import paginacao
+import comissoes
+import dinheiro
+import importacao
+import lancamentos
+import em_lote
+import sincronizacao
+import exportacao
+import busca
+import equipe
+import tarefas
+import arquivo
+from cache import cache
+import cache as cache_dashboard
+import identidade
+import senhas
+import migracoes
+import banco
+import replica
+from metricas import metricas
+import metricas as instrumentacao
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+banco.init_app(app)
 db.init_app(app)
+cache_dashboard.init_app(app)
+instrumentacao.init_app(app)
+senhas.init_app(app)
+tarefas.init_app(app)
+dinheiro.init_app(app)
+replica.init_app(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+identidade.configurar(app.config['IDENTIDADE_MAX_ITENS'], app.config['IDENTIDADE_TTL'])
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-@app.before_request
-def create_tables():
-    app.before_request_funcs[None].remove(create_tables)
-    db.create_all()
+    # Resolve o usuário pela sessão/cache em memória; só consulta o banco quando expira
+    return identidade.carregar(user_id)
+
+@app.cli.command('migrar')
+@click.option('--status', is_flag=True, help='Só lista as migrações pendentes.')
+@click.option('--simular', is_flag=True, help='Mostra o que seria feito (linhas a preencher, DDL) sem gravar nada.')
+@click.option('--lote', type=int, default=None, help='Linhas por lote nos preenchimentos (padrão MIGRACAO_LOTE).')
+@click.option('--pausa', type=float, default=None, help='Segundos de pausa entre lotes (padrão MIGRACAO_PAUSA).')
+@click.option('--offline', is_flag=True, help='Roda também os passos que bloqueiam as escritas (aplicação parada).')
+def migrar(status, simular, lote, pausa, offline):
+    """Aplica as migrações pendentes (roda uma vez no deploy, antes dos workers).
+
+    Preenchimentos rodam em lotes curtos e retomam de onde pararam se a execução for interrompida.
+    Passos que bloqueiam as escritas ficam para "flask migrar --offline", com a aplicação parada.
+    """
+    if status:
+        for versao, descricao, _ in migracoes.pendentes():
+            click.echo(f'pendente [{versao}] {descricao}')
+        return
+    if lote:
+        app.config['MIGRACAO_LOTE'] = lote
+    if pausa is not None:
+        app.config['MIGRACAO_PAUSA'] = pausa
+    if simular:
+        pendentes = migracoes.simular(click.echo)
+        click.echo(f'{pendentes} migração(ões) pendente(s); nada foi gravado.' if pendentes else 'Esquema já está atualizado.')
+        return
+    aplicadas = migracoes.aplicar(click.echo, offline=offline)
+    click.echo(f'{aplicadas} migração(ões) aplicada(s).' if aplicadas else 'Esquema já está atualizado.')
+
+@app.cli.command('rebuild-resumo')
+@click.option('--user-id', type=int, default=None, help='Reconstrói apenas este usuário.')
+def rebuild_resumo(user_id):
+    """Recalcula a tabela resumo_mensal a partir das quatro tabelas."""
+    resumo.reconstruir(user_id)
+    click.echo('Resumo mensal reconstruído.')
+
+@app.cli.command('check-resumo')
+@click.option('--user-id', type=int, default=None, help='Verifica apenas este usuário.')
+def check_resumo(user_id):
+    """Verifica se resumo_mensal bate com as tabelas de origem."""
+    divergencias = resumo.verificar(user_id)
+    for (uid, ano, mes, categoria), esperado, atual in divergencias:
+        click.echo(f'[user {uid}] {mes:02d}/{ano} {categoria}: esperado={esperado} atual={atual}')
+    if divergencias:
+        raise SystemExit(f'{len(divergencias)} divergência(s) encontrada(s). Rode "flask rebuild-resumo".')
+    click.echo('Resumo mensal consistente.')
+
+@app.cli.command('check-lancamentos')
+@click.option('--corrigir', is_flag=True, help='Copia para o livro os itens que faltam (ou refaz tudo se preciso).')
+def check_lancamentos(corrigir):
+    """Verifica se o livro de lançamentos bate com as tabelas das categorias."""
+    divergencias = lancamentos.verificar()
+    for categoria, esperado, atual in divergencias:
+        click.echo(f'{categoria}: esperado={esperado} atual={atual}')
+    if divergencias and corrigir:
+        # Itens gravados por processos antigos durante o deploy: primeiro só os que faltam
+        lancamentos.preencher(click.echo)
+        if lancamentos.verificar():
+            lancamentos.reconstruir()
+        click.echo('Livro de lançamentos corrigido.')
+        return
+    if divergencias:
+        raise SystemExit(f'{len(divergencias)} divergência(s) encontrada(s). Rode "flask check-lancamentos --corrigir".')
+    click.echo('Livro de lançamentos consistente.')
+
+@app.cli.command('regras')
+def regras_cli():
+    """Lista as regras de comissão cadastradas."""
+    for categoria, lista in comissoes.regras().items():
+        for tipo, modo, taxa, divisor, desde in lista:
+            taxa = taxa / comissoes.ESCALA_TAXA
+            formula = f'{taxa:.2f} fixo' if modo == 'fixo' else f'valor / {divisor} * {taxa:g}'
+            click.echo(f'{categoria:<14} {tipo or "(todos)":<12} desde {desde}: {formula}')
+
+@app.cli.command('nova-regra')
+@click.option('--categoria', type=click.Choice(list(resumo.CATEGORIAS)), required=True)
+@click.option('--tipo', default=None, help='Tipo de venda/procedimento; omitido vale para todos.')
+@click.option('--modo', type=click.Choice(['percentual', 'fixo']), required=True)
+@click.option('--taxa', type=float, required=True, help='Percentual (0.05 = 5%) ou valor fixo.')
+@click.option('--divisor', type=int, default=1, help='Divide o valor antes da taxa (PIX usa 12).')
+@click.option('--desde', type=click.DateTime(['%Y-%m-%d']), required=True, help='Início da vigência.')
+def nova_regra(categoria, tipo, modo, taxa, divisor, desde):
+    """Cadastra uma regra de comissão (não altera o histórico; use 'flask recalcular')."""
+    comissoes.adicionar_regra(categoria, tipo, modo, taxa, desde.date(), divisor)
+    click.echo('Regra cadastrada.')
+
+@app.cli.command('recalcular')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), required=True)
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), required=True, help='Data final (inclusive).')
+@click.option('--user-id', type=int, default=None)
+@click.option('--categoria', type=click.Choice(list(resumo.CATEGORIAS)), default=None)
+def recalcular(inicio, fim, user_id, categoria):
+    """Reaplica as regras vigentes às comissões do período e atualiza o resumo mensal."""
+    alteradas = comissoes.recalcular_periodo(inicio.date(), fim.date() + timedelta(days=1), user_id, categoria)
+    db.session.commit()
+    click.echo(f'{alteradas} item(ns) recalculado(s).')
+
+@app.cli.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--categoria', type=click.Choice(list(importacao.LAYOUTS)), required=True)
+@click.option('--user-id', type=int, required=True, help='Usuário dono dos registros.')
+@click.option('--estrito', is_flag=True, help='Não grava nada se alguma linha tiver erro.')
+def importar_cli(arquivo, categoria, user_id, estrito):
+    """Importa um CSV/XLSX de vendas ou cobranças."""
+    with open(arquivo, 'rb') as f:
+        try:
+            inseridos, erros = importacao.importar_arquivo(categoria, user_id, f, arquivo, estrito)
+        except importacao.ErroImportacao as e:
+            raise SystemExit(str(e))
+    for numero, erro in erros:
+        click.echo(f'Linha {numero}: {erro}')
+    click.echo(f'{inseridos} registro(s) importado(s), {len(erros)} linha(s) com erro.')
+
+@app.cli.command('arquivar')
+@click.option('--ano', type=int, required=True, help='Ano fechado a mover para as tabelas de arquivo.')
+@click.option('--restaurar', is_flag=True, help='Devolve o ano arquivado para as tabelas de uso diário.')
+def arquivar_cli(ano, restaurar):
+    """Arquiva (ou restaura) os itens de um ano fechado; os totais continuam no resumo mensal."""
+    try:
+        if restaurar:
+            linhas = arquivo.restaurar_ano(ano, log=click.echo)
+        else:
+            linhas = arquivo.arquivar_ano(ano, log=click.echo)
+    except arquivo.ErroArquivo as e:
+        raise SystemExit(str(e))
+    click.echo(f'{ano}: {linhas} linha(s) {"restaurada(s)" if restaurar else "arquivada(s)"}.')
+    click.echo(f'Anos arquivados: {", ".join(map(str, arquivo.anos_arquivados())) or "nenhum"}')
+
+@app.cli.command('worker')
+@click.option('--intervalo', type=float, default=2.0, help='Segundos entre consultas à fila vazia.')
+@click.option('--uma-vez', is_flag=True, help='Esvazia a fila e termina.')
+def worker_cli(intervalo, uma_vez):
+    """Executa as tarefas em segundo plano (rode ao lado do gunicorn)."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    tarefas.rodar_worker(intervalo=intervalo, uma_vez=uma_vez)
+
+@app.cli.command('tarefa')
+@click.argument('tipo', type=click.Choice(sorted(tarefas.TIPOS)))
+@click.argument('parametros', nargs=-1)
+@click.option('--user-id', type=int, default=None, help='Dono da tarefa (padrão: sistema).')
+def tarefa_cli(tipo, parametros, user_id):
+    """Enfileira uma tarefa. Parâmetros como nome=valor (ex.: ano=2024)."""
+    valores = dict(p.split('=', 1) for p in parametros)
+    item = tarefas.enfileirar(tipo, user_id, **valores)
+    click.echo(f'Tarefa {item.id} enfileirada.')
+
+@app.cli.command('explain-periodos')
+def explain_periodos():
+    """Mostra o plano de execução do filtro mensal em cada tabela (deve usar o índice)."""
+    agora = datetime.now()
+    for categoria, (model, col_data, _) in resumo.CATEGORIAS.items():
+        query = model.query.filter_by(user_id=1).filter(periodos.no_mes(getattr(model, col_data), agora.year, agora.month))
+        click.echo(f'--- {categoria} ---')
+        for linha in periodos.plano(query):
+            click.echo(f'  {linha}')
 
 # --- Rotas de Autenticação ---
 
@@ -30,13 +216,32 @@ def login():
         full_name = request.form.get('full_name').strip()
         password = request.form.get('password')
         
+        if senhas.bloqueado(full_name):
+            flash('Muitas tentativas com senha errada. Aguarde alguns minutos e tente novamente.')
+            return render_template('login.html'), 429
+
         # Busca pelo Full Name (mapeado para username no DB)
         user = User.query.filter_by(username=full_name).first()
-        
-        if user and user.check_password(password):
+
+        try:
+            senha_ok = user is not None and user.check_password(password)
+        except senhas.Ocupado:
+            flash('Muitos acessos neste momento. Tente novamente em alguns segundos.')
+            return render_template('login.html'), 503
+
+        if senha_ok:
+            senhas.acertou(full_name)
+            # Hash gerado com parâmetros antigos: refaz com os atuais (best effort)
+            try:
+                if user.atualizar_hash(password):
+                    db.session.commit()
+            except senhas.Ocupado:
+                pass
             login_user(user, remember=True) # ATENÇÃO: remember=True mantém logado
+            identidade.entrou(user)
             return redirect(url_for('home'))
-            
+
+        senhas.falhou(full_name)
         flash('Nome ou senha inválidos. Verifique se digitou o Nome Completo igual ao cadastro.')
     return render_template('login.html')
 
@@ -58,7 +263,11 @@ def register():
             
         # Cria usuario (username = full_name)
         new_user = User(username=full_name, full_name=full_name)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except senhas.Ocupado:
+            flash('Muitos acessos neste momento. Tente novamente em alguns segundos.')
+            return redirect(url_for('register'))
         db.session.add(new_user)
         db.session.commit()
         
@@ -96,8 +305,13 @@ def recover_password():
 
         # 3. Se for etapa de Reset
         if step == 'reset' and new_password:
-            user.set_password(new_password)
+            try:
+                user.set_password(new_password)
+            except senhas.Ocupado:
+                flash('Muitos acessos neste momento. Tente novamente em alguns segundos.')
+                return render_template('recover_password.html', valid_user=user, email_attempt=email)
             db.session.commit()
+            identidade.senha_alterada(user)
             flash('Senha redefinida com sucesso! Faça login.')
             return redirect(url_for('login'))
 
@@ -116,82 +330,22 @@ def logout():
 
 @app.route('/')
 @login_required
+@replica.leitura
 def home():
     agora = datetime.now()
     mes_atual = agora.month
     ano_atual = agora.year
 
-    # Calcular Total do Mês Atual
-    t_vendas = db.session.query(func.sum(Vendas.comissao_calculada)).filter_by(user_id=current_user.id).filter(extract('month', Vendas.data_venda) == mes_atual, extract('year', Vendas.data_venda) == ano_atual).scalar() or 0
-    t_cobrancas = db.session.query(func.sum(Cobrancas.comissao_calculada)).filter_by(user_id=current_user.id).filter(extract('month', Cobrancas.data_negociacao) == mes_atual, extract('year', Cobrancas.data_negociacao) == ano_atual).scalar() or 0
-    t_consultas = db.session.query(func.sum(Consultas.comissao_calculada)).filter_by(user_id=current_user.id).filter(extract('month', Consultas.data_consulta) == mes_atual, extract('year', Consultas.data_consulta) == ano_atual).scalar() or 0
-    t_procedimentos = db.session.query(func.sum(Procedimentos.comissao_calculada)).filter_by(user_id=current_user.id).filter(extract('month', Procedimentos.data_procedimento) == mes_atual, extract('year', Procedimentos.data_procedimento) == ano_atual).scalar() or 0
-    
-    total_mes_atual = t_vendas + t_cobrancas + t_consultas + t_procedimentos
+    # Calcular Total do Mês Atual (lido do resumo mensal)
+    total_mes_atual = cache.obter(current_user.id, 'home', (ano_atual, mes_atual),
+                                  lambda: resumo.total_mes(current_user.id, ano_atual, mes_atual))
 
     return render_template('home.html', agora=agora, total_mes_atual=total_mes_atual)
 
 @app.route('/geral')
 @login_required
+@replica.leitura
 def relatorios():
-    # 1. Total Geral Acumulado
-    tv = db.session.query(func.sum(Vendas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    tcb = db.session.query(func.sum(Cobrancas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    tcs = db.session.query(func.sum(Consultas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    tp = db.session.query(func.sum(Procedimentos.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    total_acumulado_geral = tv + tcb + tcs + tp
-
-    # Totais Brutos (Volume Transacionado) - Onde aplicável
-    tv_bruto = db.session.query(func.sum(Vendas.valor_total)).filter_by(user_id=current_user.id).scalar() or 0
-    tcb_bruto = db.session.query(func.sum(Cobrancas.valor_negociado)).filter_by(user_id=current_user.id).scalar() or 0
-
-    # Contagens Gerais
-    qv = Vendas.query.filter_by(user_id=current_user.id).count()
-    qcb = Cobrancas.query.filter_by(user_id=current_user.id).count()
-    qcs = Consultas.query.filter_by(user_id=current_user.id).count()
-    qp = Procedimentos.query.filter_by(user_id=current_user.id).count()
-    total_itens_geral = qv + qcb + qcs + qp
-    
-    resumo_geral = {
-        'vendas': {'qtd': qv, 'val': tv, 'bruto': tv_bruto},
-        'cobrancas': {'qtd': qcb, 'val': tcb, 'bruto': tcb_bruto},
-        'consultas': {'qtd': qcs, 'val': tcs, 'bruto': 0},
-        'procedimentos': {'qtd': qp, 'val': tp, 'bruto': 0}
-    }
-
-    # 2. Agrupamento por Mês
-    historico = defaultdict(float)
-    def agregar(model, date_col):
-        # Solução compatível com SQLite e PostgreSQL (evita func.strftime)
-        results = db.session.query(
-            extract('year', date_col).label('ano'),
-            extract('month', date_col).label('mes'),
-            func.sum(model.comissao_calculada)
-        ).filter_by(user_id=current_user.id).group_by(extract('year', date_col), extract('month', date_col)).all()
-        
-        for ano, mes, valor in results:
-            if ano and mes:
-                mes_ano = f"{int(ano)}-{int(mes):02d}"
-                historico[mes_ano] += float(valor)
-
-    agregar(Vendas, Vendas.data_venda)
-    agregar(Cobrancas, Cobrancas.data_negociacao)
-    agregar(Consultas, Consultas.data_consulta)
-    agregar(Procedimentos, Procedimentos.data_procedimento)
-
-    historico_ordenado = sorted(historico.items(), key=lambda x: x[0], reverse=True)
-    
-    lista_historico = []
-    meses_nomes = {1:'Janeiro', 2:'Fevereiro', 3:'Março', 4:'Abril', 5:'Maio', 6:'Junho', 7:'Julho', 8:'Agosto', 9:'Setembro', 10:'Outubro', 11:'Novembro', 12:'Dezembro'}
-    
-    for ym, valor in historico_ordenado:
-        ano, mes = map(int, ym.split('-'))
-        lista_historico.append({
-            'label': f"{meses_nomes[mes]}/{ano}",
-            'total': valor,
-            'mes': mes, 'ano': ano
-        })
-
     # Filtro
     mes_filtro = request.args.get('mes', type=int)
     ano_filtro = request.args.get('ano', type=int)
@@ -199,51 +353,245 @@ def relatorios():
         agora = datetime.now()
         mes_filtro = agora.month
         ano_filtro = agora.year
-    
-    detalhes = {
-        'vendas': Vendas.query.filter_by(user_id=current_user.id).filter(extract('month', Vendas.data_venda) == mes_filtro, extract('year', Vendas.data_venda) == ano_filtro).all(),
-        'cobrancas': Cobrancas.query.filter_by(user_id=current_user.id).filter(extract('month', Cobrancas.data_negociacao) == mes_filtro, extract('year', Cobrancas.data_negociacao) == ano_filtro).all(),
-        'consultas': Consultas.query.filter_by(user_id=current_user.id).filter(extract('month', Consultas.data_consulta) == mes_filtro, extract('year', Consultas.data_consulta) == ano_filtro).all(),
-        'procedimentos': Procedimentos.query.filter_by(user_id=current_user.id).filter(extract('month', Procedimentos.data_procedimento) == mes_filtro, extract('year', Procedimentos.data_procedimento) == ano_filtro).all(),
-    }
-    
-    total_mes_selecionado = historico.get(f"{ano_filtro:04d}-{mes_filtro:02d}", 0.0)
+    try:
+        periodos.validar(ano_filtro, mes_filtro)
+    except ValueError:
+        abort(400)
+
+    # Resumo geral, histórico mensal e detalhes do mês em duas queries
+    dados = cache.obter(current_user.id, 'geral', (ano_filtro, mes_filtro),
+                        lambda: relatorio.montar(current_user.id, ano_filtro, mes_filtro))
 
     return render_template('relatorios.html', 
-                           total_acumulado_geral=total_acumulado_geral,
-                           total_itens_geral=total_itens_geral,
-                           resumo_geral=resumo_geral,
-                           lista_historico=lista_historico,
-                           detalhes=detalhes,
-                           filtro={'mes': mes_filtro, 'ano': ano_filtro, 'total': total_mes_selecionado})
+                           total_acumulado_geral=dados['total_acumulado_geral'],
+                           total_itens_geral=dados['total_itens_geral'],
+                           resumo_geral=dados['resumo_geral'],
+                           lista_historico=dados['lista_historico'],
+                           detalhes=dados['detalhes'],
+                           filtro={'mes': mes_filtro, 'ano': ano_filtro, 'total': dados['total_mes']})
+
+@app.route('/geral/analise')
+@login_required
+@replica.leitura
+def analise_periodo():
+    # Crescimento mês a mês e ano a ano, acumulado de 12 meses e melhor/pior mês (JSON do gráfico do /geral)
+    # ?ano=&mes= (último mês do período, padrão o mês atual) &meses= (tamanho do período)
+    agora = datetime.now()
+    mes = request.args.get('mes', type=int) or agora.month
+    ano = request.args.get('ano', type=int) or agora.year
+    meses = request.args.get('meses', analise.MESES_PADRAO, type=int)
+    if not 1 <= mes <= 12 or not 1 <= ano <= 9999 or not 1 <= meses <= analise.MAX_MESES:
+        abort(400)
+    dados = cache.obter(current_user.id, 'analise', (ano, mes, meses),
+                        lambda: analise.montar(current_user.id, ano, mes, meses))
+
+    def em_reais(linha):
+        if linha is None:
+            return None
+        return dict(linha, **{campo: linha[campo] / 100 for campo in
+                              ('bruto', 'comissao', 'mes_anterior', 'ano_anterior', 'acumulado_12m')
+                              if linha[campo] is not None})
+
+    return jsonify(dict(dados, total=dados['total'] / 100, meses=[em_reais(l) for l in dados['meses']],
+                        melhor=em_reais(dados['melhor']), pior=em_reais(dados['pior'])))
+
+def listar_pagina(categoria):
+    # Uma página (keyset em data, id) da lista do usuário; o cursor vem da query string
+    model, col_data, _ = resumo.CATEGORIAS[categoria]
+    query = model.query.filter_by(user_id=current_user.id)
+    return paginacao.pagina(query, getattr(model, col_data), model.id,
+                            cursor=request.args.get('cursor'), tamanho=app.config['PAGE_SIZE'])
+
+def totais_da_lista(categoria):
+    return cache.obter(current_user.id, 'totais', categoria,
+                       lambda: resumo.totais_categoria(current_user.id, categoria))
+
+@app.route('/<categoria>/mais')
+@login_required
+@replica.leitura
+def lista_mais(categoria):
+    # Fragmento "Carregar mais": só as linhas da próxima página
+    if categoria not in resumo.CATEGORIAS:
+        abort(404)
+    lista, proximo_cursor = listar_pagina(categoria)
+    resp = make_response(render_template(f'_linhas_{categoria}.html', **{categoria: lista}))
+    resp.headers['X-Proximo-Cursor'] = proximo_cursor or ''
+    return resp
+
+@app.route('/<categoria>/lote', methods=['POST'])
+@login_required
+def acao_em_lote(categoria):
+    # Itens marcados na lista: acao=excluir ou acao=editar (cliente/data/tipo), numa transação só
+    if categoria not in resumo.CATEGORIAS:
+        abort(404)
+    ids = request.form.getlist('ids', type=int)
+    acao = request.form.get('acao')
+    try:
+        if acao == 'excluir':
+            afetados = em_lote.excluir(categoria, current_user.id, ids)
+            mensagem = f'{afetados} item(ns) excluído(s).'
+        elif acao == 'editar':
+            campos = {c: request.form.get(c) for c in em_lote.CAMPOS[categoria]}
+            afetados = em_lote.atualizar(categoria, current_user.id, ids, campos)
+            mensagem = f'{afetados} item(ns) atualizado(s).'
+        else:
+            abort(400)
+    except em_lote.ErroLote as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'erro': str(e)}), 400
+        flash(str(e))
+        return redirect(url_for(categoria))
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'afetados': afetados})
+    flash(mensagem)
+    return redirect(url_for(categoria))
+
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def sync_enviar():
+    # Lançamento offline: {"itens": [{"chave": ..., "categoria": ..., campos do formulário}, ...]}
+    corpo = request.get_json(silent=True)
+    try:
+        resultados = sincronizacao.enviar(current_user.id, corpo.get('itens') if isinstance(corpo, dict) else None)
+    except sincronizacao.ErroSincronizacao as e:
+        return jsonify({'erro': str(e)}), 400
+    return jsonify({'resultados': resultados})
+
+@app.route('/api/sync')
+@login_required
+@replica.leitura
+def sync_receber():
+    # O que mudou depois de ?cursor= (sem cursor: tudo), em páginas de até ?limite= registros
+    limite = min(max(request.args.get('limite', sincronizacao.LIMITE, type=int), 1), sincronizacao.LIMITE)
+    try:
+        dados = sincronizacao.mudancas(current_user.id, request.args.get('cursor'), limite)
+    except sincronizacao.CursorExpirado as e:
+        return jsonify({'erro': str(e)}), 410
+    except sincronizacao.ErroSincronizacao as e:
+        return jsonify({'erro': str(e)}), 400
+    return jsonify(dados)
+
+@app.route('/buscar')
+@login_required
+@replica.leitura
+def buscar():
+    # Busca pelo começo de qualquer palavra do nome do cliente (sem acentos/maiúsculas) nas quatro categorias
+    termo = request.args.get('q', '').strip()
+    resultados = busca.buscar(current_user.id, termo) if termo else []
+    if request.args.get('formato') == 'json':
+        return jsonify([dict(r, data=r['data'].isoformat(),
+                             bruto=r['bruto'] / 100 if r['bruto'] is not None else None,
+                             comissao=r['comissao'] / 100) for r in resultados])
+    return render_template('buscar.html', termo=termo, resultados=resultados, limite=busca.LIMITE)
+
+@app.route('/exportar')
+@login_required
+@replica.leitura
+def exportar():
+    # ?categoria=todas|vendas|cobrancas|consultas|procedimentos &formato=csv|jsonl
+    # período: ?mes=&ano=, ?ano= ou ?inicio=&fim= (AAAA-MM-DD); sem período exporta todo o histórico
+    categoria = request.args.get('categoria', 'todas')
+    formato = request.args.get('formato', 'csv')
+    if formato not in exportacao.FORMATOS or (categoria != 'todas' and categoria not in resumo.CATEGORIAS):
+        abort(400)
+    categorias = list(resumo.CATEGORIAS) if categoria == 'todas' else [categoria]
+    try:
+        inicio, fim = exportacao.intervalo_da_requisicao(request.args)
+    except ValueError:
+        abort(400)
+
+    gerador, mimetype = exportacao.FORMATOS[formato]
+    registros = exportacao.linhas(current_user.id, categorias, inicio, fim)
+    ate = fim - timedelta(days=1) if fim else 'hoje'
+    nome = f"comissoes_{categoria}_{inicio or 'inicio'}_{ate}.{formato}"
+    return Response(stream_with_context(gerador(registros)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nome}"'})
+
+@app.route('/tarefas', methods=['GET', 'POST'])
+@login_required
+def tarefas_usuario():
+    if request.method == 'POST':
+        tipo = request.form.get('tipo')
+        if tipo not in tarefas.TIPOS or (tarefas.TIPOS[tipo][3] and not eh_admin()):
+            abort(400)
+        aceitos = tarefas.TIPOS[tipo][2]
+        parametros = {k: v for k, v in request.form.items() if k in aceitos and v}
+        if tipo == 'exportacao':
+            if (parametros.get('formato', 'csv') not in exportacao.FORMATOS
+                    or parametros.get('categoria', 'todas') not in ('todas', *resumo.CATEGORIAS)):
+                abort(400)
+            # Mesmo período do /exportar (?mes=&ano=, ?ano= ou ?inicio=&fim= inclusivo); fim gravado exclusivo
+            try:
+                inicio, fim = exportacao.intervalo_da_requisicao(request.form)
+            except ValueError:
+                abort(400)
+            parametros.update(inicio=inicio.isoformat() if inicio else None, fim=fim.isoformat() if fim else None)
+        # Tarefas de manutenção do admin são do sistema; as demais são do usuário
+        dono = None if tarefas.TIPOS[tipo][3] else current_user.id
+        try:
+            item = tarefas.enfileirar(tipo, dono, **parametros)
+        except tarefas.LimiteTarefas:
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'erro': 'Limite de tarefas na fila atingido.'}), 429
+            flash('Você já tem tarefas demais na fila. Aguarde as atuais terminarem.')
+            return redirect(url_for('tarefas_usuario'))
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(tarefas.como_dict(item)), 202
+        flash('Tarefa enfileirada. Acompanhe o andamento abaixo.')
+        return redirect(url_for('tarefas_usuario'))
+
+    filtro = Tarefa.user_id == current_user.id
+    if eh_admin():
+        filtro = or_(filtro, Tarefa.user_id.is_(None))
+    lista = Tarefa.query.filter(filtro).order_by(Tarefa.criada_em.desc()).limit(30).all()
+    return render_template('tarefas.html', tarefas=[tarefas.como_dict(t) for t in lista],
+                           admin=eh_admin(), hoje=datetime.now().date())
+
+def tarefa_do_usuario(id):
+    item = Tarefa.query.get_or_404(id)
+    if item.user_id != current_user.id and not (item.user_id is None and eh_admin()):
+        abort(404)
+    return item
+
+@app.route('/tarefas/<int:id>')
+@login_required
+def tarefa_status(id):
+    # Consultado pela página de tarefas a cada poucos segundos
+    return jsonify(tarefas.como_dict(tarefa_do_usuario(id)))
+
+@app.route('/tarefas/<int:id>/arquivo')
+@login_required
+def tarefa_arquivo(id):
+    item = tarefa_do_usuario(id)
+    caminho = tarefas.caminho_arquivo(item)
+    if item.status != 'concluida' or not caminho or not os.path.exists(caminho):
+        abort(404)
+    return send_file(caminho, as_attachment=True, download_name=item.arquivo.split('_', 1)[1])
 
 @app.route('/vendas', methods=['GET', 'POST'])
 @login_required
+@replica.leitura
 def vendas():
     if request.method == 'POST':
         tipo = request.form.get('tipo_venda')
-        valor = float(request.form.get('valor_total'))
+        valor = dinheiro.centavos(request.form.get('valor_total'))
         cliente = request.form.get('nome_cliente')
         data_str = request.form.get('data_venda')
         
         data_venda = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.utcnow().date()
 
-        comissao = 0
-        if tipo == 'Talão': comissao = valor * 0.50
-        elif tipo == 'Cartão': comissao = valor * 0.05
-        elif tipo == 'PIX': comissao = (valor / 12) * 0.20
+        comissao = comissoes.calcular('vendas', data_venda, valor, tipo)
         
-        nova = Vendas(user_id=current_user.id, nome_cliente=cliente, tipo_venda=tipo, valor_total=valor, comissao_calculada=comissao, data_venda=data_venda)
+        nova = Vendas(user_id=current_user.id, nome_cliente=cliente, tipo_venda=tipo, valor_total_centavos=valor, comissao_centavos=comissao, data_venda=data_venda)
         db.session.add(nova)
+        resumo.adicionar(nova)
         db.session.commit()
         return redirect(url_for('vendas'))
     
-    lista = Vendas.query.filter_by(user_id=current_user.id).order_by(Vendas.data_venda.desc()).all()
-    total_val = db.session.query(func.sum(Vendas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    total_bruto = db.session.query(func.sum(Vendas.valor_total)).filter_by(user_id=current_user.id).scalar() or 0
-    total_qtd = Vendas.query.filter_by(user_id=current_user.id).count()
+    lista, proximo_cursor = listar_pagina('vendas')
+    total_qtd, total_val, total_bruto = totais_da_lista('vendas')
     
-    return render_template('vendas.html', vendas=lista, total_comissao=total_val, total_qtd=total_qtd, total_bruto=total_bruto)
+    return render_template('vendas.html', vendas=lista, proximo_cursor=proximo_cursor, total_comissao=total_val, total_qtd=total_qtd, total_bruto=total_bruto)
 
 @app.route('/vendas/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -254,18 +602,18 @@ def edit_venda(id):
         return redirect(url_for('vendas'))
 
     if request.method == 'POST':
+        resumo.remover(venda)
         venda.nome_cliente = request.form.get('nome_cliente')
         venda.tipo_venda = request.form.get('tipo_venda')
-        venda.valor_total = float(request.form.get('valor_total'))
+        venda.valor_total_centavos = dinheiro.centavos(request.form.get('valor_total'))
         data_str = request.form.get('data_venda')
         if data_str:
             venda.data_venda = datetime.strptime(data_str, '%Y-%m-%d').date()
 
         # Recalcular comissão
-        if venda.tipo_venda == 'Talão': venda.comissao_calculada = venda.valor_total * 0.50
-        elif venda.tipo_venda == 'Cartão': venda.comissao_calculada = venda.valor_total * 0.05
-        elif venda.tipo_venda == 'PIX': venda.comissao_calculada = (venda.valor_total / 12) * 0.20
+        venda.comissao_centavos = comissoes.calcular('vendas', venda.data_venda, venda.valor_total_centavos, venda.tipo_venda)
         
+        resumo.adicionar(venda)
         db.session.commit()
         flash('Venda atualizada com sucesso!')
         return redirect(url_for('vendas'))
@@ -280,33 +628,52 @@ def delete_venda(id):
         flash('Acesso negado.')
         return redirect(url_for('vendas'))
     
+    resumo.remover(venda)
     db.session.delete(venda)
     db.session.commit()
     flash('Venda excluída com sucesso!')
     return redirect(url_for('vendas'))
 
+@app.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    categoria = request.values.get('categoria', 'vendas')
+    resultado = None
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV ou XLSX.')
+        else:
+            try:
+                inseridos, erros = importacao.importar_arquivo(categoria, current_user.id, arquivo.stream,
+                                                               arquivo.filename, bool(request.form.get('estrito')))
+                resultado = {'inseridos': inseridos, 'erros': erros}
+            except importacao.ErroImportacao as e:
+                flash(str(e))
+    return render_template('importar.html', categoria=categoria, resultado=resultado)
+
 @app.route('/cobrancas', methods=['GET', 'POST'])
 @login_required
+@replica.leitura
 def cobrancas():
     if request.method == 'POST':
-        valor = float(request.form.get('valor_negociado'))
+        valor = dinheiro.centavos(request.form.get('valor_negociado'))
         cliente = request.form.get('nome_cliente')
         data_str = request.form.get('data_negociacao')
         
         data_negoc = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.utcnow().date()
 
-        comissao = valor * 0.03
-        nova = Cobrancas(user_id=current_user.id, nome_cliente=cliente, valor_negociado=valor, comissao_calculada=comissao, data_negociacao=data_negoc)
+        comissao = comissoes.calcular('cobrancas', data_negoc, valor)
+        nova = Cobrancas(user_id=current_user.id, nome_cliente=cliente, valor_negociado_centavos=valor, comissao_centavos=comissao, data_negociacao=data_negoc)
         db.session.add(nova)
+        resumo.adicionar(nova)
         db.session.commit()
         return redirect(url_for('cobrancas'))
     
-    lista = Cobrancas.query.filter_by(user_id=current_user.id).order_by(Cobrancas.data_negociacao.desc()).all()
-    total_val = db.session.query(func.sum(Cobrancas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    total_bruto = db.session.query(func.sum(Cobrancas.valor_negociado)).filter_by(user_id=current_user.id).scalar() or 0
-    total_qtd = Cobrancas.query.filter_by(user_id=current_user.id).count()
+    lista, proximo_cursor = listar_pagina('cobrancas')
+    total_qtd, total_val, total_bruto = totais_da_lista('cobrancas')
 
-    return render_template('cobrancas.html', cobrancas=lista, total_comissao=total_val, total_qtd=total_qtd, total_bruto=total_bruto)
+    return render_template('cobrancas.html', cobrancas=lista, proximo_cursor=proximo_cursor, total_comissao=total_val, total_qtd=total_qtd, total_bruto=total_bruto)
 
 @app.route('/cobrancas/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -317,15 +684,17 @@ def edit_cobranca(id):
         return redirect(url_for('cobrancas'))
 
     if request.method == 'POST':
+        resumo.remover(item)
         item.nome_cliente = request.form.get('nome_cliente')
-        item.valor_negociado = float(request.form.get('valor_negociado'))
+        item.valor_negociado_centavos = dinheiro.centavos(request.form.get('valor_negociado'))
         data_str = request.form.get('data_negociacao')
         if data_str:
             item.data_negociacao = datetime.strptime(data_str, '%Y-%m-%d').date()
 
         # Recalcular
-        item.comissao_calculada = item.valor_negociado * 0.03
+        item.comissao_centavos = comissoes.calcular('cobrancas', item.data_negociacao, item.valor_negociado_centavos)
         
+        resumo.adicionar(item)
         db.session.commit()
         flash('Cobrança atualizada com sucesso!')
         return redirect(url_for('cobrancas'))
@@ -340,6 +709,7 @@ def delete_cobranca(id):
         flash('Acesso negado.')
         return redirect(url_for('cobrancas'))
     
+    resumo.remover(item)
     db.session.delete(item)
     db.session.commit()
     flash('Cobrança excluída com sucesso!')
@@ -347,6 +717,7 @@ def delete_cobranca(id):
 
 @app.route('/consultas', methods=['GET', 'POST'])
 @login_required
+@replica.leitura
 def consultas():
     if request.method == 'POST':
         cliente = request.form.get('nome_cliente')
@@ -354,16 +725,16 @@ def consultas():
         
         data_cons = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.utcnow().date()
 
-        nova = Consultas(user_id=current_user.id, nome_cliente=cliente, status='Realizada', comissao_calculada=20.00, data_consulta=data_cons)
+        nova = Consultas(user_id=current_user.id, nome_cliente=cliente, status='Realizada', comissao_centavos=comissoes.calcular('consultas', data_cons), data_consulta=data_cons)
         db.session.add(nova)
+        resumo.adicionar(nova)
         db.session.commit()
         return redirect(url_for('consultas'))
     
-    lista = Consultas.query.filter_by(user_id=current_user.id).order_by(Consultas.data_consulta.desc()).all()
-    total_val = db.session.query(func.sum(Consultas.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    total_qtd = Consultas.query.filter_by(user_id=current_user.id).count()
+    lista, proximo_cursor = listar_pagina('consultas')
+    total_qtd, total_val, _ = totais_da_lista('consultas')
 
-    return render_template('consultas.html', consultas=lista, total_comissao=total_val, total_qtd=total_qtd)
+    return render_template('consultas.html', consultas=lista, proximo_cursor=proximo_cursor, total_comissao=total_val, total_qtd=total_qtd)
 
 @app.route('/consultas/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -374,13 +745,16 @@ def edit_consulta(id):
         return redirect(url_for('consultas'))
 
     if request.method == 'POST':
+        resumo.remover(item)
         item.nome_cliente = request.form.get('nome_cliente')
         data_str = request.form.get('data_consulta')
         if data_str:
             item.data_consulta = datetime.strptime(data_str, '%Y-%m-%d').date()
 
-        # Comissão fixa, não precisa recalcular se não mudar a regra
+        # Comissão pela regra vigente na data (pode mudar se a data mudar)
+        item.comissao_centavos = comissoes.calcular('consultas', item.data_consulta)
         
+        resumo.adicionar(item)
         db.session.commit()
         flash('Consulta atualizada com sucesso!')
         return redirect(url_for('consultas'))
@@ -395,6 +769,7 @@ def delete_consulta(id):
         flash('Acesso negado.')
         return redirect(url_for('consultas'))
     
+    resumo.remover(item)
     db.session.delete(item)
     db.session.commit()
     flash('Consulta excluída com sucesso!')
@@ -402,6 +777,7 @@ def delete_consulta(id):
 
 @app.route('/procedimentos', methods=['GET', 'POST'])
 @login_required
+@replica.leitura
 def procedimentos():
     if request.method == 'POST':
         tipo = request.form.get('tipo_procedimento')
@@ -410,16 +786,16 @@ def procedimentos():
         
         data_proc = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.utcnow().date()
         
-        nova = Procedimentos(user_id=current_user.id, nome_cliente=cliente, tipo_procedimento=tipo, comissao_calculada=200.00, data_procedimento=data_proc)
+        nova = Procedimentos(user_id=current_user.id, nome_cliente=cliente, tipo_procedimento=tipo, comissao_centavos=comissoes.calcular('procedimentos', data_proc, tipo=tipo), data_procedimento=data_proc)
         db.session.add(nova)
+        resumo.adicionar(nova)
         db.session.commit()
         return redirect(url_for('procedimentos'))
     
-    lista = Procedimentos.query.filter_by(user_id=current_user.id).order_by(Procedimentos.data_procedimento.desc()).all()
-    total_val = db.session.query(func.sum(Procedimentos.comissao_calculada)).filter_by(user_id=current_user.id).scalar() or 0
-    total_qtd = Procedimentos.query.filter_by(user_id=current_user.id).count()
+    lista, proximo_cursor = listar_pagina('procedimentos')
+    total_qtd, total_val, _ = totais_da_lista('procedimentos')
 
-    return render_template('procedimentos.html', procedimentos=lista, total_comissao=total_val, total_qtd=total_qtd)
+    return render_template('procedimentos.html', procedimentos=lista, proximo_cursor=proximo_cursor, total_comissao=total_val, total_qtd=total_qtd)
 
 @app.route('/procedimentos/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -430,14 +806,17 @@ def edit_procedimento(id):
         return redirect(url_for('procedimentos'))
 
     if request.method == 'POST':
+        resumo.remover(item)
         item.nome_cliente = request.form.get('nome_cliente')
         item.tipo_procedimento = request.form.get('tipo_procedimento')
         data_str = request.form.get('data_procedimento')
         if data_str:
             item.data_procedimento = datetime.strptime(data_str, '%Y-%m-%d').date()
 
-        # Comissão fixa
+        # Comissão pela regra vigente na data/tipo
+        item.comissao_centavos = comissoes.calcular('procedimentos', item.data_procedimento, tipo=item.tipo_procedimento)
         
+        resumo.adicionar(item)
         db.session.commit()
         flash('Procedimento atualizado com sucesso!')
         return redirect(url_for('procedimentos'))
@@ -452,38 +831,113 @@ def delete_procedimento(id):
         flash('Acesso negado.')
         return redirect(url_for('procedimentos'))
     
+    resumo.remover(item)
     db.session.delete(item)
     db.session.commit()
     flash('Procedimento excluído com sucesso!')
     return redirect(url_for('procedimentos'))
 
+def eh_admin():
+    # Verificação de segurança hardcoded para o admin
+    return current_user.full_name.strip().lower() == "lusiane gomes simão"
+
 @app.route('/admin/users')
 @login_required
 def admin_users():
-    # Verificação de segurança hardcoded para o admin
-    if current_user.full_name.strip().lower() != "lusiane gomes simão":
+    if not eh_admin():
         flash('Acesso negado. Esta área é restrita.')
         return redirect(url_for('home'))
     
     users = User.query.order_by(User.full_name).all()
     return render_template('admin_users.html', users=users)
 
-from pyngrok import ngrok
+@app.route('/admin/equipe')
+@login_required
+def admin_equipe():
+    # Ranking da equipe no período (?mes=&ano=, ?ano= ou ?inicio=&fim=), ordenável, com CSV
+    if not eh_admin():
+        flash('Acesso negado. Esta área é restrita.')
+        return redirect(url_for('home'))
+    try:
+        inicio, fim = equipe.periodo_da_requisicao(request.args)
+    except ValueError:
+        abort(400)
+    ordenar = request.args.get('ordenar', 'comissao')
+    decrescente = request.args.get('ordem', 'desc') != 'asc'
+    linhas = equipe.ranking(inicio, fim, ordenar, decrescente)
+    ate = fim - timedelta(days=1)
+    if request.args.get('formato') == 'csv':
+        nome = f'equipe_{inicio:%Y-%m}_{ate:%Y-%m}.csv'
+        return Response(equipe.gerar_csv(linhas), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="{nome}"'})
+    return render_template('admin_equipe.html', linhas=linhas, inicio=inicio, ate=ate,
+                           ordenar=ordenar, decrescente=decrescente, categorias=list(resumo.CATEGORIAS))
+
+@app.route('/admin/equipe/<int:user_id>')
+@login_required
+def admin_vendedor(user_id):
+    if not eh_admin():
+        flash('Acesso negado. Esta área é restrita.')
+        return redirect(url_for('home'))
+    vendedor = User.query.get_or_404(user_id)
+    if request.args:
+        try:
+            inicio, fim = equipe.periodo_da_requisicao(request.args)
+        except ValueError:
+            abort(400)
+    else:
+        inicio, fim = periodos.intervalo_ano(datetime.now().year)
+    meses = equipe.estatisticas_vendedor(user_id, inicio, fim)
+    return render_template('admin_vendedor.html', vendedor=vendedor, meses=meses, inicio=inicio,
+                           ate=fim - timedelta(days=1), categorias=list(resumo.CATEGORIAS))
+
+@app.route('/admin/cache')
+@login_required
+def admin_cache():
+    # Contadores do cache do dashboard (por processo/worker)
+    if not eh_admin():
+        abort(403)
+    return jsonify(cache.estatisticas())
+
+@app.route('/admin/metricas')
+@login_required
+def admin_metricas():
+    if not eh_admin():
+        flash('Acesso negado. Esta área é restrita.')
+        return redirect(url_for('home'))
+    return render_template('admin_metricas.html', linhas=metricas.resumo(), cache=cache.estatisticas(),
+                           amostragem=metricas.amostragem)
+
+@app.route('/metrics')
+def metrics():
+    # Formato texto do Prometheus. Com METRICAS_TOKEN usa o token; sem ele, só o admin logado.
+    token = app.config.get('METRICAS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+    elif not (current_user.is_authenticated and eh_admin()):
+        abort(401)
+    return Response(metricas.prometheus(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # Configuração de Porta
     port = 5003
-    
-    # Tenta abrir o túnel Ngrok (Link Público)
-    # try:
-    #     # Garante que o Ngrok use o protocolo HTTP (que gera https gratuito)
-    #     public_url = ngrok.connect(port, "http").public_url
-    #     print("\n" + "="*60)
-    #     print(f" 🚀 ACESSE SEU APP AQUI (EXTERNO): {public_url}")
-    #     print("="*60 + "\n")
-    # except Exception as e:
-    #     print(f"\n[!] Aviso: Não foi possível gerar Link Público Ngrok. Erro: {e}")
-    #     print("    (Verifique sua conexão de internet)\n")
+
+    with app.app_context():
+        migracoes.aplicar()
+
+    # Túnel Ngrok (Link Público) só com NGROK=1; o pyngrok é importado apenas nesse caso
+    if os.getenv('NGROK') == '1':
+        try:
+            from pyngrok import ngrok
+            # Garante que o Ngrok use o protocolo HTTP (que gera https gratuito)
+            public_url = ngrok.connect(port, "http").public_url
+            print("\n" + "="*60)
+            print(f" 🚀 ACESSE SEU APP AQUI (EXTERNO): {public_url}")
+            print("="*60 + "\n")
+        except Exception as e:
+            print(f"\n[!] Aviso: Não foi possível gerar Link Público Ngrok. Erro: {e}")
+            print("    (Verifique sua conexão de internet)\n")
 
     print(f" 🏠 ACESSE SEU APP AQUI (LOCAL):   http://127.0.0.1:{port}\n")
 
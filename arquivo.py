@@ -0,0 +1,79 @@
+from datetime import date, datetime
+from sqlalchemy import delete, insert, select
+from models import db, AnoArquivado
+from resumo import CATEGORIAS, ARQUIVO
+import lancamentos
+import periodos
+
+# Arquivamento de anos fechados.
+#
+# Os itens do ano saem das quatro tabelas de uso diário e vão para as tabelas *_arquivo
+# (mesmas colunas e ids), em lotes curtos por id. Os totais do ano continuam em resumo_mensal,
+# então /geral, a tela inicial e os totais das listas não mudam; o detalhamento do mês, a
+# exportação e a busca leem o livro de lançamentos, onde os itens arquivados continuam (só
+# marcados como arquivados). Itens arquivados são somente leitura: o recálculo de regras
+# (comissoes.recalcular_periodo) não os altera.
+
+LOTE = 5000
+
+
+class ErroArquivo(Exception):
+    pass
+
+
+def anos_arquivados():
+    return sorted(a for (a,) in db.session.query(AnoArquivado.ano))
+
+
+def _mover(origem, destino, col_data, ano, lote, progresso=None):
+    inicio, fim = periodos.intervalo_ano(ano)
+    colunas = [c.name for c in origem.columns]
+    filtro = periodos.no_intervalo(origem.c[col_data], inicio, fim)
+    movidas = 0
+    while True:
+        ids = db.session.execute(select(origem.c.id).where(filtro).order_by(origem.c.id).limit(lote)).scalars().all()
+        if not ids:
+            return movidas
+        # Cópia + remoção do mesmo lote na mesma transação curta
+        db.session.execute(insert(destino).from_select(colunas, select(*[origem.c[n] for n in colunas])
+                                                       .where(origem.c.id.in_(ids))))
+        db.session.execute(delete(origem).where(origem.c.id.in_(ids)))
+        db.session.commit()
+        movidas += len(ids)
+        if progresso:
+            progresso(movidas)
+
+
+def arquivar_ano(ano, lote=LOTE, log=print, progresso=None):
+    """Move os itens de um ano fechado para as tabelas de arquivo. Retorna o nº de linhas movidas."""
+    if ano >= date.today().year:
+        raise ErroArquivo(f'{ano} ainda não está fechado; só anos anteriores a {date.today().year} podem ser arquivados.')
+    total = 0
+    for categoria, (modelo, col_data, _) in CATEGORIAS.items():
+        movidas = _mover(modelo.__table__, ARQUIVO[categoria], col_data, ano, lote, progresso)
+        if movidas:
+            log(f'  {categoria}: {movidas} linha(s) arquivada(s)')
+        total += movidas
+    registro = db.session.get(AnoArquivado, ano) or AnoArquivado(ano=ano, linhas=0)
+    registro.linhas = (registro.linhas or 0) + total
+    registro.arquivado_em = datetime.utcnow()
+    db.session.add(registro)
+    lancamentos.marcar_arquivado(ano, True)
+    db.session.commit()
+    return total
+
+
+def restaurar_ano(ano, lote=LOTE, log=print, progresso=None):
+    """Devolve os itens arquivados de um ano para as tabelas originais."""
+    total = 0
+    for categoria, (modelo, col_data, _) in CATEGORIAS.items():
+        movidas = _mover(ARQUIVO[categoria], modelo.__table__, col_data, ano, lote, progresso)
+        if movidas:
+            log(f'  {categoria}: {movidas} linha(s) restaurada(s)')
+        total += movidas
+    registro = db.session.get(AnoArquivado, ano)
+    if registro is not None:
+        db.session.delete(registro)
+    lancamentos.marcar_arquivado(ano, False)
+    db.session.commit()
+    return total
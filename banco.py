@@ -0,0 +1,28 @@
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Ajustes por conexão do SQLite (o fallback local e instâncias pequenas).
+# WAL: leitores não bloqueiam o escritor e vice-versa; synchronous=NORMAL é seguro com WAL
+# e evita um fsync por commit; busy_timeout faz o escritor esperar em vez de falhar com
+# "database is locked"; mmap reduz cópias nas leituras.
+
+_opcoes = {'busy_timeout': 15000, 'mmap': 256 * 1024 * 1024}
+
+
+def _ao_conectar(conexao_dbapi, registro):
+    if not isinstance(conexao_dbapi, sqlite3.Connection):
+        return
+    cursor = conexao_dbapi.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(_opcoes["busy_timeout"])}')
+    cursor.execute(f'PRAGMA mmap_size={int(_opcoes["mmap"])}')
+    cursor.close()
+
+
+def init_app(app):
+    _opcoes['busy_timeout'] = app.config.get('SQLITE_BUSY_TIMEOUT_MS', 15000)
+    _opcoes['mmap'] = app.config.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)
+    if not event.contains(Engine, 'connect', _ao_conectar):
+        event.listen(Engine, 'connect', _ao_conectar)
@@ -0,0 +1,483 @@
+"""Benchmark every route and save the results as JSON.
+
+Run generate_data.py first, then:
+
+    python benchmark.py                          # Flask test client (in-process, counts SQL queries)
+    python benchmark.py --gunicorn               # starts gunicorn and benchmarks it over HTTP
+    python benchmark.py --url http://host:port   # an already running instance
+    python benchmark.py --compare bench_prev.json   # exit 1 if any p95 regressed beyond --tolerance
+    python benchmark.py --gunicorn --concurrency 8 --writers 2   # reads and writes at the same time
+    python benchmark.py --gunicorn --concurrency 16 --logins    # login storm against dashboard reads
+
+The database is the one from DATABASE_URL (SQLite file by default), so the same
+run can be repeated against a local PostgreSQL.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import date, datetime
+
+sys.stdout.reconfigure(line_buffering=True)
+
+DEFAULT_USER = 'Vendedor Sintetico 001'
+
+
+# --- Clients -----------------------------------------------------------------
+
+class TestClient:
+    """In-process Flask test client; also counts SQL statements per request (per thread)."""
+
+    _counter = threading.local()
+    _listening = False
+
+    def __init__(self):
+        from app import app
+        self.app = app
+        self.client = app.test_client()
+        if not TestClient._listening:
+            from sqlalchemy import event
+            from sqlalchemy.engine import Engine
+            event.listen(Engine, 'before_cursor_execute', TestClient._count)
+            TestClient._listening = True
+
+    @staticmethod
+    def _count(*args):
+        TestClient._counter.n = getattr(TestClient._counter, 'n', 0) + 1
+
+    def request(self, method, path, data=None):
+        TestClient._counter.n = 0
+        if method == 'POST':
+            resp = self.client.post(path, data=data)
+        else:
+            resp = self.client.get(path)
+        return resp.status_code, resp.get_data(as_text=True), TestClient._counter.n
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=120) as resp:
+                return resp.status, resp.read().decode('utf-8', 'replace'), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace'), None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Measure each request on its own, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# --- Scenarios ---------------------------------------------------------------
+
+def busiest_month(client):
+    html = client.request('GET', '/geral')[1]
+    match = re.search(r'/geral\?mes=(\d+)&amp;ano=(\d+)', html) or re.search(r'/geral\?ano=(\d+)&amp;mes=(\d+)', html)
+    if not match:
+        today = date.today()
+        return today.month, today.year
+    a, b = int(match.group(1)), int(match.group(2))
+    return (a, b) if a <= 12 else (b, a)
+
+
+def read_scenarios(month, year):
+    return [
+        ('home', 'GET', '/'),
+        ('relatorios', 'GET', '/geral'),
+        ('relatorios_mes', 'GET', f'/geral?mes={month}&ano={year}'),
+        ('vendas', 'GET', '/vendas'),
+        ('cobrancas', 'GET', '/cobrancas'),
+        ('consultas', 'GET', '/consultas'),
+        ('procedimentos', 'GET', '/procedimentos'),
+    ]
+
+
+def write_cycle(client, tag='Benchmark'):
+    """Create, edit and delete one venda. Returns [(scenario, seconds, queries, status), ...]."""
+    today = date.today().isoformat()
+    form = {'nome_cliente': tag, 'tipo_venda': 'Cartão', 'valor_total': '150.00', 'data_venda': today}
+    results = []
+
+    start = time.perf_counter()
+    status, _, queries = client.request('POST', '/vendas', form)
+    results.append(('criar_venda', time.perf_counter() - start, queries, status))
+
+    html = client.request('GET', '/vendas')[1]
+    # The row created by this client (several writers may be running at once)
+    match = re.search(rf'<td>{re.escape(tag)}</td>.*?/vendas/edit/(\d+)', html, re.S)
+    if not match:
+        return results
+    venda_id = match.group(1)
+
+    start = time.perf_counter()
+    status, _, queries = client.request('POST', f'/vendas/edit/{venda_id}', dict(form, valor_total='175.00'))
+    results.append(('editar_venda', time.perf_counter() - start, queries, status))
+
+    start = time.perf_counter()
+    status, _, queries = client.request('GET', f'/vendas/delete/{venda_id}')
+    results.append(('excluir_venda', time.perf_counter() - start, queries, status))
+    return results
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(samples, wall):
+    times = sorted(s[0] for s in samples)
+    queries = [s[1] for s in samples if s[1] is not None]
+    errors = sum(1 for s in samples if s[2] >= 400)
+    return {
+        'n': len(times),
+        'p50_ms': round(percentile(times, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(times, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(times, 0.99) * 1000, 2),
+        'mean_ms': round(sum(times) / len(times) * 1000, 2),
+        'throughput_rps': round(len(times) / wall, 1) if wall else None,
+        'queries_per_request': round(sum(queries) / len(queries), 1) if queries else None,
+        'errors': errors,
+    }
+
+
+def login(client, user, password):
+    status, _, _ = client.request('POST', '/login', {'full_name': user, 'password': password})
+    if status != 302:
+        raise SystemExit(f'Login failed for "{user}" (status {status}). Did you run generate_data.py?')
+    return client
+
+
+def run(make_client, user, password, repetitions, concurrency, writers=0, logins=False):
+    clients = [login(make_client(), user, password) for _ in range(concurrency)]
+
+    month, year = busiest_month(clients[0])
+    results = {}
+    for name, method, path in read_scenarios(month, year):
+        clients[0].request(method, path)  # warm-up
+        samples = []
+        lock = threading.Lock()
+
+        def worker(client, count):
+            for _ in range(count):
+                start = time.perf_counter()
+                status, _, queries = client.request(method, path)
+                with lock:
+                    samples.append((time.perf_counter() - start, queries, status))
+
+        wall_start = time.perf_counter()
+        per_client = max(1, repetitions // concurrency)
+        threads = [threading.Thread(target=worker, args=(c, per_client)) for c in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results[name] = summarize(samples, time.perf_counter() - wall_start)
+        print_row(name, results[name])
+
+    write_samples = {}
+    wall_start = time.perf_counter()
+    for _ in range(max(1, repetitions // 5)):
+        for name, seconds, queries, status in write_cycle(clients[0]):
+            write_samples.setdefault(name, []).append((seconds, queries, status))
+    wall = time.perf_counter() - wall_start
+    for name, samples in write_samples.items():
+        results[name] = summarize(samples, wall)
+        print_row(name, results[name])
+
+    if writers:
+        results.update(run_mixed(clients, [login(make_client(), user, password) for _ in range(writers)],
+                                 repetitions))
+    if logins:
+        results.update(run_login_storm(make_client, user, password, repetitions, concurrency))
+    return results
+
+
+def run_login_storm(make_client, user, password, repetitions, concurrency):
+    """Concurrent logins (fresh sessions) while an already logged-in client keeps reading the dashboard.
+
+    Hashing must not starve the dashboard: compare home_during_logins with the plain home scenario.
+    A 503 means the hashing queue was full; a 429 means the per-user throttle kicked in.
+    """
+    stop = threading.Event()
+    lock = threading.Lock()
+    login_samples, read_samples = [], []
+    reader_client = login(make_client(), user, password)
+
+    def logger_in():
+        for _ in range(max(1, repetitions // concurrency)):
+            client = make_client()
+            start = time.perf_counter()
+            status, _, queries = client.request('POST', '/login', {'full_name': user, 'password': password})
+            with lock:
+                login_samples.append((time.perf_counter() - start, queries, status if status != 302 else 200))
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            status, _, queries = reader_client.request('GET', '/')
+            with lock:
+                read_samples.append((time.perf_counter() - start, queries, status))
+
+    read_thread = threading.Thread(target=reader)
+    login_threads = [threading.Thread(target=logger_in) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    read_thread.start()
+    for t in login_threads:
+        t.start()
+    for t in login_threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    stop.set()
+    read_thread.join()
+
+    results = {'login': summarize(login_samples, wall)}
+    if read_samples:
+        results['home_during_logins'] = summarize(read_samples, wall)
+    for name, r in results.items():
+        print_row(name, r)
+    return results
+
+
+def run_mixed(readers, writers, repetitions):
+    """Dashboard reads while other clients keep writing: reads must not queue behind the
+    writes, and no request may fail (SQLite "database is locked" shows up as a 500)."""
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_samples, write_samples = [], []
+
+    def reader(client):
+        for i in range(max(1, repetitions // len(readers))):
+            path = '/' if i % 2 else '/geral'
+            start = time.perf_counter()
+            status, _, queries = client.request('GET', path)
+            with lock:
+                read_samples.append((time.perf_counter() - start, queries, status))
+
+    def writer(client, n):
+        while not stop.is_set():
+            for _, seconds, queries, status in write_cycle(client, f'Benchmark writer {n}'):
+                with lock:
+                    write_samples.append((seconds, queries, status))
+
+    write_threads = [threading.Thread(target=writer, args=(c, n)) for n, c in enumerate(writers)]
+    read_threads = [threading.Thread(target=reader, args=(c,)) for c in readers]
+    wall_start = time.perf_counter()
+    for t in write_threads + read_threads:
+        t.start()
+    for t in read_threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    stop.set()
+    for t in write_threads:
+        t.join()
+
+    results = {'mixed_reads': summarize(read_samples, wall)}
+    if write_samples:
+        results['mixed_writes'] = summarize(write_samples, wall)
+    for name, r in results.items():
+        print_row(name, r)
+    return results
+
+
+def print_row(name, r):
+    queries = '-' if r['queries_per_request'] is None else r['queries_per_request']
+    print(f"  {name:<16} n={r['n']:<5} p50={r['p50_ms']:>8.2f}ms p95={r['p95_ms']:>8.2f}ms "
+          f"p99={r['p99_ms']:>8.2f}ms rps={r['throughput_rps']:>7} queries={queries} errors={r['errors']}")
+
+
+# --- Startup -----------------------------------------------------------------
+
+STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+status = app.test_client().get('/login').status_code
+done = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'first_response_s': done - start, 'status': status}))
+"""
+
+
+def measure_startup(runs=3):
+    """Cold start of a fresh interpreter: importing the app and serving its first request (best of runs)."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', STARTUP_PROBE], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        total = time.perf_counter() - start
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            return None
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        r['process_s'] = total
+        if best is None or r['first_response_s'] < best['first_response_s']:
+            best = r
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in best.items()}
+
+
+# --- gunicorn ----------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(port, extra_args):
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{port}'] + extra_args
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=2)
+            return proc, round(time.perf_counter() - started, 3)
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit('gunicorn did not start within 60s')
+
+
+def process_tree_peak_rss_mb(pid):
+    """Sum of VmHWM (peak RSS) of a process and its children, from /proc (Linux only)."""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        p = pending.pop()
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total_kb += int(line.split()[1])
+            for task in os.listdir(f'/proc/{p}/task'):
+                with open(f'/proc/{p}/task/{task}/children') as f:
+                    pending.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1) if total_kb else None
+
+
+# --- Main --------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path, tolerance):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    regressions = []
+    for name, r in current['scenarios'].items():
+        old = previous.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        change = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        flag = 'REGRESSION' if change > tolerance else ''
+        print(f"  {name:<16} p95 {old['p95_ms']:>8.2f}ms -> {r['p95_ms']:>8.2f}ms ({change:+.0%}) {flag}")
+        if flag:
+            regressions.append(name)
+    old, new = (previous.get('startup') or {}), (current.get('startup') or {})
+    if old.get('first_response_s') and new.get('first_response_s'):
+        print(f"  cold start       {old['first_response_s']:.3f}s -> {new['first_response_s']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', default=DEFAULT_USER)
+    parser.add_argument('--password', default='senha123')
+    parser.add_argument('--repetitions', type=int, default=50, help='requests per read scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='parallel reading clients')
+    parser.add_argument('--writers', type=int, default=0,
+                        help='clients creating/editing/deleting entries during a final mixed read phase')
+    parser.add_argument('--logins', action='store_true',
+                        help='finish with a login storm (--concurrency parallel logins) while the dashboard is read')
+    parser.add_argument('--url', help='benchmark a running instance instead of the test client')
+    parser.add_argument('--gunicorn', action='store_true', help='start gunicorn and benchmark it over HTTP')
+    parser.add_argument('--gunicorn-args', default='', help='extra gunicorn arguments, e.g. "-w 4 --threads 4"')
+    parser.add_argument('--no-cache', action='store_true', help='disable the dashboard cache (test client mode)')
+    parser.add_argument('--output', default=f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument('--compare', help='previous result JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='allowed p95 increase (0.20 = 20%%)')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        os.environ['CACHE_BACKEND'] = 'nenhum'
+
+    startup = None
+    gunicorn = None
+    if args.gunicorn:
+        port = free_port()
+        gunicorn, first_response = start_gunicorn(port, args.gunicorn_args.split())
+        startup = {'first_response_s': first_response}
+        args.url = f'http://127.0.0.1:{port}'
+
+    try:
+        if args.url:
+            mode = 'gunicorn' if gunicorn else 'http'
+            print(f'Benchmarking {args.url} ({args.concurrency} client(s))')
+            scenarios = run(lambda: HttpClient(args.url), args.user, args.password, args.repetitions,
+                            args.concurrency, args.writers, args.logins)
+            database = None
+            peak_rss = process_tree_peak_rss_mb(gunicorn.pid) if gunicorn else None
+        else:
+            mode = 'test_client'
+            startup = measure_startup()
+            print(f'Cold start: {startup}')
+            database = TestClient().app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]
+            print(f'Benchmarking with the Flask test client on {database} ({args.concurrency} client(s))')
+            scenarios = run(TestClient, args.user, args.password, args.repetitions, args.concurrency,
+                            args.writers, args.logins)
+            peak_rss = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    finally:
+        if gunicorn:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    result = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'mode': mode,
+        'database': database,
+        'concurrency': args.concurrency,
+        'peak_rss_mb': peak_rss,
+        'startup': startup,
+        'scenarios': scenarios,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'Peak RSS: {peak_rss} MB. Results saved to {args.output}')
+
+    if args.compare:
+        if compare(result, args.compare, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
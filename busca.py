@@ -0,0 +1,79 @@
+from sqlalchemy import bindparam, or_, select, text, update
+from models import db, Lancamento, normalizar_nome
+from resumo import CATEGORIAS
+from preenchimento import Preenchimento
+import esquema
+
+# Busca por cliente nas quatro categorias do usuário, no livro de lançamentos.
+#
+# Encontra o termo no começo de qualquer palavra de nome_busca (nome_cliente sem acentos,
+# maiúsculas e pontuação, ver models.py): "alvares" acha "José Álvares". No PostgreSQL os dois
+# LIKE usam o índice GIN pg_trgm; no SQLite o índice (user_id, nome_busca) cobre a consulta e
+# só os nomes do usuário são lidos.
+
+LIMITE = 100
+
+
+def consulta(user_id, termo, limite=LIMITE):
+    termo = normalizar_nome(termo)
+    if not termo:
+        return None
+    l = Lancamento
+    return (select(l.categoria, l.item_id.label('id'), l.data, l.nome_cliente,
+                   l.bruto_centavos.label('bruto'), l.comissao_centavos.label('comissao'), l.arquivado)
+            # normalizar_nome tira % e _, então o termo vai literal no LIKE
+            .where(l.user_id == user_id,
+                   or_(l.nome_busca.like(termo + '%'), l.nome_busca.like('% ' + termo + '%')))
+            .order_by(l.data.desc(), l.item_id.desc()).limit(limite))
+
+
+def buscar(user_id, termo, limite=LIMITE):
+    """Lista de dicts (categoria, id, data, nome_cliente, bruto, comissao, arquivado), mais recentes primeiro.
+
+    bruto e comissao em centavos.
+    """
+    sql = consulta(user_id, termo, limite)
+    if sql is None:
+        return []
+    return [dict(linha._mapping) for linha in db.session.execute(sql)]
+
+
+def preenchimentos_nome_busca():
+    """nome_busca das linhas antigas, em lotes retomáveis (ver preenchimento.py)."""
+    lista = []
+    for categoria, (modelo, _, _) in CATEGORIAS.items():
+        tabela = modelo.__table__
+        comando = (update(tabela).where(tabela.c.id == bindparam('_id'))
+                   .values(nome_busca=bindparam('_nome')))
+
+        def aplicar(ids, tabela=tabela, comando=comando):
+            nomes = db.session.execute(select(tabela.c.id, tabela.c.nome_cliente).where(tabela.c.id.in_(ids)))
+            db.session.execute(comando, [{'_id': i, '_nome': normalizar_nome(n)} for i, n in nomes])
+
+        lista.append(Preenchimento(f'nome_busca:{tabela.name}', tabela, tabela.c.nome_busca.is_(None),
+                                   aplicar, colunas=('nome_busca',)))
+    return lista
+
+
+def criar_indices_trigrama(log=print):
+    """PostgreSQL: índice GIN pg_trgm em lancamentos.nome_busca (sem a extensão, fica só o B-tree)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except Exception as e:
+        log(f'  pg_trgm indisponível, busca usa só o índice B-tree: {e}')
+        return
+    # CONCURRENTLY não bloqueia escritas; precisa rodar fora de transação
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{Lancamento.__tablename__}_nome_busca_trgm '
+                          f'ON {Lancamento.__tablename__} USING gin (nome_busca gin_trgm_ops)'))
+
+
+def remover_indices_das_categorias():
+    """Índices de busca das tabelas de cada categoria, sem uso desde que a busca lê o livro de lançamentos."""
+    for modelo, _, _ in CATEGORIAS.values():
+        for tabela in (modelo.__tablename__, f'{modelo.__tablename__}_arquivo'):
+            esquema.remover_indice(f'ix_{tabela}_user_nome_busca')
+        esquema.remover_indice(f'ix_{modelo.__tablename__}_nome_busca_trgm')
@@ -0,0 +1,249 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db, GeracaoCache
+
+# Cache das telas de resumo (dashboard e /geral) por (user_id, tela, parâmetros).
+# Toda escrita que passa pelo resumo mensal marca o usuário na sessão (ver resumo.marcar_alterado).
+# Depois do commit as entradas do usuário são removidas do backend.
+#
+# Backends:
+#   memoria - LRU com TTL no próprio processo
+#   sqlite  - arquivo SQLite compartilhado entre os workers do gunicorn
+#   nenhum  - desliga o cache
+#
+# No backend sqlite a invalidação feita por um processo já vale para todos. No de memória, para
+# que escritas de outros workers, do "flask worker" ou da CLI também invalidem, o commit incrementa
+# na mesma transação a geração do usuário em geracoes_cache, que faz parte da chave. A geração é
+# relida do banco no máximo uma vez a cada CACHE_GERACAO_INTERVALO segundos por usuário: um acerto
+# não consulta o banco, e a escrita de outro processo aparece aqui em até esse intervalo.
+
+
+class MemoriaLRU:
+    compartilhado = False
+
+    def __init__(self, max_itens=1024, ttl=300):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # chave -> (user_id, expira, valor)
+        self._geracoes = {}
+        self._lock = threading.Lock()
+
+    def geracao(self, user_id):
+        with self._lock:
+            return self._geracoes.get(user_id, 0)
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[1] < time.time():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item
+
+    def set(self, chave, user_id, valor, geracao):
+        with self._lock:
+            # Descarta se o usuário foi invalidado enquanto o valor era calculado
+            if self._geracoes.get(user_id, 0) != geracao:
+                return
+            self._itens[chave] = (user_id, time.time() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._geracoes[user_id] = self._geracoes.get(user_id, 0) + 1
+            for chave in [c for c, item in self._itens.items() if item[0] == user_id]:
+                del self._itens[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            for user_id in self._geracoes:
+                self._geracoes[user_id] += 1
+
+
+class SQLiteCompartilhado:
+    compartilhado = True
+
+    def __init__(self, caminho, ttl=300):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conexao() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, user_id INTEGER, expira REAL, valor BLOB)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_user ON cache (user_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS geracoes (user_id INTEGER PRIMARY KEY, geracao INTEGER NOT NULL)')
+
+    def _conexao(self):
+        # Uma conexão por thread; WAL permite leituras concorrentes entre processos
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def geracao(self, user_id):
+        row = self._conexao().execute('SELECT geracao FROM geracoes WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, chave):
+        row = self._conexao().execute('SELECT user_id, expira, valor FROM cache WHERE chave = ?', (chave,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1], pickle.loads(row[2])
+
+    def set(self, chave, user_id, valor, geracao):
+        self._conexao().execute(
+            'INSERT OR REPLACE INTO cache (chave, user_id, expira, valor) '
+            'SELECT ?, ?, ?, ? WHERE COALESCE((SELECT geracao FROM geracoes WHERE user_id = ?), 0) = ?',
+            (chave, user_id, time.time() + self.ttl, pickle.dumps(valor), user_id, geracao))
+
+    def invalidar(self, user_id):
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('INSERT INTO geracoes (user_id, geracao) VALUES (?, 1) '
+                     'ON CONFLICT(user_id) DO UPDATE SET geracao = geracao + 1', (user_id,))
+        conn.execute('DELETE FROM cache WHERE user_id = ?', (user_id,))
+        conn.execute('COMMIT')
+
+    def limpar(self):
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('UPDATE geracoes SET geracao = geracao + 1')
+        conn.execute('DELETE FROM cache')
+        conn.execute('COMMIT')
+
+
+class CacheUsuario:
+    def __init__(self, backend=None, intervalo_geracao=2.0):
+        self.backend = backend
+        self.intervalo_geracao = intervalo_geracao
+        self._geracoes_lidas = {}  # user_id -> (lida em, geração em geracoes_cache)
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def obter(self, user_id, tela, params, calcular):
+        """Retorna o valor em cache ou chama calcular() e guarda o resultado."""
+        if self.backend is None:
+            return calcular()
+        chave = f'{user_id}:{tela}:{params!r}'
+        if not self.backend.compartilhado:
+            chave = f'{user_id}:{self.geracao_banco(user_id)!r}:{tela}:{params!r}'
+        item = self.backend.get(chave)
+        if item is not None:
+            self.hits += 1
+            return item[2]
+        self.misses += 1
+        geracao = self.backend.geracao(user_id)
+        valor = calcular()
+        self.backend.set(chave, user_id, valor, geracao)
+        return valor
+
+    def geracao_banco(self, user_id):
+        """(geração do usuário, geração geral) em geracoes_cache, relidas a cada intervalo_geracao."""
+        agora = time.monotonic()
+        lida = self._geracoes_lidas.get(user_id)
+        if lida is not None and agora - lida[0] < self.intervalo_geracao:
+            return lida[1]
+        linhas = dict(db.session.execute(select(GeracaoCache.user_id, GeracaoCache.geracao)
+                                         .where(GeracaoCache.user_id.in_((TODOS, user_id)))).all())
+        geracao = linhas.get(user_id, 0), linhas.get(TODOS, 0)
+        self._geracoes_lidas[user_id] = (agora, geracao)
+        return geracao
+
+    def esquecer_geracao(self, user_id):
+        """Faz a próxima geracao_banco(user_id) reler o banco."""
+        self._geracoes_lidas.pop(user_id, None)
+
+    def invalidar(self, user_id):
+        self.esquecer_geracao(user_id)
+        if self.backend is not None:
+            self.invalidacoes += 1
+            self.backend.invalidar(user_id)
+
+    def limpar(self):
+        self._geracoes_lidas.clear()
+        if self.backend is not None:
+            self.invalidacoes += 1
+            self.backend.limpar()
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidacoes': self.invalidacoes,
+            'taxa_acerto': round(self.hits / total, 4) if total else None,
+            'pid': os.getpid(),
+        }
+
+
+cache = CacheUsuario()
+
+TODOS = 0  # linha de geracoes_cache incrementada quando todos os usuários mudam
+REGRAS = -1  # linha de geracoes_cache das regras de comissão (ver comissoes.regras)
+
+
+def incrementar_geracao(session, chaves):
+    """Incrementa as linhas de geracoes_cache na transação da sessão (vale para todos os processos no commit)."""
+    ins = postgresql.insert if session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    # Ordem fixa: duas transações incrementando as mesmas linhas não se travam
+    for chave in sorted(chaves):
+        stmt = ins(GeracaoCache).values(user_id=chave, geracao=1)
+        session.execute(stmt.on_conflict_do_update(index_elements=['user_id'],
+                                                   set_={'geracao': GeracaoCache.geracao + 1}))
+
+
+def _antes_do_commit(session):
+    usuarios = session.info.get('usuarios_alterados')
+    if not usuarios or cache.backend is None or cache.backend.compartilhado:
+        return
+    incrementar_geracao(session, [TODOS] if None in usuarios else usuarios)
+
+
+def _apos_commit(session):
+    usuarios = session.info.pop('usuarios_alterados', None)
+    if not usuarios:
+        return
+    if None in usuarios:
+        cache.limpar()
+    else:
+        for user_id in usuarios:
+            cache.invalidar(user_id)
+
+
+def _apos_rollback(session, transacao_anterior):
+    session.info.pop('usuarios_alterados', None)
+
+
+def init_app(app):
+    nome = app.config.get('CACHE_BACKEND', 'memoria')
+    ttl = app.config.get('CACHE_TTL', 300)
+    cache.intervalo_geracao = app.config.get('CACHE_GERACAO_INTERVALO', 2.0)
+    if nome == 'memoria':
+        cache.backend = MemoriaLRU(app.config.get('CACHE_MAX_ITENS', 1024), ttl)
+    elif nome == 'sqlite':
+        cache.backend = SQLiteCompartilhado(app.config['CACHE_SQLITE_PATH'], ttl)
+    elif nome == 'nenhum':
+        cache.backend = None
+    else:
+        raise ValueError(f'CACHE_BACKEND desconhecido: {nome}')
+    if not event.contains(Session, 'after_commit', _apos_commit):
+        event.listen(Session, 'before_commit', _antes_do_commit)
+        event.listen(Session, 'after_commit', _apos_commit)
+        event.listen(Session, 'after_soft_rollback', _apos_rollback)
@@ -1,4 +1,5 @@
 from app import app, db, User, Vendas
+from sqlalchemy import func
 import os
 import sys
 
@@ -17,11 +18,13 @@ def check_db(db_name):
     
     with app.app_context():
         try:
-            users = User.query.all()
-            print(f"Users: {len(users)}", flush=True)
-            for u in users:
-                vendas_count = Vendas.query.filter_by(user_id=u.id).count()
-                print(f"  - User: {u.full_name}, Vendas: {vendas_count}", flush=True)
+            # One grouped query instead of a count per user
+            rows = (db.session.query(User.full_name, func.count(Vendas.id))
+                    .outerjoin(Vendas, Vendas.user_id == User.id)
+                    .group_by(User.id, User.full_name).all())
+            print(f"Users: {len(rows)}", flush=True)
+            for full_name, vendas_count in rows:
+                print(f"  - User: {full_name}, Vendas: {vendas_count}", flush=True)
         except Exception as e:
             print(f"Error reading DB: {e}", flush=True)
             
@@ -0,0 +1,184 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import or_, select, update, literal
+from models import db, RegraComissao
+from cache import cache, incrementar_geracao, REGRAS
+import dinheiro
+import lancamentos
+import resumo
+import periodos
+
+# Motor de regras de comissão (tabela regras_comissao).
+# Os formulários e a importação calculam item a item com calcular(); a troca de uma taxa
+# é aplicada ao histórico com recalcular_periodo(), que faz um UPDATE por regra.
+# As regras ficam em memória em cada processo; cadastrar uma regra incrementa a geração REGRAS em
+# geracoes_cache (como o cache das telas, ver cache.py) e os outros workers recarregam em até
+# CACHE_GERACAO_INTERVALO segundos.
+# Tudo em inteiros: valores e comissões em centavos, taxas em décimos de milésimo (ESCALA_TAXA);
+# a divisão arredonda metade para cima, com a mesma conta em Python e em SQL.
+
+TIPOS_VENDA = ('Talão', 'Cartão', 'PIX')
+
+# Regras originais do sistema (usadas para popular a tabela vazia)
+REGRAS_PADRAO = [
+    # categoria, tipo, modo, taxa, divisor
+    ('vendas', 'Talão', 'percentual', 0.50, 1),
+    ('vendas', 'Cartão', 'percentual', 0.05, 1),
+    ('vendas', 'PIX', 'percentual', 0.20, 12),
+    ('cobrancas', None, 'percentual', 0.03, 1),
+    ('consultas', None, 'fixo', 20.00, 1),
+    ('procedimentos', None, 'fixo', 200.00, 1),
+]
+INICIO_REGRAS_PADRAO = date(2000, 1, 1)
+
+# categoria -> coluna de tipo usada para escolher a regra (None = só regras gerais)
+COLUNA_TIPO = {'vendas': 'tipo_venda', 'cobrancas': None, 'consultas': None, 'procedimentos': 'tipo_procedimento'}
+
+ESCALA_TAXA = 10000
+
+_cache = {'geracao': None, 'regras': None}
+
+
+def popular_regras_padrao():
+    if db.session.query(RegraComissao.id).first() is not None:
+        return
+    for categoria, tipo, modo, taxa, divisor in REGRAS_PADRAO:
+        db.session.add(RegraComissao(categoria=categoria, tipo=tipo, modo=modo, taxa=taxa,
+                                     divisor=divisor, vigente_desde=INICIO_REGRAS_PADRAO))
+    incrementar_geracao(db.session, [REGRAS])
+    db.session.commit()
+    invalidar_cache()
+
+
+def invalidar_cache():
+    _cache['regras'] = None
+    cache.esquecer_geracao(REGRAS)
+
+
+def _inteiro(taxa):
+    # Taxa em décimos de milésimo (a coluna tem 4 casas): 0.05 -> 500, 20.00 -> 200000
+    return int((Decimal(str(taxa)) * ESCALA_TAXA).to_integral_value(ROUND_HALF_UP))
+
+
+def regras():
+    """Regras por categoria, ordenadas por vigência (em memória até a geração REGRAS mudar)."""
+    geracao = cache.geracao_banco(REGRAS)
+    if _cache['regras'] is None or _cache['geracao'] != geracao:
+        por_categoria = {}
+        for r in RegraComissao.query.order_by(RegraComissao.vigente_desde).all():
+            por_categoria.setdefault(r.categoria, []).append(
+                (r.tipo, r.modo, _inteiro(r.taxa), r.divisor or 1, r.vigente_desde))
+        _cache['regras'] = por_categoria
+        _cache['geracao'] = geracao
+    return _cache['regras']
+
+
+def _regra_vigente(categoria, tipo, data):
+    especifica = geral = None
+    for regra in regras().get(categoria, []):
+        if regra[4] > data:
+            break
+        if regra[0] is None:
+            geral = regra
+        elif regra[0] == tipo:
+            especifica = regra
+    return especifica or geral
+
+
+def calcular(categoria, data, valor_centavos=0, tipo=None):
+    """Comissão de um item em centavos. Sem regra vigente a comissão é 0."""
+    regra = _regra_vigente(categoria, tipo, data)
+    if regra is None:
+        return 0
+    _, modo, taxa, divisor, _ = regra
+    if modo == 'fixo':
+        return dinheiro.dividir(taxa, ESCALA_TAXA // 100)
+    return dinheiro.dividir((valor_centavos or 0) * taxa, divisor * ESCALA_TAXA)
+
+
+def adicionar_regra(categoria, tipo, modo, taxa, vigente_desde, divisor=1):
+    # Garante as regras originais antes, senão a tabela ficaria só com a nova
+    popular_regras_padrao()
+    db.session.add(RegraComissao(categoria=categoria, tipo=tipo, modo=modo, taxa=taxa,
+                                 divisor=divisor, vigente_desde=vigente_desde))
+    incrementar_geracao(db.session, [REGRAS])
+    db.session.commit()
+    invalidar_cache()
+
+
+def _janelas(categoria):
+    # (tipo, modo, taxa, divisor, inicio, fim) de cada regra; fim = início da próxima do mesmo tipo
+    lista = regras().get(categoria, [])
+    janelas = []
+    for i, (tipo, modo, taxa, divisor, desde) in enumerate(lista):
+        proxima = next((r[4] for r in lista[i + 1:] if r[0] == tipo), None)
+        janelas.append((tipo, modo, taxa, divisor, desde, proxima))
+    return janelas
+
+
+def aplicar_regras(categoria, inicio, fim, *filtros_extra):
+    """Reaplica as regras aos itens da categoria com data em [inicio, fim) que atendem aos filtros.
+
+    Um UPDATE por regra, mais a sincronização do livro de lançamentos; não mexe no resumo
+    mensal. Retorna o nº de linhas alteradas.
+    """
+    modelo, col_data, col_valor = resumo.CATEGORIAS[categoria]
+    data = getattr(modelo, col_data)
+    coluna_tipo = getattr(modelo, COLUNA_TIPO[categoria]) if COLUNA_TIPO[categoria] else None
+    janelas = _janelas(categoria)
+    # Início da primeira regra específica de cada tipo: a partir dali a regra geral não vale
+    primeira_especifica = {}
+    for tipo, _, _, _, desde, _ in janelas:
+        if tipo is not None and tipo not in primeira_especifica:
+            primeira_especifica[tipo] = desde
+
+    alteradas = 0
+    for tipo, modo, taxa, divisor, desde, proxima in janelas:
+        filtros = [periodos.no_intervalo(data, max(inicio, desde), min(fim, proxima) if proxima else fim),
+                   *filtros_extra]
+        if tipo is not None:
+            if coluna_tipo is None:
+                continue
+            filtros.append(coluna_tipo == tipo)
+        elif coluna_tipo is not None:
+            for t, d in primeira_especifica.items():
+                filtros.append(or_(coluna_tipo.is_(None), coluna_tipo != t, data < d))
+
+        # Mesma conta de dinheiro.dividir(): (2 * valor * taxa + d) / (2 * d) em divisão inteira,
+        # igual nos dois bancos (valores não negativos), sem passar por float ou numeric
+        if modo == 'fixo':
+            centavos = literal(dinheiro.dividir(taxa, ESCALA_TAXA // 100), db.BigInteger)
+        elif col_valor:
+            d = divisor * ESCALA_TAXA
+            centavos = ((getattr(modelo, col_valor) * literal(2 * taxa, db.BigInteger) + d)
+                        // literal(2 * d, db.BigInteger))
+        else:
+            centavos = literal(0, db.BigInteger)
+        resultado = db.session.execute(
+            update(modelo).where(*filtros)
+            .values(comissao_centavos=centavos, comissao_calculada=centavos / literal(100.0, db.Numeric(10, 2)))
+            .execution_options(synchronize_session=False))
+        alteradas += resultado.rowcount
+    lancamentos.sincronizar(categoria, periodos.no_intervalo(data, inicio, fim), *filtros_extra)
+    return alteradas
+
+
+def recalcular_periodo(inicio, fim, user_id=None, categoria=None):
+    """Reaplica as regras aos itens com data em [inicio, fim). Um UPDATE por regra.
+
+    Depois atualiza o resumo mensal dos meses afetados. Retorna o nº de linhas alteradas.
+    """
+    categorias = [categoria] if categoria else list(resumo.CATEGORIAS)
+    alteradas = 0
+    for cat in categorias:
+        modelo, col_data, _ = resumo.CATEGORIAS[cat]
+        filtros = [modelo.user_id == user_id] if user_id is not None else []
+        alteradas += aplicar_regras(cat, inicio, fim, *filtros)
+        if user_id is None:
+            # Cada dono marcado: o carimbo da sincronização não vale para "todos" (ver sincronizacao.py)
+            donos = select(modelo.user_id).where(periodos.no_intervalo(getattr(modelo, col_data), inicio, fim))
+            for (dono,) in db.session.execute(donos.distinct()):
+                resumo.marcar_alterado(dono)
+
+    resumo.reconstruir_periodo(inicio, fim, user_id)
+    return alteradas
@@ -1,12 +1,84 @@
 import os
 
+
+def _url(variavel):
+    url = os.getenv(variavel)
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def _opcoes_engine(url):
+    # Pool de conexões (PostgreSQL). Cada worker/processo tem o seu pool: com gunicorn gthread o
+    # tamanho deve cobrir as threads do worker (GUNICORN_THREADS)
+    if url.startswith('sqlite'):
+        return {'connect_args': {'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000)) / 1000}}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # antes do timeout de conexões ociosas do provedor
+        'pool_pre_ping': True,
+    }
+
+
 class Config:
     basedir = os.path.abspath(os.path.dirname(__file__))
     # Configuração do Banco de Dados: Prioriza variável de ambiente (Render), senão usa SQLite local
-    database_url = os.getenv('DATABASE_URL')
-    if database_url and database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql://", 1)
-    
+    database_url = _url('DATABASE_URL')
+
     SQLALCHEMY_DATABASE_URI = database_url or 'sqlite:///' + os.path.join(basedir, 'comissoes_prod.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _opcoes_engine(SQLALCHEMY_DATABASE_URI)
+    # Réplica de leitura opcional (replica.py): home, /geral, listas, busca e exportação leem dela
+    replica_url = _url('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {}
+    if replica_url:
+        SQLALCHEMY_BINDS['replica'] = dict(_opcoes_engine(replica_url), url=replica_url)
+        if not replica_url.startswith('sqlite'):
+            SQLALCHEMY_BINDS['replica']['connect_args'] = {'connect_timeout': int(os.getenv('REPLICA_CONNECT_TIMEOUT', 3))}
+    REPLICA_ATRASO_MAX = float(os.getenv('REPLICA_ATRASO_MAX', 10))  # segundos; mais que isso lê do primário
+    REPLICA_VERIFICACAO = float(os.getenv('REPLICA_VERIFICACAO', 15))  # segundos entre verificações da réplica
+    REPLICA_JANELA_ESCRITA = float(os.getenv('REPLICA_JANELA_ESCRITA', 30))  # depois de gravar, o usuário lê do primário
+    # SQLite: WAL deixa leitores e um escritor trabalharem ao mesmo tempo (ver banco.py)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000))
+    SQLITE_MMAP_BYTES = int(os.getenv('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))
     SECRET_KEY = os.getenv('SECRET_KEY', 'chave_secreta_padrao_desenvolvimento')
+    # Itens por página nas listas (Vendas, Cobranças, Consultas, Procedimentos)
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+    # Cache do dashboard e do /geral: 'memoria' (LRU por processo), 'sqlite' (compartilhado entre workers) ou 'nenhum'.
+    # Em qualquer backend as escritas de outros processos invalidam o cache (ver cache.py); no de memória
+    # elas aparecem em até CACHE_GERACAO_INTERVALO segundos.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memoria')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+    CACHE_MAX_ITENS = int(os.getenv('CACHE_MAX_ITENS', 1024))
+    CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', os.path.join(basedir, 'cache_dashboard.db'))
+    CACHE_GERACAO_INTERVALO = float(os.getenv('CACHE_GERACAO_INTERVALO', 2))
+    # Identidade do usuário logado em memória/sessão (segundos até reconsultar o banco)
+    IDENTIDADE_TTL = int(os.getenv('IDENTIDADE_TTL', 60))
+    IDENTIDADE_MAX_ITENS = int(os.getenv('IDENTIDADE_MAX_ITENS', 4096))
+    # Métricas por rota (/admin/metricas e /metrics)
+    METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', '1') == '1'
+    METRICAS_AMOSTRAGEM = float(os.getenv('METRICAS_AMOSTRAGEM', 1.0))  # fração das requisições medidas
+    METRICAS_LENTO_MS = int(os.getenv('METRICAS_LENTO_MS', 1000))  # acima disso vai para o log
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')  # se definido, /metrics aceita "Authorization: Bearer <token>"
+    # Hash de senhas (senhas.py). SENHA_METODO no formato do werkzeug, ex. "scrypt:32768:8:1" ou
+    # "pbkdf2:sha256:600000"; vazio usa o padrão do werkzeug. Hashes antigos são refeitos no login.
+    SENHA_METODO = os.getenv('SENHA_METODO') or None
+    SENHA_THREADS = int(os.getenv('SENHA_THREADS', 2))  # hashes simultâneos por worker
+    SENHA_MAX_PENDENTES = int(os.getenv('SENHA_MAX_PENDENTES', 8))  # em andamento + na fila
+    SENHA_ESPERA = float(os.getenv('SENHA_ESPERA', 5))  # segundos esperando vaga antes de responder 503
+    # Senhas erradas por usuário na janela, contadas em cada worker (N workers aceitam N vezes mais)
+    SENHA_TENTATIVAS = int(os.getenv('SENHA_TENTATIVAS', 5))
+    SENHA_JANELA = int(os.getenv('SENHA_JANELA', 300))
+    # Migrações ("flask migrar", migracoes.py): preenchimentos em lotes por id, uma transação por lote
+    MIGRACAO_LOTE = int(os.getenv('MIGRACAO_LOTE', 5000))
+    MIGRACAO_PAUSA = float(os.getenv('MIGRACAO_PAUSA', 0))  # segundos entre lotes, para aliviar o banco em uso
+    MIGRACAO_LOCK_TIMEOUT_MS = int(os.getenv('MIGRACAO_LOCK_TIMEOUT_MS', 3000))  # PostgreSQL: espera máxima do ALTER TABLE
+    # Tarefas em segundo plano (tarefas.py, "flask worker")
+    TAREFAS_DIR = os.getenv('TAREFAS_DIR', os.path.join(basedir, 'arquivos_tarefas'))  # arquivos gerados
+    TAREFAS_POR_USUARIO = int(os.getenv('TAREFAS_POR_USUARIO', 1))  # executando ao mesmo tempo
+    TAREFAS_MAX_PENDENTES = int(os.getenv('TAREFAS_MAX_PENDENTES', 5))  # na fila + executando
+    TAREFAS_TENTATIVAS = int(os.getenv('TAREFAS_TENTATIVAS', 3))
+    TAREFAS_RESERVA = int(os.getenv('TAREFAS_RESERVA', 900))  # segundos sem progresso até liberar a tarefa
+    TAREFAS_RETENCAO_DIAS = int(os.getenv('TAREFAS_RETENCAO_DIAS', 7))
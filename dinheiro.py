@@ -0,0 +1,64 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Valores em dinheiro são inteiros em centavos do banco até a tela.
+#
+# Regras de arredondamento (as mesmas em Python e nos UPDATEs em SQL, ver comissoes.py):
+# - valores digitados/importados são arredondados para o centavo, metade para cima;
+# - cada comissão percentual é arredondada para o centavo, metade para cima, item a item;
+# - totais são somas exatas de centavos (nunca se arredonda um total).
+
+# Com ponto e vírgula juntos só vale o formato brasileiro: pontos de milhar antes de uma vírgula final
+_MILHAR_BR = re.compile(r'[+-]?\d{1,3}(\.\d{3})+,\d*')
+# Só com pontos agrupando de três em três ("1.234", "1.234.567") não dá para saber se são milhares
+_SO_MILHAR = re.compile(r'[+-]?\d{1,3}(\.\d{3})+')
+
+
+def centavos(valor):
+    """Converte 1234.5, "1234,50", "1.234,50" ou "R$ 1234,50" em 123450. ValueError se inválido."""
+    if valor is None or valor == '':
+        raise ValueError('valor vazio')
+    if isinstance(valor, float):
+        texto = repr(valor)
+    else:
+        texto = str(valor).strip().replace('R$', '').replace(' ', '')
+        if _SO_MILHAR.fullmatch(texto):
+            raise ValueError(f'valor ambíguo "{valor}" (use 1.234,00 ou 1234.00)')
+    if ',' in texto:
+        # Formato brasileiro: 1.234,56 ("1,234.56" é recusado, não lido como 1,23)
+        if '.' in texto and not _MILHAR_BR.fullmatch(texto):
+            raise ValueError(f'valor inválido "{valor}" (use 1.234,56 ou 1234.56)')
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f'valor inválido "{valor}"')
+    if not numero.is_finite():
+        raise ValueError(f'valor inválido "{valor}"')
+    return int((numero * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def reais(valor_centavos):
+    """Decimal exato em reais (para as colunas Numeric antigas e para JSON/CSV)."""
+    return None if valor_centavos is None else Decimal(valor_centavos).scaleb(-2)
+
+
+def dividir(numerador, denominador):
+    """numerador / denominador arredondado para o inteiro mais próximo, metade para longe do zero."""
+    inteiro = (2 * abs(numerador) + denominador) // (2 * denominador)
+    return -inteiro if numerador < 0 else inteiro
+
+
+def formatar(valor_centavos):
+    """123456 -> "1234,56" (o formato usado nas telas e nos CSVs)."""
+    if valor_centavos is None:
+        return ''
+    valor_centavos = int(valor_centavos)
+    sinal = '-' if valor_centavos < 0 else ''
+    inteiro, resto = divmod(abs(valor_centavos), 100)
+    return f'{sinal}{inteiro},{resto:02d}'
+
+
+def init_app(app):
+    # {{ total|dinheiro }} nos templates
+    app.add_template_filter(formatar, 'dinheiro')
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import delete, extract, func, literal, select, update
+from models import db, normalizar_nome
+import comissoes
+import lancamentos
+import resumo
+import sincronizacao
+
+# Edição e exclusão em lote dos itens marcados nas listas.
+#
+# Cada operação roda numa transação só: um DELETE/UPDATE para o conjunto de ids, sempre
+# filtrado pelo dono (ids de outro usuário são ignorados e não entram na contagem), comissões
+# refeitas com comissoes.aplicar_regras (um UPDATE por regra), o livro de lançamentos
+# sincronizado e o resumo mensal ajustado uma vez por mês afetado. Itens de anos arquivados não
+# aparecem nas listas e não são alterados.
+
+MAX_ITENS = 1000
+
+# categoria -> campos que podem ser alterados em lote (nome do campo = coluna)
+CAMPOS = {
+    'vendas': ('nome_cliente', 'data_venda', 'tipo_venda'),
+    'cobrancas': ('nome_cliente', 'data_negociacao'),
+    'consultas': ('nome_cliente', 'data_consulta'),
+    'procedimentos': ('nome_cliente', 'data_procedimento', 'tipo_procedimento'),
+}
+
+
+class ErroLote(Exception):
+    pass
+
+
+def _ids(ids):
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        raise ErroLote('Nenhum item selecionado.')
+    if len(ids) > MAX_ITENS:
+        raise ErroLote(f'Selecione no máximo {MAX_ITENS} itens por vez.')
+    return ids
+
+
+def _valores(categoria, campos):
+    # Converte os campos do formulário (textos) nos valores das colunas
+    valores = {}
+    for campo, texto in campos.items():
+        if campo not in CAMPOS[categoria]:
+            raise ErroLote(f'Campo "{campo}" não pode ser alterado em lote.')
+        texto = (texto or '').strip()
+        if not texto:
+            continue
+        if campo.startswith('data_'):
+            try:
+                valores[campo] = date.fromisoformat(texto)
+            except ValueError:
+                raise ErroLote(f'Data inválida "{texto}" (use AAAA-MM-DD).')
+        elif campo == 'tipo_venda' and texto not in comissoes.TIPOS_VENDA:
+            raise ErroLote(f'Tipo de venda inválido "{texto}".')
+        else:
+            valores[campo] = texto
+    if not valores:
+        raise ErroLote('Informe ao menos um campo para alterar.')
+    if 'nome_cliente' in valores:
+        # UPDATE em massa não passa pelo @validates do modelo
+        valores['nome_busca'] = normalizar_nome(valores['nome_cliente'])
+    return valores
+
+
+def _totais_por_mes(categoria, filtros):
+    # {(ano, mes): [qtd, bruto, comissao]} dos itens filtrados, agregado no banco
+    modelo, col_data, col_bruto = resumo.CATEGORIAS[categoria]
+    data = getattr(modelo, col_data)
+    ano, mes = extract('year', data), extract('month', data)
+    bruto = func.sum(getattr(modelo, col_bruto)) if col_bruto else literal(0)
+    sql = (select(ano, mes, func.count(), bruto, func.sum(modelo.comissao_centavos))
+           .where(*filtros).group_by(ano, mes))
+    return {(int(a), int(m)): [q, int(b or 0), int(c or 0)] for a, m, q, b, c in db.session.execute(sql)}
+
+
+def _ajustar_resumo(categoria, user_id, antes, depois):
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for sinal, totais in ((-1, antes), (1, depois)):
+        for chave, valores in totais.items():
+            for i, v in enumerate(valores):
+                deltas[chave][i] += sinal * v
+    for (ano, mes), (qtd, bruto, comissao) in deltas.items():
+        if qtd or bruto or comissao:
+            resumo.somar(user_id, ano, mes, categoria, qtd, bruto, comissao)
+
+
+def excluir(categoria, user_id, ids):
+    """Exclui os itens do usuário com esses ids. Retorna quantos foram excluídos."""
+    ids = _ids(ids)
+    modelo, col_data, col_bruto = resumo.CATEGORIAS[categoria]
+    bruto = getattr(modelo, col_bruto) if col_bruto else literal(0)
+    try:
+        # RETURNING devolve o que saiu, para descontar do resumo sem reler a tabela
+        removidos = db.session.execute(
+            delete(modelo).where(modelo.user_id == user_id, modelo.id.in_(ids))
+            .returning(modelo.id, getattr(modelo, col_data), bruto, modelo.comissao_centavos)
+            .execution_options(synchronize_session=False)).all()
+        lancamentos.remover(categoria, [r[0] for r in removidos])
+        sincronizacao.registrar_exclusoes(categoria, user_id, [r[0] for r in removidos])
+        antes = defaultdict(lambda: [0, 0, 0])
+        for _, data, valor, comissao in removidos:
+            totais = antes[(data.year, data.month)]
+            totais[0] += 1
+            totais[1] += valor or 0
+            totais[2] += comissao or 0
+        _ajustar_resumo(categoria, user_id, antes, {})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(removidos)
+
+
+def atualizar(categoria, user_id, ids, campos):
+    """Altera cliente, data e/ou tipo dos itens do usuário com esses ids. Retorna quantos foram alterados."""
+    ids = _ids(ids)
+    valores = _valores(categoria, campos)
+    modelo = resumo.CATEGORIAS[categoria][0]
+    filtros = [modelo.user_id == user_id, modelo.id.in_(ids)]
+    # Data ou tipo podem mudar a regra de comissão e o mês do resumo; só o cliente, não
+    muda_comissao = bool(set(valores) - {'nome_cliente', 'nome_busca'})
+    try:
+        antes = None
+        if muda_comissao:
+            # Trava as linhas (PostgreSQL) para que os totais lidos sejam os que serão alterados
+            db.session.execute(select(modelo.id).where(*filtros).with_for_update())
+            antes = _totais_por_mes(categoria, filtros)
+        alterados = db.session.execute(
+            update(modelo).where(*filtros).values(**valores)
+            .execution_options(synchronize_session=False)).rowcount
+        if muda_comissao:
+            # Sem regra vigente na nova data a comissão é 0, como em comissoes.calcular()
+            db.session.execute(update(modelo).where(*filtros).values(comissao_centavos=0, comissao_calculada=0)
+                               .execution_options(synchronize_session=False))
+            comissoes.aplicar_regras(categoria, date.min, date.max, *filtros)
+            _ajustar_resumo(categoria, user_id, antes, _totais_por_mes(categoria, filtros))
+        else:
+            lancamentos.sincronizar(categoria, *filtros)
+        # O detalhamento em cache do /geral mostra o nome do cliente
+        resumo.marcar_alterado(user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return alterados
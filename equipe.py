@@ -0,0 +1,120 @@
+import csv
+import io
+from datetime import date, timedelta
+from sqlalchemy import case, func, select
+from models import db, User, ResumoMensal
+from relatorio import Linha, MESES_NOMES
+from resumo import CATEGORIAS
+from exportacao import intervalo_da_requisicao
+import dinheiro
+import periodos
+
+# Visão da equipe para a administração, lida só do resumo mensal:
+# uma query agrupada para todos os vendedores, qualquer que seja o nº de usuários e de meses.
+# Valores em centavos.
+
+ORDENACOES = {
+    'nome': User.full_name,
+    'comissao': 'comissao',
+    'bruto': 'bruto',
+    'itens': 'itens',
+    **{cat: f'qtd_{cat}' for cat in CATEGORIAS},
+}
+
+
+def periodo_da_requisicao(args):
+    """(inicio, fim) meio-aberto em meses inteiros; padrão: mês atual.
+
+    Aceita ?mes=&ano=, ?ano= ou ?inicio=&fim= (datas são arredondadas para o mês, o resumo é mensal).
+    ValueError se o período for inválido.
+    """
+    inicio, fim = intervalo_da_requisicao(args)
+    hoje = date.today()
+    if inicio is None and fim is None:
+        return periodos.intervalo_mes(hoje.year, hoje.month)
+    inicio = (inicio or date(2000, 1, 1)).replace(day=1)
+    ultimo = (fim or hoje + timedelta(days=1)) - timedelta(days=1)
+    periodos.validar(ultimo.year)
+    return inicio, periodos.intervalo_mes(ultimo.year, ultimo.month)[1]
+
+
+def _chave(d):
+    return d.year * 100 + d.month
+
+
+def _meses(inicio, fim):
+    return (fim.year - inicio.year) * 12 + fim.month - inicio.month
+
+
+def _filtro_periodo(inicio, fim):
+    chave = ResumoMensal.ano * 100 + ResumoMensal.mes
+    return [chave >= _chave(inicio), chave < _chave(fim)]
+
+
+def consulta(inicio, fim, ordenar='comissao', decrescente=True):
+    colunas = [
+        ResumoMensal.user_id,
+        func.sum(ResumoMensal.comissao_centavos).label('comissao'),
+        func.sum(ResumoMensal.bruto_centavos).label('bruto'),
+        func.sum(ResumoMensal.qtd).label('itens'),
+    ]
+    for cat in CATEGORIAS:
+        colunas.append(func.sum(case((ResumoMensal.categoria == cat, ResumoMensal.qtd), else_=0)).label(f'qtd_{cat}'))
+        colunas.append(func.sum(case((ResumoMensal.categoria == cat, ResumoMensal.comissao_centavos), else_=0))
+                       .label(f'comissao_{cat}'))
+    agregado = (select(*colunas).where(*_filtro_periodo(inicio, fim))
+                .group_by(ResumoMensal.user_id).subquery())
+
+    # LEFT JOIN: vendedores sem movimento no período aparecem zerados
+    valores = [func.coalesce(c, 0).label(c.name) for c in agregado.c if c.name != 'user_id']
+    sql = select(User.id, User.full_name, *valores).outerjoin(agregado, agregado.c.user_id == User.id)
+
+    chave = ORDENACOES.get(ordenar, 'comissao')
+    coluna = chave if not isinstance(chave, str) else next(v for v in valores if v.name == chave)
+    return sql.order_by(coluna.desc() if decrescente else coluna.asc(), User.full_name)
+
+
+def ranking(inicio, fim, ordenar='comissao', decrescente=True):
+    meses = max(_meses(inicio, fim), 1)
+    linhas = []
+    for posicao, r in enumerate(db.session.execute(consulta(inicio, fim, ordenar, decrescente)), 1):
+        linha = Linha(r._mapping)
+        linha['posicao'] = posicao
+        linha['comissao_mensal'] = dinheiro.dividir(int(linha.comissao), meses)
+        linhas.append(linha)
+    return linhas
+
+
+def estatisticas_vendedor(user_id, inicio, fim):
+    """Mês a mês de um vendedor no período: [Linha(ano, mes, nome_mes, comissao, bruto, itens, qtd_<cat>)]."""
+    colunas = [
+        ResumoMensal.ano, ResumoMensal.mes,
+        func.sum(ResumoMensal.comissao_centavos).label('comissao'),
+        func.sum(ResumoMensal.bruto_centavos).label('bruto'),
+        func.sum(ResumoMensal.qtd).label('itens'),
+    ]
+    for cat in CATEGORIAS:
+        colunas.append(func.sum(case((ResumoMensal.categoria == cat, ResumoMensal.qtd), else_=0)).label(f'qtd_{cat}'))
+    sql = (select(*colunas).where(ResumoMensal.user_id == user_id, *_filtro_periodo(inicio, fim))
+           .group_by(ResumoMensal.ano, ResumoMensal.mes)
+           .order_by(ResumoMensal.ano.desc(), ResumoMensal.mes.desc()))
+    linhas = []
+    for r in db.session.execute(sql):
+        linha = Linha(r._mapping)
+        linha['nome_mes'] = f'{MESES_NOMES[r.mes]}/{r.ano}'
+        linhas.append(linha)
+    return linhas
+
+
+def gerar_csv(linhas):
+    # Separador ";" e vírgula decimal, como na exportação do histórico
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    escritor.writerow(['posicao', 'user_id', 'vendedor', 'comissao', 'comissao_mensal', 'bruto', 'itens']
+                      + [f'qtd_{cat}' for cat in CATEGORIAS] + [f'comissao_{cat}' for cat in CATEGORIAS])
+    for l in linhas:
+        escritor.writerow([l.posicao, l.id, l.full_name, dinheiro.formatar(l.comissao),
+                           dinheiro.formatar(l.comissao_mensal), dinheiro.formatar(l.bruto), l.itens]
+                          + [l[f'qtd_{cat}'] for cat in CATEGORIAS]
+                          + [dinheiro.formatar(l[f'comissao_{cat}']) for cat in CATEGORIAS])
+    return buffer.getvalue()
@@ -0,0 +1,164 @@
+import time
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.exc import OperationalError
+from models import db
+
+# Ajustes de esquema que o db.create_all() não faz em tabelas que já existem:
+# colunas novas (com default no servidor) e índices novos.
+#
+# Sem tirar a aplicação do ar:
+# - ADD COLUMN só acrescenta colunas anuláveis ou com DEFAULT constante (no PostgreSQL 11+ e no
+#   SQLite não reescreve a tabela); o preenchimento de colunas novas é feito em lotes (preenchimento.py);
+# - no PostgreSQL o ALTER TABLE roda com lock_timeout curto e tenta de novo, para não enfileirar as
+#   requisições atrás de uma transação longa;
+# - no PostgreSQL os índices são criados com CREATE INDEX CONCURRENTLY (não bloqueia escritas).
+
+TENTATIVAS_DDL = 5
+
+
+def _postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def executar_ddl(ddl):
+    """Executa um ALTER TABLE; no PostgreSQL desiste rápido se a tabela estiver travada e tenta de novo."""
+    for tentativa in range(1, TENTATIVAS_DDL + 1):
+        try:
+            with db.engine.begin() as conn:
+                if _postgres():
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{int(current_app.config['MIGRACAO_LOCK_TIMEOUT_MS'])}ms'"))
+                conn.execute(text(ddl))
+            return
+        except OperationalError:
+            if not _postgres() or tentativa == TENTATIVAS_DDL:
+                raise
+            time.sleep(tentativa)
+
+
+def _colunas_faltantes():
+    inspetor = inspect(db.engine)
+    for tabela in db.metadata.sorted_tables:
+        if not inspetor.has_table(tabela.name):
+            continue
+        existentes = {c['name'] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            tipo = coluna.type.compile(dialect=db.engine.dialect)
+            ddl = f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'
+            if coluna.server_default is not None:
+                ddl += f' DEFAULT {coluna.server_default.arg}'
+            if not coluna.nullable:
+                ddl += ' NOT NULL'
+            yield ddl
+
+
+def _indices_faltantes():
+    inspetor = inspect(db.engine)
+    for tabela in db.metadata.sorted_tables:
+        existentes = {i['name'] for i in inspetor.get_indexes(tabela.name)} if inspetor.has_table(tabela.name) else set()
+        for index in tabela.indexes:
+            if index.name not in existentes:
+                yield index
+
+
+def _indices_invalidos():
+    # CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido com o mesmo nome
+    sql = text('SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid')
+    with db.engine.connect() as conn:
+        return {nome for (nome,) in conn.execute(sql)}
+
+
+def _criar_indice(index):
+    if not _postgres():
+        index.create(db.engine, checkfirst=True)
+        return
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if index.name in _indices_invalidos():
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+        index.dialect_kwargs['postgresql_concurrently'] = True
+        try:
+            index.create(conn, checkfirst=True)
+        finally:
+            del index.dialect_kwargs['postgresql_concurrently']
+
+
+def remover_indice(nome):
+    """DROP INDEX IF EXISTS; no PostgreSQL com CONCURRENTLY (não bloqueia escritas)."""
+    if not _postgres():
+        executar_ddl(f'DROP INDEX IF EXISTS {nome}')
+        return
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {nome}'))
+
+
+def plano():
+    """O que garantir_esquema() faria, sem executar nada (para "flask migrar --simular")."""
+    inspetor = inspect(db.engine)
+    passos = [f'CREATE TABLE {t.name}' for t in db.metadata.sorted_tables if not inspetor.has_table(t.name)]
+    passos += list(_colunas_faltantes())
+    # Tabelas novas já saem com os seus índices
+    passos += [f'CREATE INDEX {i.name} ON {i.table.name}' for i in _indices_faltantes() if inspetor.has_table(i.table.name)]
+    return passos
+
+
+def garantir_esquema():
+    # create_all só cria tabelas novas (vazias); os índices delas saem junto
+    db.create_all()
+    for ddl in list(_colunas_faltantes()):
+        executar_ddl(ddl)
+    for index in list(_indices_faltantes()):
+        _criar_indice(index)
+
+
+def sqlite_sem_autoincrement(tabela):
+    """SQLite: a tabela existe e foi criada sem AUTOINCREMENT (ids de linhas apagadas voltam a ser usados)."""
+    with db.engine.connect() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                           {'nome': tabela.name}).scalar()
+    return sql is not None and 'AUTOINCREMENT' not in sql.upper()
+
+
+def recriar_tabela_sqlite(tabela, id_minimo=0):
+    """Recria uma tabela do SQLite com a definição atual do models.py, copiando as linhas.
+
+    O SQLite não altera a definição da chave primária com ALTER TABLE. Tudo roda numa transação
+    só (DDL inclusive): se algo falhar, a tabela antiga fica como estava. id_minimo ajusta a
+    sequência do AUTOINCREMENT para não voltar a usar ids abaixo dele.
+    """
+    temporaria = f'_{tabela.name}_antiga'
+    conexao = db.engine.raw_connection()
+    try:
+        dbapi = conexao.driver_connection
+        nivel = dbapi.isolation_level
+        dbapi.isolation_level = None  # BEGIN/COMMIT explícitos, para o DDL entrar na transação
+        cursor = dbapi.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            existentes = {linha[1] for linha in cursor.execute(f'PRAGMA table_info({tabela.name})')}
+            indices = [linha[0] for linha in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (tabela.name,))]
+            for nome in indices:
+                cursor.execute(f'DROP INDEX {nome}')
+            cursor.execute(f'ALTER TABLE {tabela.name} RENAME TO {temporaria}')
+            cursor.execute(str(CreateTable(tabela).compile(dialect=db.engine.dialect)))
+            colunas = ', '.join(c.name for c in tabela.columns if c.name in existentes)
+            cursor.execute(f'INSERT INTO {tabela.name} ({colunas}) SELECT {colunas} FROM {temporaria}')
+            cursor.execute(f'DROP TABLE {temporaria}')
+            for index in tabela.indexes:
+                cursor.execute(str(CreateIndex(index).compile(dialect=db.engine.dialect)))
+            maior = cursor.execute(f'SELECT MAX(id) FROM {tabela.name}').fetchone()[0] or 0
+            sequencia = max(maior, id_minimo)
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (tabela.name,))
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (tabela.name, sequencia))
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            dbapi.isolation_level = nivel
+    finally:
+        conexao.close()
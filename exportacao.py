@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+from sqlalchemy import select
+from models import db, Lancamento
+from resumo import CATEGORIAS
+import dinheiro
+import periodos
+
+# Exportação em streaming: as linhas saem do banco em lotes (yield_per / cursor no servidor)
+# e são escritas uma a uma na resposta, então a memória não cresce com o tamanho do período.
+
+TAMANHO_LOTE = 1000
+COLUNAS = ('categoria', 'id', 'data', 'nome_cliente', 'tipo', 'valor', 'comissao')
+
+
+def consulta(user_id, categorias, inicio=None, fim=None):
+    """SELECT no livro de lançamentos (incluindo anos arquivados) das categorias pedidas, ordenado por data."""
+    q = select(
+        Lancamento.categoria,
+        Lancamento.item_id.label('id'),
+        Lancamento.data,
+        Lancamento.nome_cliente,
+        Lancamento.subtipo.label('tipo'),
+        Lancamento.bruto_centavos.label('valor'),
+        Lancamento.comissao_centavos.label('comissao'),
+    ).where(Lancamento.user_id == user_id)
+    if set(categorias) != set(CATEGORIAS):
+        q = q.where(Lancamento.categoria.in_(categorias))
+    if inicio:
+        q = q.where(Lancamento.data >= inicio)
+    if fim:
+        q = q.where(Lancamento.data < fim)
+    return q.order_by(Lancamento.data, Lancamento.categoria, Lancamento.item_id)
+
+
+def linhas(user_id, categorias, inicio=None, fim=None):
+    resultado = db.session.execute(consulta(user_id, categorias, inicio, fim).execution_options(yield_per=TAMANHO_LOTE))
+    for row in resultado:
+        yield row
+
+
+def gerar_csv(registros):
+    # Separador ";" e vírgula decimal, como o Excel em português espera
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    escritor.writerow(COLUNAS)
+    for r in registros:
+        escritor.writerow((r.categoria, r.id, r.data.isoformat(), r.nome_cliente, r.tipo or '',
+                           dinheiro.formatar(r.valor), dinheiro.formatar(r.comissao)))
+        # Esvazia o buffer a cada bloco de linhas para manter a memória constante
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_jsonl(registros):
+    for r in registros:
+        yield json.dumps({
+            'categoria': r.categoria, 'id': r.id, 'data': r.data.isoformat(), 'nome_cliente': r.nome_cliente,
+            'tipo': r.tipo,
+            'valor': None if r.valor is None else r.valor / 100,
+            'comissao': None if r.comissao is None else r.comissao / 100,
+        }, ensure_ascii=False) + '\n'
+
+
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (gerar_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def intervalo_da_requisicao(args):
+    """(inicio, fim) a partir de ?mes=&ano=, ?ano= ou ?inicio=&fim= (fim inclusivo). None = sem limite.
+
+    ValueError se o período for inválido (ex.: mes=13); as rotas respondem 400.
+    """
+    mes, ano = args.get('mes', type=int), args.get('ano', type=int)
+    if ano and mes:
+        periodos.validar(ano, mes)
+        return periodos.intervalo_mes(ano, mes)
+    if ano:
+        periodos.validar(ano)
+        return periodos.intervalo_ano(ano)
+    inicio = args.get('inicio', type=date.fromisoformat)
+    fim = args.get('fim', type=date.fromisoformat)
+    if fim == date.max:
+        raise ValueError(f'fim inválido: {fim}')
+    return inicio, (fim + timedelta(days=1)) if fim else None
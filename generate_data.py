@@ -0,0 +1,140 @@
+"""Populate the database (DATABASE_URL or the local SQLite file) with synthetic data.
+
+    python generate_data.py --users 20 --years 3 --rows 500 --seed 42
+
+--rows is the number of entries per category, per user, per year.
+All synthetic users share the password given by --password (default: senha123).
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import insert, delete
+
+from app import app
+from models import db, User, Vendas, Cobrancas, Consultas, Procedimentos, Lancamento
+import comissoes
+import lancamentos
+import migracoes
+import resumo
+import senhas
+
+sys.stdout.reconfigure(line_buffering=True)
+
+NAME_PREFIX = 'Vendedor Sintetico'
+BATCH = 5000
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elaine', 'Fabio', 'Gabriela', 'Heitor', 'Isabela', 'Joao',
+               'Larissa', 'Marcos', 'Natalia', 'Otavio', 'Paula', 'Rafael', 'Sabrina', 'Thiago', 'Vanessa']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Almeida', 'Gomes', 'Ribeiro']
+
+# Share of each type and month weights (December and March are busier, January is slow)
+SALE_TYPES = (['Talão', 'Cartão', 'PIX'], [0.5, 0.3, 0.2])
+PROCEDURE_TYPES = (['Cirurgia', 'Laser', 'Estética'], [0.7, 0.2, 0.1])
+MONTH_WEIGHTS = [0.6, 0.9, 1.2, 1.0, 1.0, 0.9, 0.8, 0.9, 1.0, 1.0, 1.1, 1.6]
+
+
+def random_dates(rng, year, n, today):
+    """n dates in the year, weighted by month and by weekday (weekends are rare)."""
+    last_month = today.month if year == today.year else 12
+    months = rng.choices(range(1, last_month + 1), weights=MONTH_WEIGHTS[:last_month], k=n)
+    result = []
+    for month in months:
+        last_day = min(28, today.day) if (year, month) == (today.year, today.month) else 28
+        while True:
+            day = date(year, month, rng.randint(1, last_day))
+            if day.weekday() < 5 or rng.random() < 0.15:
+                break
+        result.append(day)
+    return result
+
+
+def client_name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.randint(1, 999)}'
+
+
+def rows_for_user(rng, user_id, years, per_year, today):
+    sales, charges, consults, procedures = [], [], [], []
+    for year in years:
+        for d in random_dates(rng, year, per_year, today):
+            kind = rng.choices(*SALE_TYPES)[0]
+            cents = round(rng.lognormvariate(6.0, 0.8) * 100)
+            sales.append({'user_id': user_id, 'nome_cliente': client_name(rng), 'data_venda': d, 'tipo_venda': kind,
+                          'valor_total_centavos': cents,
+                          'comissao_centavos': comissoes.calcular('vendas', d, cents, kind)})
+        for d in random_dates(rng, year, per_year, today):
+            cents = round(rng.lognormvariate(6.5, 0.7) * 100)
+            charges.append({'user_id': user_id, 'nome_cliente': client_name(rng), 'data_negociacao': d,
+                            'valor_negociado_centavos': cents,
+                            'comissao_centavos': comissoes.calcular('cobrancas', d, cents)})
+        for d in random_dates(rng, year, per_year, today):
+            consults.append({'user_id': user_id, 'nome_cliente': client_name(rng), 'data_consulta': d,
+                             'status': 'Realizada', 'comissao_centavos': comissoes.calcular('consultas', d)})
+        for d in random_dates(rng, year, per_year, today):
+            kind = rng.choices(*PROCEDURE_TYPES)[0]
+            procedures.append({'user_id': user_id, 'nome_cliente': client_name(rng), 'data_procedimento': d,
+                               'tipo_procedimento': kind,
+                               'comissao_centavos': comissoes.calcular('procedimentos', d, tipo=kind)})
+    return {Vendas: sales, Cobrancas: charges, Consultas: consults, Procedimentos: procedures}
+
+
+def clear_synthetic():
+    ids = [u.id for u in User.query.filter(User.username.like(f'{NAME_PREFIX}%'))]
+    if not ids:
+        return
+    for model in (Vendas, Cobrancas, Consultas, Procedimentos, Lancamento):
+        db.session.execute(delete(model).where(model.user_id.in_(ids)))
+    db.session.execute(delete(User).where(User.id.in_(ids)))
+    db.session.commit()
+    print(f'Removed {len(ids)} synthetic users and their entries.')
+
+
+def generate(users, years, per_year, seed, password):
+    rng = random.Random(seed)
+    today = date.today()
+    year_list = list(range(today.year - years + 1, today.year + 1))
+    password_hash = senhas.gerar_hash(password)  # hashed once, shared by every user
+
+    start = time.time()
+    total = 0
+    first = User.query.filter(User.username.like(f'{NAME_PREFIX}%')).count() + 1
+    for i in range(first, first + users):
+        name = f'{NAME_PREFIX} {i:03d}'
+        user = User(username=name, full_name=name, password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        for model, rows in rows_for_user(rng, user.id, year_list, per_year, today).items():
+            for j in range(0, len(rows), BATCH):
+                db.session.execute(insert(model), rows[j:j + BATCH])
+            total += len(rows)
+        db.session.commit()
+        print(f'  {name}: {per_year * len(year_list) * 4} entries')
+
+    lancamentos.preencher(log=lambda *_: None)
+    resumo.reconstruir()
+    elapsed = time.time() - start
+    print(f'Inserted {total} entries for {users} users in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s).')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=200, help='entries per category, per user, per year')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--password', default='senha123')
+    parser.add_argument('--clear', action='store_true', help='remove previous synthetic users first')
+    args = parser.parse_args()
+
+    with app.app_context():
+        migracoes.aplicar()
+        print(f'Database: {db.engine.url.render_as_string(hide_password=True)}')
+        if args.clear:
+            clear_synthetic()
+        generate(args.users, args.years, args.rows, args.seed, args.password)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Configuração do gunicorn (carregada com "gunicorn -c gunicorn.conf.py app:app").
+# Workers gthread: cada processo atende GUNICORN_THREADS requisições ao mesmo tempo, então
+# as leituras do dashboard não ficam na fila atrás de um POST ou de uma exportação.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Padrão: 2 x CPUs + 1 processos, limitado pela memória das instâncias pequenas
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Exportações e relatórios longos; o pool de conexões (DB_POOL_SIZE) deve acompanhar threads
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers aos poucos para conter o crescimento de memória
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')  # '-' para stdout
+errorlog = '-'
+
+
+def on_starting(server):
+    # Plataformas sem fase "release": MIGRAR_AO_INICIAR=1 aplica as migrações uma vez, no
+    # processo mestre e antes de criar os workers (nunca no caminho das requisições)
+    if os.getenv('MIGRAR_AO_INICIAR') == '1':
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'migrar'], check=True)
+
+
+# Plataformas com um único processo (sem a linha "worker" do Procfile): TAREFAS_WORKERS=N
+# sobe N "flask worker" junto com o gunicorn e os encerra com ele
+_workers_tarefas = []
+
+
+def when_ready(server):
+    for _ in range(int(os.getenv('TAREFAS_WORKERS', 0))):
+        _workers_tarefas.append(subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'worker']))
+
+
+def on_exit(server):
+    for processo in _workers_tarefas:
+        processo.terminate()
+    for processo in _workers_tarefas:
+        processo.wait(timeout=60)
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import session
+from flask_login import UserMixin
+from models import db, User
+
+# Carregamento do current_user sem ir ao banco a cada requisição.
+#
+# O id guardado pelo Flask-Login (sessão e cookie "remember") é "id:versao", onde versao é
+# User.versao_sessao, incrementada a cada troca de senha. Uma sessão com versão antiga deixa
+# de ser aceita. A versão atual de cada usuário fica num cache em memória (LRU com TTL) e,
+# como segunda opção, num retrato assinado dentro da própria sessão (cookie do Flask);
+# só quando ambos expiram o usuário é lido do banco.
+# Depois de uma troca de senha, outros workers aceitam a sessão antiga por no máximo TTL segundos.
+
+
+class Identidade(UserMixin):
+    # Só o que as telas usam do usuário logado
+    def __init__(self, id, full_name, versao):
+        self.id = id
+        self.full_name = full_name
+        self.versao = versao
+
+    def get_id(self):
+        return f'{self.id}:{self.versao}'
+
+
+class _CacheVersoes:
+    def __init__(self, max_itens, ttl):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # user_id -> (versao, full_name, expira)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._itens.get(user_id)
+            if item is None or item[2] < time.time():
+                return None
+            self._itens.move_to_end(user_id)
+            return item
+
+    def set(self, user_id, versao, full_name):
+        with self._lock:
+            self._itens[user_id] = (versao, full_name, time.time() + self.ttl)
+            self._itens.move_to_end(user_id)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def remover(self, user_id):
+        with self._lock:
+            self._itens.pop(user_id, None)
+
+
+_versoes = _CacheVersoes(max_itens=4096, ttl=60)
+
+
+def configurar(max_itens, ttl):
+    _versoes.max_itens = max_itens
+    _versoes.ttl = ttl
+
+
+def _separar(user_id):
+    # Sessões antigas guardam só o id (sem versão): equivalem à versão 0
+    id_str, _, versao_str = str(user_id).partition(':')
+    return int(id_str), int(versao_str or 0)
+
+
+def carregar(user_id):
+    """user_loader do Flask-Login. Retorna Identidade ou None (sessão inválida/expirada)."""
+    try:
+        id, versao = _separar(user_id)
+    except ValueError:
+        return None
+
+    # 1. Cache do processo. Sessão com versão mais nova que a do cache: a senha foi trocada em
+    # outro worker depois que este guardou a versão; quem decide é a sessão/banco.
+    item = _versoes.get(id)
+    if item is not None and versao <= item[0]:
+        return Identidade(id, item[1], versao) if item[0] == versao else None
+
+    # 2. Retrato assinado na sessão, verificado há menos de TTL segundos
+    retrato = session.get('identidade')
+    if retrato and retrato.get('id') == id and retrato.get('versao') == versao \
+            and time.time() - retrato.get('verificado', 0) < _versoes.ttl:
+        return Identidade(id, retrato['full_name'], versao)
+
+    # 3. Banco de dados
+    user = db.session.get(User, id)
+    if user is None:
+        return None
+    _versoes.set(id, user.versao_sessao, user.full_name)
+    if user.versao_sessao != versao:
+        return None
+    guardar_na_sessao(user)
+    return Identidade(id, user.full_name, versao)
+
+
+def entrou(user):
+    """Chamar no login: a versão acabou de ser lida do banco, vale para o cache e para a sessão."""
+    _versoes.set(user.id, user.versao_sessao, user.full_name)
+    guardar_na_sessao(user)
+
+
+def guardar_na_sessao(user):
+    session['identidade'] = {'id': user.id, 'full_name': user.full_name,
+                             'versao': user.versao_sessao, 'verificado': time.time()}
+
+
+def senha_alterada(user):
+    """Chamar depois do commit da troca de senha: sessões com a versão anterior deixam de valer."""
+    _versoes.set(user.id, user.versao_sessao, user.full_name)
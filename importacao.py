@@ -0,0 +1,173 @@
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, date
+from sqlalchemy import insert
+from models import db, Vendas, Cobrancas
+import comissoes
+import dinheiro
+import lancamentos
+import resumo
+
+# Importação de planilhas (CSV ou XLSX) de Vendas e Cobranças.
+# As linhas são lidas em streaming, validadas e gravadas em lotes (executemany)
+# dentro de uma única transação; o resumo mensal é atualizado uma vez por mês afetado.
+
+TAMANHO_LOTE = 1000
+
+# categoria -> (modelo, colunas obrigatórias da planilha)
+LAYOUTS = {
+    'vendas': (Vendas, ('nome_cliente', 'data_venda', 'tipo_venda', 'valor_total')),
+    'cobrancas': (Cobrancas, ('nome_cliente', 'data_negociacao', 'valor_negociado')),
+}
+
+
+class ErroImportacao(Exception):
+    pass
+
+
+def _ler_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(texto, dialeto)
+    cabecalho = next(leitor, None)
+    if cabecalho is None:
+        return
+    yield cabecalho
+    yield from leitor
+
+
+def _ler_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroImportacao('Para importar XLSX instale o pacote openpyxl (ou envie em CSV).')
+    planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    for linha in planilha.iter_rows(values_only=True):
+        yield list(linha)
+
+
+def ler_linhas(arquivo, nome_arquivo, obrigatorias=()):
+    """Gera (nº da linha, {coluna: valor}) a partir de um CSV ou XLSX, sem carregar o arquivo todo."""
+    leitor = _ler_xlsx(arquivo) if nome_arquivo.lower().endswith('.xlsx') else _ler_csv(arquivo)
+    cabecalho = next(leitor, None)
+    if not cabecalho:
+        raise ErroImportacao('Arquivo vazio.')
+    colunas = [str(c or '').strip().lower() for c in cabecalho]
+    faltando = [c for c in obrigatorias if c not in colunas]
+    if faltando:
+        raise ErroImportacao(f'Colunas obrigatórias ausentes: {", ".join(faltando)}.')
+    # Linha 1 é o cabeçalho
+    for numero, valores in enumerate(leitor, start=2):
+        if not any(v not in (None, '') for v in valores):
+            continue
+        yield numero, dict(zip(colunas, valores))
+
+
+def _data(bruto):
+    if isinstance(bruto, datetime):
+        return bruto.date()
+    if isinstance(bruto, date):
+        return bruto
+    texto = str(bruto or '').strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f'data inválida "{texto}" (use AAAA-MM-DD ou DD/MM/AAAA)')
+
+
+def _valor(texto):
+    valor = dinheiro.centavos(texto)
+    if valor < 0:
+        raise ValueError(f'valor negativo "{texto}"')
+    return valor
+
+
+def _montar(categoria, user_id, linha):
+    # Converte uma linha da planilha no dicionário de colunas do modelo (ValueError se inválida)
+    cliente = str(linha.get('nome_cliente') or '').strip()
+    if not cliente:
+        raise ValueError('nome_cliente vazio')
+
+    if categoria == 'vendas':
+        tipo = str(linha.get('tipo_venda') or '').strip()
+        if tipo not in comissoes.TIPOS_VENDA:
+            raise ValueError(f'tipo_venda inválido "{tipo}" (use {", ".join(comissoes.TIPOS_VENDA)})')
+        valor = _valor(linha.get('valor_total'))
+        data = _data(linha.get('data_venda'))
+        return {'user_id': user_id, 'nome_cliente': cliente, 'tipo_venda': tipo,
+                'data_venda': data, 'valor_total_centavos': valor,
+                'comissao_centavos': comissoes.calcular('vendas', data, valor, tipo)}
+
+    valor = _valor(linha.get('valor_negociado'))
+    data = _data(linha.get('data_negociacao'))
+    return {'user_id': user_id, 'nome_cliente': cliente,
+            'data_negociacao': data, 'valor_negociado_centavos': valor,
+            'comissao_centavos': comissoes.calcular('cobrancas', data, valor)}
+
+
+def importar(categoria, user_id, linhas, estrito=False):
+    """Importa as linhas (pares nº linha, dicionário) para o usuário. Retorna (qtd_inseridos, [(nº linha, erro), ...]).
+
+    Linhas inválidas são ignoradas e reportadas; com estrito=True nada é gravado se houver erro.
+    """
+    if categoria not in LAYOUTS:
+        raise ErroImportacao(f'Categoria "{categoria}" não aceita importação.')
+    modelo, _ = LAYOUTS[categoria]
+    _, col_data, col_bruto = resumo.CATEGORIAS[categoria]
+
+    erros = []
+    inseridos = 0
+    lote = []
+    deltas = defaultdict(lambda: [0, 0, 0])
+
+    def gravar():
+        nonlocal inseridos
+        if lote:
+            ids = db.session.execute(insert(modelo).returning(modelo.id), lote).scalars().all()
+            lancamentos.sincronizar(categoria, modelo.id.in_(ids))
+            inseridos += len(lote)
+            lote.clear()
+
+    try:
+        for numero, linha in linhas:
+            try:
+                registro = _montar(categoria, user_id, linha)
+            except (ValueError, TypeError) as e:
+                erros.append((numero, str(e)))
+                continue
+            d = registro[col_data]
+            delta = deltas[(d.year, d.month)]
+            delta[0] += 1
+            delta[1] += registro[col_bruto]
+            delta[2] += registro['comissao_centavos']
+            lote.append(registro)
+            if len(lote) >= TAMANHO_LOTE:
+                gravar()
+        gravar()
+
+        if estrito and erros:
+            db.session.rollback()
+            return 0, erros
+
+        for (ano, mes), (qtd, bruto, comissao) in deltas.items():
+            resumo.somar(user_id, ano, mes, categoria, qtd, bruto, comissao)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inseridos, erros
+
+
+def importar_arquivo(categoria, user_id, arquivo, nome_arquivo, estrito=False):
+    if categoria not in LAYOUTS:
+        raise ErroImportacao(f'Categoria "{categoria}" não aceita importação.')
+    linhas = ler_linhas(arquivo, nome_arquivo, LAYOUTS[categoria][1])
+    return importar(categoria, user_id, linhas, estrito)
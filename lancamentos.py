@@ -0,0 +1,130 @@
+from sqlalchemy import delete, event, func, insert, literal, null, select, update
+from models import db, Lancamento
+from resumo import CATEGORIAS, ARQUIVO
+import periodos
+
+# Manutenção do livro de lançamentos (tabela lancamentos, ver models.py).
+#
+# As telas de cada categoria continuam gravando nas quatro tabelas; aqui o livro acompanha:
+# - gravações pelo ORM (formulários, edição e exclusão de um item): eventos do mapper, no mesmo flush;
+# - gravações em massa (importação, ações em lote, recálculo de regras): sincronizar()/remover(),
+#   que refazem as linhas do livro a partir da tabela da categoria com um INSERT ... SELECT;
+# - arquivamento: as linhas ficam no livro, só marcadas como arquivadas.
+
+LOTE = 5000
+
+# Coluna da categoria gravada em subtipo
+COLUNA_SUBTIPO = {'vendas': 'tipo_venda', 'cobrancas': None, 'consultas': 'status', 'procedimentos': 'tipo_procedimento'}
+
+COLUNAS = ['user_id', 'categoria', 'item_id', 'subtipo', 'nome_cliente', 'nome_busca', 'data',
+           'bruto_centavos', 'comissao_centavos', 'arquivado']
+
+
+def _origem(categoria, c, arquivado=False):
+    # SELECT das colunas do livro a partir das colunas (c) da tabela da categoria ou da de arquivo
+    _, col_data, col_bruto = CATEGORIAS[categoria]
+    col_subtipo = COLUNA_SUBTIPO[categoria]
+    return select(c.user_id, literal(categoria), c.id, c[col_subtipo] if col_subtipo else null(),
+                  c.nome_cliente, c.nome_busca, c[col_data], c[col_bruto] if col_bruto else null(),
+                  func.coalesce(c.comissao_centavos, 0), literal(arquivado))
+
+
+def sincronizar(categoria, *filtros):
+    """Refaz no livro os itens da categoria que atendem aos filtros (colunas do modelo). Não faz commit."""
+    modelo = CATEGORIAS[categoria][0]
+    db.session.execute(delete(Lancamento).where(
+        Lancamento.categoria == categoria, Lancamento.item_id.in_(select(modelo.id).where(*filtros))))
+    db.session.execute(insert(Lancamento).from_select(COLUNAS, _origem(categoria, modelo.__table__.c).where(*filtros)))
+
+
+def remover(categoria, ids):
+    """Tira do livro os itens excluídos da categoria. Não faz commit."""
+    if ids:
+        db.session.execute(delete(Lancamento).where(Lancamento.categoria == categoria, Lancamento.item_id.in_(ids)))
+
+
+def marcar_arquivado(ano, arquivado):
+    """Anos movidos para as tabelas *_arquivo (ou devolvidos) continuam no livro. Não faz commit."""
+    db.session.execute(update(Lancamento).where(periodos.no_ano(Lancamento.data, ano))
+                       .values(arquivado=arquivado))
+
+
+def preencher(log=print, lote=LOTE):
+    """Copia para o livro, em lotes por id, os itens que ainda não estão nele (retomável)."""
+    for categoria in CATEGORIAS:
+        for tabela, arquivado in ((CATEGORIAS[categoria][0].__table__, False), (ARQUIVO[categoria], True)):
+            c = tabela.c
+            ja_no_livro = select(Lancamento.item_id).where(Lancamento.categoria == categoria,
+                                                            Lancamento.item_id == c.id).exists()
+            ultimo, total = 0, 0
+            while True:
+                ids = db.session.execute(select(c.id).where(c.id > ultimo).order_by(c.id).limit(lote)).scalars().all()
+                if not ids:
+                    break
+                ultimo = ids[-1]
+                resultado = db.session.execute(insert(Lancamento).from_select(
+                    COLUNAS, _origem(categoria, c, arquivado).where(c.id >= ids[0], c.id <= ultimo, ~ja_no_livro)))
+                db.session.commit()
+                total += resultado.rowcount
+            if total:
+                log(f'  {tabela.name}: {total} lançamento(s) copiado(s)')
+
+
+def verificar():
+    """Compara o livro com as tabelas de cada categoria: [(categoria, (qtd, bruto, comissão) esperado, atual)]."""
+    divergencias = []
+    for categoria, (_, _, col_bruto) in CATEGORIAS.items():
+        esperado = [0, 0, 0]
+        for tabela in (CATEGORIAS[categoria][0].__table__, ARQUIVO[categoria]):
+            c = tabela.c
+            qtd, bruto, comissao = db.session.execute(select(
+                func.count(), func.sum(c[col_bruto]) if col_bruto else literal(0),
+                func.sum(c.comissao_centavos))).one()
+            esperado = [esperado[0] + qtd, esperado[1] + int(bruto or 0), esperado[2] + int(comissao or 0)]
+        qtd, bruto, comissao = db.session.execute(select(
+            func.count(), func.sum(Lancamento.bruto_centavos), func.sum(Lancamento.comissao_centavos))
+            .where(Lancamento.categoria == categoria)).one()
+        atual = [qtd, int(bruto or 0), int(comissao or 0)]
+        if esperado != atual:
+            divergencias.append((categoria, tuple(esperado), tuple(atual)))
+    return divergencias
+
+
+def reconstruir():
+    """Refaz o livro inteiro a partir das tabelas das categorias e de arquivo."""
+    db.session.execute(delete(Lancamento))
+    db.session.commit()
+    preencher(log=lambda *_: None)
+
+
+# --- Gravações pelo ORM: o livro acompanha no mesmo flush ---
+
+def _valores(categoria, item):
+    _, col_data, col_bruto = CATEGORIAS[categoria]
+    col_subtipo = COLUNA_SUBTIPO[categoria]
+    return {'user_id': item.user_id, 'subtipo': getattr(item, col_subtipo) if col_subtipo else None,
+            'nome_cliente': item.nome_cliente, 'nome_busca': item.nome_busca, 'data': getattr(item, col_data),
+            'bruto_centavos': getattr(item, col_bruto) if col_bruto else None,
+            'comissao_centavos': item.comissao_centavos or 0}
+
+
+def _registrar(categoria, modelo):
+    tabela = Lancamento.__table__
+
+    @event.listens_for(modelo, 'after_insert')
+    def _inserido(mapper, conexao, item):
+        conexao.execute(insert(tabela).values(categoria=categoria, item_id=item.id, arquivado=False,
+                                              **_valores(categoria, item)))
+
+    @event.listens_for(modelo, 'after_update')
+    def _alterado(mapper, conexao, item):
+        conexao.execute(update(tabela).where(tabela.c.categoria == categoria, tabela.c.item_id == item.id)
+                        .values(**_valores(categoria, item)))
+
+    @event.listens_for(modelo, 'after_delete')
+    def _excluido(mapper, conexao, item):
+        conexao.execute(delete(tabela).where(tabela.c.categoria == categoria, tabela.c.item_id == item.id))
+
+
+for _categoria, (_modelo, _, _) in CATEGORIAS.items():
+    _registrar(_categoria, _modelo)
@@ -0,0 +1,180 @@
+import bisect
+import random
+import threading
+import time
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Instrumentação por requisição: tempo total, nº e tempo das queries SQL, tempo de template.
+# Agregado por endpoint em histogramas de buckets fixos (como o Prometheus), então o custo
+# por requisição é constante. Os números são por processo (cada worker do gunicorn tem os seus).
+
+# Limites dos buckets em segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+MAX_LENTAS = 5
+
+
+class _Endpoint:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.qtd = 0
+        self.tempo_total = 0.0
+        self.sql_qtd = 0
+        self.sql_tempo = 0.0
+        self.template_tempo = 0.0
+        self.lentas = []  # [(segundos, sql)], as MAX_LENTAS mais lentas
+
+    def registrar(self, duracao, sql_qtd, sql_tempo, template_tempo, lentas):
+        self.buckets[bisect.bisect_left(BUCKETS, duracao)] += 1
+        self.qtd += 1
+        self.tempo_total += duracao
+        self.sql_qtd += sql_qtd
+        self.sql_tempo += sql_tempo
+        self.template_tempo += template_tempo
+        if lentas:
+            self.lentas = sorted(self.lentas + lentas, key=lambda x: x[0], reverse=True)[:MAX_LENTAS]
+
+    def percentil(self, p):
+        # Estimativa por interpolação linear dentro do bucket (mesmo método do histogram_quantile)
+        if not self.qtd:
+            return None
+        alvo = p * self.qtd
+        acumulado = 0
+        for i, n in enumerate(self.buckets):
+            if acumulado + n >= alvo and n:
+                inferior = BUCKETS[i - 1] if i else 0.0
+                superior = BUCKETS[i] if BUCKETS[i] != float('inf') else inferior
+                return inferior + (superior - inferior) * (alvo - acumulado) / n
+            acumulado += n
+        return BUCKETS[-2]
+
+
+class Metricas:
+    def __init__(self):
+        self.endpoints = {}
+        self.amostragem = 1.0
+        self.lento = 1.0
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint, duracao, sql_qtd, sql_tempo, template_tempo, lentas):
+        with self._lock:
+            self.endpoints.setdefault(endpoint, _Endpoint()).registrar(
+                duracao, sql_qtd, sql_tempo, template_tempo, lentas)
+
+    def resumo(self):
+        """Lista por endpoint para a página de administração (tempos em ms)."""
+        with self._lock:
+            linhas = []
+            for nome, e in sorted(self.endpoints.items()):
+                linhas.append({
+                    'endpoint': nome,
+                    'qtd': e.qtd,
+                    'p50': e.percentil(0.50) * 1000,
+                    'p95': e.percentil(0.95) * 1000,
+                    'p99': e.percentil(0.99) * 1000,
+                    'media': e.tempo_total / e.qtd * 1000,
+                    'sql_qtd_media': e.sql_qtd / e.qtd,
+                    'sql_media': e.sql_tempo / e.qtd * 1000,
+                    'template_media': e.template_tempo / e.qtd * 1000,
+                    'lentas': [(s * 1000, sql) for s, sql in e.lentas],
+                })
+            return linhas
+
+    def prometheus(self):
+        with self._lock:
+            saida = [
+                '# HELP comissoes_request_duration_seconds Tempo total da requisição.',
+                '# TYPE comissoes_request_duration_seconds histogram',
+            ]
+            for nome, e in sorted(self.endpoints.items()):
+                acumulado = 0
+                for limite, n in zip(BUCKETS, e.buckets):
+                    acumulado += n
+                    le = '+Inf' if limite == float('inf') else repr(limite)
+                    saida.append(f'comissoes_request_duration_seconds_bucket{{endpoint="{nome}",le="{le}"}} {acumulado}')
+                saida.append(f'comissoes_request_duration_seconds_sum{{endpoint="{nome}"}} {e.tempo_total:.6f}')
+                saida.append(f'comissoes_request_duration_seconds_count{{endpoint="{nome}"}} {e.qtd}')
+            for metrica, ajuda, attr in (
+                    ('comissoes_sql_statements_total', 'Queries SQL executadas.', 'sql_qtd'),
+                    ('comissoes_sql_seconds_total', 'Tempo gasto em SQL.', 'sql_tempo'),
+                    ('comissoes_template_seconds_total', 'Tempo de renderização de templates.', 'template_tempo')):
+                saida.append(f'# HELP {metrica} {ajuda}')
+                saida.append(f'# TYPE {metrica} counter')
+                for nome, e in sorted(self.endpoints.items()):
+                    saida.append(f'{metrica}{{endpoint="{nome}"}} {getattr(e, attr)}')
+            return '\n'.join(saida) + '\n'
+
+    def limpar(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+metricas = Metricas()
+
+
+def _medindo():
+    return has_request_context() and getattr(g, '_metricas', None) is not None
+
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if _medindo():
+        conn.info.setdefault('_metricas_inicio', []).append(time.perf_counter())
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    if not _medindo() or not conn.info.get('_metricas_inicio'):
+        return
+    duracao = time.perf_counter() - conn.info['_metricas_inicio'].pop()
+    m = g._metricas
+    m['sql_qtd'] += 1
+    m['sql_tempo'] += duracao
+    m['lentas'].append((duracao, statement[:300]))
+    if len(m['lentas']) > 4 * MAX_LENTAS:
+        m['lentas'] = sorted(m['lentas'], key=lambda x: x[0], reverse=True)[:MAX_LENTAS]
+
+
+def _antes_template(app, template, context, **extra):
+    if _medindo():
+        g._metricas['template_inicio'] = time.perf_counter()
+
+
+def _depois_template(app, template, context, **extra):
+    if _medindo() and 'template_inicio' in g._metricas:
+        g._metricas['template_tempo'] += time.perf_counter() - g._metricas.pop('template_inicio')
+
+
+def init_app(app):
+    if not app.config.get('METRICAS_ATIVAS', True):
+        return
+    metricas.amostragem = app.config.get('METRICAS_AMOSTRAGEM', 1.0)
+    metricas.lento = app.config.get('METRICAS_LENTO_MS', 1000) / 1000
+
+    if not event.contains(Engine, 'before_cursor_execute', _antes_sql):
+        event.listen(Engine, 'before_cursor_execute', _antes_sql)
+        event.listen(Engine, 'after_cursor_execute', _depois_sql)
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
+
+    @app.before_request
+    def _iniciar_medicao():
+        if metricas.amostragem < 1.0 and random.random() >= metricas.amostragem:
+            g._metricas = None
+            return
+        g._metricas = {'inicio': time.perf_counter(), 'sql_qtd': 0, 'sql_tempo': 0.0,
+                       'template_tempo': 0.0, 'lentas': []}
+
+    @app.teardown_request
+    def _finalizar_medicao(exc):
+        m = getattr(g, '_metricas', None)
+        if m is None:
+            return
+        g._metricas = None
+        duracao = time.perf_counter() - m['inicio']
+        endpoint = request.endpoint or '(404)'
+        lentas = sorted(m['lentas'], key=lambda x: x[0], reverse=True)[:MAX_LENTAS]
+        metricas.registrar(endpoint, duracao, m['sql_qtd'], m['sql_tempo'], m['template_tempo'], lentas)
+        if duracao >= metricas.lento:
+            app.logger.warning('Requisição lenta: %s %s %.0fms (%d queries, %.0fms SQL, %.0fms template)',
+                               request.method, request.path, duracao * 1000, m['sql_qtd'],
+                               m['sql_tempo'] * 1000, m['template_tempo'] * 1000)
@@ -0,0 +1,247 @@
+import time
+from datetime import date, datetime
+from sqlalchemy import BigInteger, and_, cast, func, inspect, or_, select, update
+from models import db, VersaoEsquema, ResumoMensal, ValoresEmCentavos
+import comissoes
+import busca
+import esquema
+import lancamentos
+import resumo
+from preenchimento import Preenchimento
+
+# Migrações versionadas, aplicadas uma vez no deploy ("flask migrar", fase release do Procfile)
+# e nunca no caminho das requisições. Cada passo é idempotente e fica registrado em
+# versao_esquema. Mudou o models.py? Acrescente um passo que chame esquema.garantir_esquema.
+# Preenchimentos de tabelas grandes usam preenchimento.Preenchimento (lotes por id, retomáveis);
+# registre-os em PREENCHIMENTOS para aparecerem em "flask migrar --simular".
+# Passos que travam as escritas enquanto rodam ficam em OFFLINE: o deploy os adia e eles só
+# rodam com a aplicação parada ("flask migrar --offline").
+
+
+def _preenchimentos_datas():
+    hoje = date.today()
+    lista = []
+    for modelo, col_data, _ in resumo.CATEGORIAS.values():
+        tabela = modelo.__table__
+
+        def aplicar(ids, tabela=tabela, col_data=col_data):
+            db.session.execute(update(tabela).where(tabela.c.id.in_(ids)).values({col_data: hoje}))
+
+        lista.append(Preenchimento(f'data:{tabela.name}', tabela, tabela.c[col_data].is_(None),
+                                   aplicar, colunas=(col_data,)))
+    return lista
+
+
+def _colunas_de_data_legadas():
+    # Antigos migrate_db.py / migrate_db_v2.py: bancos anteriores às colunas de data.
+    # A coluna entra anulável (sem reescrever a tabela) e é preenchida em lotes.
+    inspetor = inspect(db.engine)
+    tabelas = set(inspetor.get_table_names())
+    for modelo, col_data, _ in resumo.CATEGORIAS.values():
+        tabela = modelo.__tablename__
+        if tabela in tabelas and col_data not in {c['name'] for c in inspetor.get_columns(tabela)}:
+            esquema.executar_ddl(f'ALTER TABLE {tabela} ADD COLUMN {col_data} DATE')
+    # Os UPDATEs do preenchimento gravam as colunas com onupdate (atualizado_em), que precisam existir
+    esquema.garantir_esquema()
+    for p in _preenchimentos_datas():
+        if p.tabela.name in tabelas:
+            p.executar()
+
+
+def _popular_resumo():
+    if resumo.esta_vazio():
+        resumo.reconstruir()
+
+
+def _busca_por_cliente():
+    esquema.garantir_esquema()
+    for p in busca.preenchimentos_nome_busca():
+        p.executar()
+    busca.criar_indices_trigrama()
+
+
+def _preenchimentos_centavos():
+    # Colunas Numeric antigas -> centavos, nas tabelas das categorias e nas de arquivo
+    lista = []
+    for categoria, (modelo, _, _) in resumo.CATEGORIAS.items():
+        for tabela in (modelo.__table__, resumo.ARQUIVO[categoria]):
+            pares = [(tabela.c[centavos], tabela.c[legado]) for centavos, legado in ValoresEmCentavos.LEGADO.items()
+                     if centavos in tabela.c]
+
+            def aplicar(ids, tabela=tabela, pares=pares):
+                db.session.execute(update(tabela).where(tabela.c.id.in_(ids)).values(
+                    {centavos: cast(func.round(legado * 100), BigInteger) for centavos, legado in pares}))
+
+            lista.append(Preenchimento(f'centavos:{tabela.name}', tabela,
+                                       or_(*(centavos.is_(None) for centavos, _ in pares)), aplicar,
+                                       colunas=tuple(centavos.name for centavos, _ in pares)))
+    return lista
+
+
+def _preenchimento_resumo_centavos():
+    # Expansão: resumo_mensal ganha as colunas em centavos ao lado das em reais (que os processos
+    # da versão anterior continuam gravando) e é convertido em lotes, sem recriar a tabela.
+    # Linhas com os centavos zerados recebem o valor das colunas antigas; nas já convertidas
+    # (ou em bancos onde as colunas antigas voltaram vazias) nada muda.
+    tabela = ResumoMensal.__table__
+    c = tabela.c
+
+    def aplicar(ids):
+        db.session.execute(update(tabela).where(c.id.in_(ids)).values(
+            bruto_centavos=cast(func.round(c.bruto * 100), BigInteger),
+            comissao_centavos=cast(func.round(c.comissao * 100), BigInteger)))
+
+    return Preenchimento('centavos:resumo_mensal', tabela, and_(c.bruto_centavos == 0, c.comissao_centavos == 0),
+                         aplicar, colunas=('bruto_centavos', 'comissao_centavos'))
+
+
+def _preenchimentos_dinheiro():
+    return _preenchimentos_centavos() + [_preenchimento_resumo_centavos()]
+
+
+def _dinheiro_em_centavos():
+    esquema.garantir_esquema()
+    for p in _preenchimentos_dinheiro():
+        p.executar()
+
+
+def _livro_de_lancamentos():
+    esquema.garantir_esquema()
+    # Em lotes e retomável: só copia os itens que ainda não estão no livro
+    lancamentos.preencher()
+    busca.criar_indices_trigrama()
+
+
+def _preenchimentos_atualizado_em():
+    # Linhas anteriores à coluna contam como alteradas no momento da migração
+    agora = datetime.utcnow()
+    lista = []
+    for modelo, _, _ in resumo.CATEGORIAS.values():
+        tabela = modelo.__table__
+
+        def aplicar(ids, tabela=tabela):
+            db.session.execute(update(tabela).where(tabela.c.id.in_(ids)).values(atualizado_em=agora))
+
+        lista.append(Preenchimento(f'atualizado_em:{tabela.name}', tabela, tabela.c.atualizado_em.is_(None),
+                                   aplicar, colunas=('atualizado_em',)))
+    return lista
+
+
+def _sincronizacao():
+    esquema.garantir_esquema()
+    for p in _preenchimentos_atualizado_em():
+        p.executar()
+
+
+def _tabelas_sem_autoincrement():
+    # {categoria: tabela} ainda criadas sem AUTOINCREMENT (só no SQLite)
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+    return {categoria: modelo.__table__ for categoria, (modelo, _, _) in resumo.CATEGORIAS.items()
+            if esquema.sqlite_sem_autoincrement(modelo.__table__)}
+
+
+def _ids_sem_reuso():
+    # SQLite sem AUTOINCREMENT devolve os ids mais altos depois que um ano é arquivado, e o
+    # novo item colide no livro de lançamentos (e no restaurar_ano). Recria as quatro tabelas
+    # com AUTOINCREMENT e começa a sequência acima dos ids já arquivados.
+    # Cada tabela é copiada inteira numa transação que bloqueia as escritas: passo OFFLINE.
+    esquema.garantir_esquema()
+    for categoria, tabela in _tabelas_sem_autoincrement().items():
+        arquivada = resumo.ARQUIVO[categoria]
+        maior = db.session.execute(select(func.max(arquivada.c.id))).scalar() or 0
+        db.session.commit()
+        esquema.recriar_tabela_sqlite(tabela, id_minimo=maior)
+
+
+def _resumo_depois_dos_centavos():
+    # A migração 4 monta o resumo antes de a 9 preencher os centavos das categorias; em bancos
+    # vindos da versão sem centavos ele ficou zerado. Refeito a partir das tabelas já convertidas.
+    if resumo.verificar():
+        resumo.reconstruir()
+
+
+MIGRACOES = [
+    (1, 'Colunas de data das tabelas antigas', _colunas_de_data_legadas),
+    (2, 'Tabelas, colunas e índices do models.py', esquema.garantir_esquema),
+    (3, 'Regras de comissão padrão', comissoes.popular_regras_padrao),
+    (4, 'Resumo mensal a partir do histórico', _popular_resumo),
+    (5, 'nome_busca e índices da busca por cliente', _busca_por_cliente),
+    (6, 'Índice por período no resumo mensal', esquema.garantir_esquema),
+    (7, 'Tabela de tarefas em segundo plano', esquema.garantir_esquema),
+    (8, 'Tabelas de arquivo dos anos fechados', esquema.garantir_esquema),
+    (9, 'Valores em centavos inteiros', _dinheiro_em_centavos),
+    (10, 'Livro de lançamentos das quatro categorias', _livro_de_lancamentos),
+    (11, 'atualizado_em, exclusões e chaves da API de sincronização', _sincronizacao),
+    (12, 'Ids das categorias sem reaproveitamento (SQLite AUTOINCREMENT)', _ids_sem_reuso),
+    (13, 'Gerações do cache das telas compartilhadas entre processos', esquema.garantir_esquema),
+    (14, 'Resumo mensal recalculado depois da conversão para centavos', _resumo_depois_dos_centavos),
+    (15, 'Sem os índices de busca das tabelas de cada categoria', busca.remover_indices_das_categorias),
+]
+
+
+# versão -> tabelas que o passo ainda reescreveria bloqueando as escritas (vazio = pode rodar no deploy)
+OFFLINE = {
+    12: lambda: list(_tabelas_sem_autoincrement().values()),
+}
+
+
+# versão -> preenchimentos feitos por ela
+PREENCHIMENTOS = {
+    1: _preenchimentos_datas,
+    5: busca.preenchimentos_nome_busca,
+    9: _preenchimentos_dinheiro,
+    11: _preenchimentos_atualizado_em,
+}
+
+
+def aplicadas():
+    if not inspect(db.engine).has_table(VersaoEsquema.__tablename__):
+        return set()
+    return {v for (v,) in db.session.query(VersaoEsquema.versao)}
+
+
+def pendentes():
+    feitas = aplicadas()
+    return [m for m in MIGRACOES if m[0] not in feitas]
+
+
+def _adiar(versao, offline):
+    return not offline and versao in OFFLINE and bool(OFFLINE[versao]())
+
+
+def aplicar(log=print, offline=False):
+    """Aplica as migrações pendentes em ordem. Retorna quantas foram aplicadas.
+
+    Sem offline=True os passos de OFFLINE que ainda têm trabalho ficam pendentes.
+    """
+    VersaoEsquema.__table__.create(db.engine, checkfirst=True)
+    lista = []
+    for versao, descricao, funcao in pendentes():
+        if _adiar(versao, offline):
+            log(f'[{versao}] {descricao}: adiada, bloqueia as escritas; pare a aplicação e rode "flask migrar --offline"')
+        else:
+            lista.append((versao, descricao, funcao))
+    for versao, descricao, funcao in lista:
+        inicio = time.perf_counter()
+        funcao()
+        db.session.add(VersaoEsquema(versao=versao, descricao=descricao))
+        db.session.commit()
+        log(f'[{versao}] {descricao} ({time.perf_counter() - inicio:.2f}s)')
+    return len(lista)
+
+
+def simular(log=print):
+    """Mostra o que aplicar() faria (migrações, linhas a preencher, DDL), sem gravar nada."""
+    lista = pendentes()
+    for versao, descricao, _ in lista:
+        log(f'[{versao}] {descricao}')
+        for p in PREENCHIMENTOS.get(versao, list)():
+            log(f'  {p.nome}: {p.contar()} linha(s) a preencher')
+        for tabela in OFFLINE.get(versao, list)():
+            linhas = db.session.execute(select(func.count()).select_from(tabela)).scalar()
+            log(f'  offline: recria {tabela.name} ({linhas} linha(s)) com as escritas bloqueadas')
+    if lista:
+        for passo in esquema.plano():
+            log(f'  esquema: {passo}')
+    return len(lista)
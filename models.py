@@ -1,9 +1,64 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import unicodedata
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import validates
+import senhas
+import dinheiro
+from replica import SessaoRoteada
 
-db = SQLAlchemy()
+# Sessão roteada: telas só de leitura podem consultar a réplica (ver replica.py)
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
+
+
+def normalizar_nome(nome):
+    """Minúsculas, sem acentos e sem pontuação: a forma gravada em nome_busca."""
+    if not nome:
+        return ''
+    sem_acento = ''.join(c for c in unicodedata.normalize('NFKD', nome) if not unicodedata.combining(c))
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in sem_acento.lower()).split())
+
+
+def _nome_busca_padrao(contexto):
+    # Inserts em lote (importação, insert(...) com várias linhas) passam por aqui linha a linha
+    return normalizar_nome(contexto.get_current_parameters().get('nome_cliente'))
+
+
+class BuscaPorCliente:
+    # nome_cliente normalizado, copiado para o livro de lançamentos, onde a busca é feita.
+    # UPDATEs em massa que mudam nome_cliente precisam gravar nome_busca também.
+    nome_busca = db.Column(db.String(150), default=_nome_busca_padrao)
+
+    @validates('nome_cliente')
+    def _atualizar_nome_busca(self, chave, valor):
+        self.nome_busca = normalizar_nome(valor)
+        return valor
+
+class Sincronizavel:
+    # Momento da última gravação (inclusive UPDATEs em massa, via onupdate), para a API de
+    # sincronização puxar só o que mudou (sincronizacao.py)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def _reais_de(coluna_centavos):
+    # Colunas Numeric antigas: derivadas dos centavos nos inserts (inclusive em lote)
+    def padrao(contexto):
+        return dinheiro.reais(contexto.get_current_parameters().get(coluna_centavos))
+    return padrao
+
+
+class ValoresEmCentavos:
+    # Dinheiro em centavos (BigInteger), ver dinheiro.py. As colunas Numeric antigas
+    # (valor_total, valor_negociado, comissao_calculada) continuam sendo gravadas, derivadas
+    # dos centavos, para não quebrar processos da versão anterior durante o deploy.
+    # UPDATEs em massa que mudam os centavos precisam gravar a coluna antiga também.
+    LEGADO = {'valor_total_centavos': 'valor_total', 'valor_negociado_centavos': 'valor_negociado',
+              'comissao_centavos': 'comissao_calculada'}
+
+    @validates('valor_total_centavos', 'valor_negociado_centavos', 'comissao_centavos')
+    def _atualizar_legado(self, chave, valor):
+        valor = None if valor is None else int(valor)
+        setattr(self, self.LEGADO[chave], dinheiro.reais(valor))
+        return valor
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -11,46 +66,255 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(150), unique=True, nullable=False) # Será o Full Name
     full_name = db.Column(db.String(200), nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    # Incrementada a cada troca de senha; invalida sessões abertas com a versão anterior
+    versao_sessao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def get_id(self):
+        return f"{self.id}:{self.versao_sessao or 0}"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = senhas.gerar_hash(password)
+        self.versao_sessao = (self.versao_sessao or 0) + 1
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return senhas.verificar(self.password_hash, password)
+
+    def atualizar_hash(self, password):
+        # Refaz o hash com o método atual sem invalidar as sessões (a senha é a mesma)
+        if senhas.precisa_rehash(self.password_hash):
+            self.password_hash = senhas.gerar_hash(password)
+            return True
+        return False
+
+# SQLite: AUTOINCREMENT para que os ids de itens movidos para as tabelas *_arquivo nunca sejam
+# reaproveitados (o livro de lançamentos e restaurar_ano dependem disso). No PostgreSQL a sequência
+# do SERIAL já não volta atrás.
+IDS_SEM_REUSO = {'sqlite_autoincrement': True}
 
-class Vendas(db.Model):
+class Vendas(BuscaPorCliente, ValoresEmCentavos, Sincronizavel, db.Model):
     __tablename__ = 'vendas'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     nome_cliente = db.Column(db.String(150), nullable=False)
     data_venda = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     tipo_venda = db.Column(db.String(50), nullable=False)
-    valor_total = db.Column(db.Numeric(10, 2), nullable=False)
-    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False)
+    valor_total_centavos = db.Column(db.BigInteger)
+    comissao_centavos = db.Column(db.BigInteger)
+    valor_total = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('valor_total_centavos'))
+    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('comissao_centavos'))
 
-class Cobrancas(db.Model):
+    __table_args__ = (
+        db.Index('ix_vendas_user_data_venda', 'user_id', 'data_venda'),
+        db.Index('ix_vendas_user_atualizado_em', 'user_id', 'atualizado_em', 'id'),
+        IDS_SEM_REUSO,
+    )
+
+class Cobrancas(BuscaPorCliente, ValoresEmCentavos, Sincronizavel, db.Model):
     __tablename__ = 'cobrancas'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     nome_cliente = db.Column(db.String(150), nullable=False)
     data_negociacao = db.Column(db.Date, nullable=False, default=datetime.utcnow)
-    valor_negociado = db.Column(db.Numeric(10, 2), nullable=False)
-    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False)
+    valor_negociado_centavos = db.Column(db.BigInteger)
+    comissao_centavos = db.Column(db.BigInteger)
+    valor_negociado = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('valor_negociado_centavos'))
+    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('comissao_centavos'))
+
+    __table_args__ = (
+        db.Index('ix_cobrancas_user_data_negociacao', 'user_id', 'data_negociacao'),
+        db.Index('ix_cobrancas_user_atualizado_em', 'user_id', 'atualizado_em', 'id'),
+        IDS_SEM_REUSO,
+    )
 
-class Consultas(db.Model):
+class Consultas(BuscaPorCliente, ValoresEmCentavos, Sincronizavel, db.Model):
     __tablename__ = 'consultas'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     nome_cliente = db.Column(db.String(150), nullable=False)
     data_consulta = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(50), default='Realizada')
-    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False)
+    comissao_centavos = db.Column(db.BigInteger)
+    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('comissao_centavos'))
+
+    __table_args__ = (
+        db.Index('ix_consultas_user_data_consulta', 'user_id', 'data_consulta'),
+        db.Index('ix_consultas_user_atualizado_em', 'user_id', 'atualizado_em', 'id'),
+        IDS_SEM_REUSO,
+    )
 
-class Procedimentos(db.Model):
+class Procedimentos(BuscaPorCliente, ValoresEmCentavos, Sincronizavel, db.Model):
     __tablename__ = 'procedimentos'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     nome_cliente = db.Column(db.String(150), nullable=False)
     data_procedimento = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     tipo_procedimento = db.Column(db.String(100), default='Cirurgia')
-    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False)
+    comissao_centavos = db.Column(db.BigInteger)
+    comissao_calculada = db.Column(db.Numeric(10, 2), nullable=False, default=_reais_de('comissao_centavos'))
+
+    __table_args__ = (
+        db.Index('ix_procedimentos_user_data_procedimento', 'user_id', 'data_procedimento'),
+        db.Index('ix_procedimentos_user_atualizado_em', 'user_id', 'atualizado_em', 'id'),
+        IDS_SEM_REUSO,
+    )
+
+def _tabela_arquivo(modelo, col_data):
+    # Anos fechados movidos por arquivo.py: mesmas colunas e ids da tabela original
+    nome = f'{modelo.__tablename__}_arquivo'
+    colunas = [db.Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+               for c in modelo.__table__.columns]
+    return db.Table(nome, *colunas,
+                    db.Index(f'ix_{nome}_user_{col_data}', 'user_id', col_data))
+
+vendas_arquivo = _tabela_arquivo(Vendas, 'data_venda')
+cobrancas_arquivo = _tabela_arquivo(Cobrancas, 'data_negociacao')
+consultas_arquivo = _tabela_arquivo(Consultas, 'data_consulta')
+procedimentos_arquivo = _tabela_arquivo(Procedimentos, 'data_procedimento')
+
+class Lancamento(db.Model):
+    # Livro único de lançamentos das quatro categorias (e dos anos arquivados), mantido por
+    # lancamentos.py a partir das tabelas de cada categoria, que continuam sendo as de escrita.
+    # Relatórios, exportação e busca leem só daqui: um índice, uma varredura.
+    __tablename__ = 'lancamentos'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    categoria = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)  # id na tabela da categoria
+    subtipo = db.Column(db.String(100))  # tipo_venda, status ou tipo_procedimento
+    nome_cliente = db.Column(db.String(150), nullable=False)
+    nome_busca = db.Column(db.String(150))
+    data = db.Column(db.Date, nullable=False)
+    bruto_centavos = db.Column(db.BigInteger)  # NULL nas categorias sem valor bruto
+    comissao_centavos = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    arquivado = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+
+    __table_args__ = (
+        db.UniqueConstraint('categoria', 'item_id', name='uq_lancamentos_item'),
+        # Cobre os totais por período (GROUP BY categoria) sem ler a tabela
+        db.Index('ix_lancamentos_user_data', 'user_id', 'data', 'categoria', 'comissao_centavos', 'bruto_centavos'),
+        db.Index('ix_lancamentos_user_nome_busca', 'user_id', 'nome_busca'),
+    )
+
+class AnoArquivado(db.Model):
+    # Anos cujos itens estão nas tabelas *_arquivo (os totais continuam em resumo_mensal)
+    __tablename__ = 'anos_arquivados'
+    ano = db.Column(db.Integer, primary_key=True)
+    linhas = db.Column(db.Integer, nullable=False, default=0)
+    arquivado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ResumoMensal(db.Model):
+    # Totais pré-calculados por usuário/mês/categoria (mantidos pelas rotas de escrita)
+    __tablename__ = 'resumo_mensal'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    categoria = db.Column(db.String(20), nullable=False)
+    qtd = db.Column(db.Integer, nullable=False, default=0)
+    bruto_centavos = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    comissao_centavos = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    # Colunas em reais da versão anterior, ainda gravadas (derivadas dos centavos, ver resumo.py)
+    # para os processos antigos continuarem funcionando durante o deploy. Só as telas antigas as
+    # leem; saem numa versão futura (contração), depois de nenhum processo antigo estar no ar.
+    LEGADO = {'bruto_centavos': 'bruto', 'comissao_centavos': 'comissao'}
+    bruto = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+    comissao = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'ano', 'mes', 'categoria', name='uq_resumo_mensal'),
+        # Visão da equipe (equipe.py): todos os usuários de um período
+        db.Index('ix_resumo_mensal_periodo', 'ano', 'mes'),
+    )
+
+class GeracaoCache(db.Model):
+    # Contador por usuário (0 = todos) incrementado no commit de toda escrita que muda os totais.
+    # Entra na chave do cache das telas (cache.py): vale entre workers e processos (flask worker, CLI).
+    __tablename__ = 'geracoes_cache'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    geracao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class RegraComissao(db.Model):
+    # Regras de comissão versionadas: vale a regra mais recente com vigente_desde <= data do item.
+    # tipo NULL vale para qualquer tipo da categoria que não tenha regra própria.
+    # modo 'percentual': valor / divisor * taxa   |   modo 'fixo': taxa (valor fixo por item)
+    __tablename__ = 'regras_comissao'
+    id = db.Column(db.Integer, primary_key=True)
+    categoria = db.Column(db.String(20), nullable=False)
+    tipo = db.Column(db.String(100))
+    modo = db.Column(db.String(20), nullable=False, default='percentual')
+    taxa = db.Column(db.Numeric(10, 4), nullable=False)
+    divisor = db.Column(db.Integer, nullable=False, default=1)
+    vigente_desde = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('categoria', 'tipo', 'vigente_desde', name='uq_regra_vigencia'),
+    )
+
+class VersaoEsquema(db.Model):
+    # Migrações já aplicadas (ver migracoes.py); "flask migrar" aplica as pendentes no deploy
+    __tablename__ = 'versao_esquema'
+    versao = db.Column(db.Integer, primary_key=True)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ProgressoMigracao(db.Model):
+    # Ponto de retomada de cada preenchimento em lotes (ver preenchimento.py)
+    __tablename__ = 'progresso_migracao'
+    nome = db.Column(db.String(100), primary_key=True)
+    ultimo_id = db.Column(db.Integer, nullable=False, default=0)
+    linhas = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+
+class ItemExcluido(db.Model):
+    # Exclusões das quatro categorias, para a API de sincronização avisar os aparelhos
+    __tablename__ = 'itens_excluidos'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    categoria = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    excluido_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_itens_excluidos_user_excluido_em', 'user_id', 'excluido_em', 'id'),
+    )
+
+class ChaveSincronizacao(db.Model):
+    # Chaves de idempotência dos itens enviados pela API: reenvio da mesma chave não duplica o item
+    __tablename__ = 'chaves_sincronizacao'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    chave = db.Column(db.String(100), nullable=False)
+    categoria = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'chave', name='uq_chaves_sincronizacao'),
+        db.Index('ix_chaves_sincronizacao_criada_em', 'criada_em'),
+    )
+
+class Tarefa(db.Model):
+    # Fila de tarefas em segundo plano (ver tarefas.py); executadas por "flask worker"
+    __tablename__ = 'tarefas'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # NULL = tarefa do sistema (CLI)
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluida, falhou
+    progresso = db.Column(db.Integer, nullable=False, default=0)  # 0 a 100
+    mensagem = db.Column(db.String(500))
+    arquivo = db.Column(db.String(300))  # resultado para download, relativo a TAREFAS_DIR
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    executar_apos = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    reservada_ate = db.Column(db.DateTime)  # worker que morrer perde a reserva depois disso
+
+    __table_args__ = (
+        db.Index('ix_tarefas_status_executar_apos', 'status', 'executar_apos'),
+        db.Index('ix_tarefas_user_criada_em', 'user_id', 'criada_em'),
+    )
@@ -0,0 +1,33 @@
+from datetime import date
+from sqlalchemy import tuple_
+
+# Paginação por cursor (keyset) sobre (data, id), do mais recente para o mais antigo.
+# O cursor é "AAAA-MM-DD_id" do último item da página anterior.
+
+
+def codificar_cursor(data, id):
+    return f"{data.isoformat()}_{id}"
+
+
+def decodificar_cursor(cursor):
+    try:
+        data_str, id_str = cursor.split('_')
+        return date.fromisoformat(data_str), int(id_str)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pagina(query, coluna_data, coluna_id, cursor=None, tamanho=50):
+    """Retorna (itens, proximo_cursor). proximo_cursor é None na última página."""
+    query = query.order_by(coluna_data.desc(), coluna_id.desc())
+    posicao = decodificar_cursor(cursor)
+    if posicao:
+        query = query.filter(tuple_(coluna_data, coluna_id) < tuple_(*posicao))
+
+    # Busca um item a mais só para saber se existe próxima página
+    itens = query.limit(tamanho + 1).all()
+    if len(itens) <= tamanho:
+        return itens, None
+    itens = itens[:tamanho]
+    ultimo = itens[-1]
+    return itens, codificar_cursor(getattr(ultimo, coluna_data.key), getattr(ultimo, coluna_id.key))
@@ -0,0 +1,47 @@
+from datetime import date
+from sqlalchemy import and_, text
+from models import db
+
+# Filtros por período como intervalos semiabertos [inicio, fim) sobre a coluna de data,
+# em vez de extract('month'/'year', coluna). Assim o índice (user_id, data) é usado.
+
+ANO_MAX = 9998  # o intervalo de um ano termina no 1º de janeiro do ano seguinte
+
+
+def validar(ano, mes=None):
+    """ValueError se ano/mês (vindos da requisição) não formam um período válido."""
+    if not 1 <= ano <= ANO_MAX:
+        raise ValueError(f'ano inválido: {ano}')
+    if mes is not None and not 1 <= mes <= 12:
+        raise ValueError(f'mês inválido: {mes}')
+
+
+def intervalo_mes(ano, mes):
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+
+def intervalo_ano(ano):
+    return date(ano, 1, 1), date(ano + 1, 1, 1)
+
+
+def no_intervalo(coluna, inicio, fim):
+    """Predicado coluna >= inicio AND coluna < fim (fim exclusivo)."""
+    return and_(coluna >= inicio, coluna < fim)
+
+
+def no_mes(coluna, ano, mes):
+    return no_intervalo(coluna, *intervalo_mes(ano, mes))
+
+
+def no_ano(coluna, ano):
+    return no_intervalo(coluna, *intervalo_ano(ano))
+
+
+def plano(query):
+    """Plano de execução (EXPLAIN) de uma query, para conferir o uso dos índices."""
+    bind = db.session.get_bind()
+    sql = str(query.statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+    prefixo = 'EXPLAIN QUERY PLAN ' if bind.dialect.name == 'sqlite' else 'EXPLAIN '
+    return [' | '.join(str(c) for c in row) for row in db.session.execute(text(prefixo + sql))]
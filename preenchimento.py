@@ -0,0 +1,90 @@
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, inspect, select
+from models import db, ProgressoMigracao
+
+# Preenchimento de colunas em tabelas grandes sem travar a aplicação (usado pelas migrações).
+#
+# Anda pela chave primária em lotes de tamanho fixo (MIGRACAO_LOTE), uma transação curta por
+# lote. O último id do lote é gravado em progresso_migracao na mesma transação, então uma
+# execução interrompida recomeça de onde parou. Funciona igual no SQLite e no PostgreSQL.
+
+INTERVALO_LOG = 5  # segundos entre as mensagens de progresso
+
+
+class Preenchimento:
+    """Linhas de `tabela` que atendem a `pendente` recebem `aplicar(ids)`, lote a lote.
+
+    colunas: colunas que o preenchimento grava (se ainda não existem, toda a tabela está pendente).
+    """
+
+    def __init__(self, nome, tabela, pendente, aplicar, colunas=()):
+        self.nome = nome
+        self.tabela = tabela
+        self.pendente = pendente
+        self.aplicar = aplicar
+        self.colunas = colunas
+
+    def _progresso(self):
+        ProgressoMigracao.__table__.create(db.engine, checkfirst=True)
+        return db.session.get(ProgressoMigracao, self.nome) or ProgressoMigracao(nome=self.nome, ultimo_id=0, linhas=0)
+
+    def contar(self):
+        """Linhas ainda pendentes (para o modo de simulação). Não grava nada."""
+        inspetor = inspect(db.engine)
+        if not inspetor.has_table(self.tabela.name):
+            return 0
+        existentes = {c['name'] for c in inspetor.get_columns(self.tabela.name)}
+        c = self.tabela.c
+        ultimo = 0
+        if inspetor.has_table(ProgressoMigracao.__tablename__):
+            progresso = db.session.get(ProgressoMigracao, self.nome)
+            if progresso and not progresso.concluido_em:
+                ultimo = progresso.ultimo_id
+        if any(coluna not in existentes for coluna in self.colunas):
+            return db.session.execute(select(func.count()).where(c.id > ultimo)).scalar()
+        return db.session.execute(select(func.count()).select_from(self.tabela)
+                                  .where(c.id > ultimo, self.pendente)).scalar()
+
+    def executar(self, log=print, lote=None, pausa=None):
+        """Preenche as linhas pendentes. Retorna quantas foram processadas nesta execução."""
+        lote = lote or current_app.config['MIGRACAO_LOTE']
+        pausa = current_app.config['MIGRACAO_PAUSA'] if pausa is None else pausa
+        progresso = self._progresso()
+        if progresso.concluido_em:
+            # Execução anterior terminou: começa de novo (só as linhas pendentes são alteradas)
+            progresso.ultimo_id, progresso.linhas, progresso.concluido_em = 0, 0, None
+        c = self.tabela.c
+        total = db.session.execute(select(func.count()).select_from(self.tabela)
+                                   .where(c.id > progresso.ultimo_id, self.pendente)).scalar()
+        if progresso.ultimo_id:
+            log(f'  {self.nome}: retomando do id {progresso.ultimo_id} ({progresso.linhas} linha(s) já feitas)')
+        feitas = 0
+        inicio = ultimo_log = time.perf_counter()
+        while True:
+            ids = db.session.execute(select(c.id).where(c.id > progresso.ultimo_id, self.pendente)
+                                     .order_by(c.id).limit(lote)).scalars().all()
+            if not ids:
+                break
+            self.aplicar(ids)
+            progresso.ultimo_id = ids[-1]
+            progresso.linhas += len(ids)
+            progresso.atualizado_em = datetime.utcnow()
+            db.session.add(progresso)
+            db.session.commit()
+            feitas += len(ids)
+            agora = time.perf_counter()
+            if agora - ultimo_log >= INTERVALO_LOG:
+                ultimo_log = agora
+                log(f'  {self.nome}: {feitas}/{total} ({100 * feitas // max(total, 1)}%), '
+                    f'{feitas / (agora - inicio):.0f} linhas/s')
+            if pausa:
+                time.sleep(pausa)
+        progresso.concluido_em = datetime.utcnow()
+        db.session.add(progresso)
+        db.session.commit()
+        if feitas:
+            duracao = time.perf_counter() - inicio
+            log(f'  {self.nome}: {feitas} linha(s) em {duracao:.1f}s ({feitas / max(duracao, 1e-6):.0f} linhas/s)')
+        return feitas
@@ -0,0 +1,73 @@
+from sqlalchemy import func, literal, null, select, union_all
+from models import db, Lancamento, ResumoMensal
+from resumo import CATEGORIAS
+import periodos
+
+MESES_NOMES = {1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 5: 'Maio', 6: 'Junho',
+               7: 'Julho', 8: 'Agosto', 9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'}
+
+
+class Linha(dict):
+    # Linha de detalhe: acessível como objeto no template (v.data_venda, v.nome_cliente...)
+    def __getattr__(self, nome):
+        try:
+            return self[nome]
+        except KeyError:
+            raise AttributeError(nome)
+
+
+def _consulta_resumo(user_id):
+    # Uma única ida ao banco: totais por categoria + histórico por mês (UNION ALL)
+    por_categoria = select(
+        literal('cat').label('tipo'), ResumoMensal.categoria.label('categoria'),
+        null().label('ano'), null().label('mes'),
+        func.sum(ResumoMensal.qtd).label('qtd'),
+        func.sum(ResumoMensal.comissao_centavos).label('comissao'),
+        func.sum(ResumoMensal.bruto_centavos).label('bruto'),
+    ).where(ResumoMensal.user_id == user_id).group_by(ResumoMensal.categoria)
+    por_mes = select(
+        literal('mes'), null(), ResumoMensal.ano, ResumoMensal.mes,
+        func.sum(ResumoMensal.qtd), func.sum(ResumoMensal.comissao_centavos), func.sum(ResumoMensal.bruto_centavos),
+    ).where(ResumoMensal.user_id == user_id).group_by(ResumoMensal.ano, ResumoMensal.mes)
+    return union_all(por_categoria, por_mes)
+
+
+def _consulta_detalhes(user_id, ano, mes):
+    # Detalhes do mês de todas as categorias (inclusive anos arquivados): uma faixa do índice do livro
+    return select(
+        Lancamento.categoria, Lancamento.item_id.label('id'), Lancamento.data,
+        Lancamento.nome_cliente, Lancamento.comissao_centavos,
+    ).where(Lancamento.user_id == user_id, periodos.no_mes(Lancamento.data, ano, mes)
+            ).order_by(Lancamento.data, Lancamento.item_id)
+
+
+def montar(user_id, ano, mes):
+    """Dados da tela /geral em no máximo duas queries (resumo + detalhes do mês). Valores em centavos."""
+    resumo_geral = {cat: {'qtd': 0, 'val': 0, 'bruto': 0} for cat in CATEGORIAS}
+    historico = {}
+    for tipo, categoria, a, m, qtd, comissao, bruto in db.session.execute(_consulta_resumo(user_id)):
+        if tipo == 'cat':
+            resumo_geral[categoria] = {'qtd': int(qtd or 0), 'val': int(comissao or 0), 'bruto': int(bruto or 0)}
+        elif qtd:
+            historico[(int(a), int(m))] = int(comissao or 0)
+
+    lista_historico = [
+        {'label': f"{MESES_NOMES[m]}/{a}", 'total': total, 'mes': m, 'ano': a}
+        for (a, m), total in sorted(historico.items(), reverse=True)
+    ]
+
+    detalhes = {cat: [] for cat in CATEGORIAS}
+    for row in db.session.execute(_consulta_detalhes(user_id, ano, mes)):
+        col_data = CATEGORIAS[row.categoria][1]
+        detalhes[row.categoria].append(Linha(id=row.id, nome_cliente=row.nome_cliente,
+                                             comissao_centavos=row.comissao_centavos,
+                                             **{col_data: row.data}))
+
+    return {
+        'total_acumulado_geral': sum(r['val'] for r in resumo_geral.values()),
+        'total_itens_geral': sum(r['qtd'] for r in resumo_geral.values()),
+        'resumo_geral': resumo_geral,
+        'lista_historico': lista_historico,
+        'detalhes': detalhes,
+        'total_mes': historico.get((ano, mes), 0),
+    }
@@ -0,0 +1,124 @@
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+
+# Réplica de leitura opcional (DATABASE_REPLICA_URL, bind "replica" em SQLALCHEMY_BINDS).
+#
+# Só as telas marcadas com @leitura (GETs que não gravam) consultam a réplica; o resto fica no
+# primário. Mesmo nessas telas continuam no primário:
+# - INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE e flush do ORM;
+# - o usuário que gravou algo há menos de REPLICA_JANELA_ESCRITA segundos (lê o que acabou de gravar);
+# - todo mundo, enquanto a réplica estiver fora do ar ou atrasada mais que REPLICA_ATRASO_MAX
+#   segundos (conferido a cada REPLICA_VERIFICACAO segundos por processo).
+# Se a consulta na réplica falhar, a tela é refeita no primário.
+
+BIND = 'replica'
+
+_estado = {'ok': False, 'verificada_em': 0.0, 'atraso': None}
+_lock = threading.Lock()
+
+
+def configurada():
+    return BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def _atraso(conexao):
+    # Segundos de atraso da réplica (0 quando não há replicação, ex. o SQLite usado nos testes)
+    if conexao.dialect.name != 'postgresql':
+        conexao.execute(text('SELECT 1'))
+        return 0.0
+    return float(conexao.execute(text(
+        'SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 '
+        'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END')).scalar())
+
+
+def marcar_indisponivel():
+    with _lock:
+        _estado.update(ok=False, verificada_em=time.time())
+
+
+def disponivel():
+    """A réplica respondeu na última verificação e não está atrasada demais."""
+    if not configurada():
+        return False
+    agora = time.time()
+    with _lock:
+        if agora - _estado['verificada_em'] < current_app.config['REPLICA_VERIFICACAO']:
+            return _estado['ok']
+        _estado['verificada_em'] = agora  # outras threads usam o estado anterior enquanto esta verifica
+    try:
+        with current_app.extensions['sqlalchemy'].engines[BIND].connect() as conexao:
+            atraso = _atraso(conexao)
+        ok = atraso <= current_app.config['REPLICA_ATRASO_MAX']
+        if not ok:
+            current_app.logger.warning('Réplica atrasada %.1fs; leituras no primário', atraso)
+    except DBAPIError as e:
+        atraso, ok = None, False
+        current_app.logger.warning('Réplica indisponível, leituras no primário: %s', e)
+    with _lock:
+        _estado.update(ok=ok, atraso=atraso, verificada_em=time.time())
+    return ok
+
+
+def _escreveu_ha_pouco():
+    escrita = session.get('escrita_em')
+    return escrita is not None and time.time() - escrita < current_app.config['REPLICA_JANELA_ESCRITA']
+
+
+def leitura(view):
+    """Tela só de leitura: nos GETs as consultas vão para a réplica quando possível."""
+    @wraps(view)
+    def decorada(*args, **kwargs):
+        g.usar_replica = request.method == 'GET' and not _escreveu_ha_pouco() and disponivel()
+        if not g.usar_replica:
+            return view(*args, **kwargs)
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError as e:
+            current_app.logger.warning('Falha na réplica em %s, refazendo no primário: %s', request.path, e)
+            marcar_indisponivel()
+            g.usar_replica = False
+            current_app.extensions['sqlalchemy'].session.rollback()
+            return view(*args, **kwargs)
+    return decorada
+
+
+def _grava(clause):
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class SessaoRoteada(Session):
+    """Sessão do db: usa a réplica só dentro de uma tela @leitura e só para consultas."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context()
+                and g.get('usar_replica') and not _grava(clause)):
+            return self._db.engines[BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _apos_flush(sessao, contexto):
+    if has_request_context():
+        g.escreveu = True
+
+
+@event.listens_for(SessaoRoteada, 'do_orm_execute')
+def _ao_executar(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        if has_request_context():
+            g.escreveu = True
+
+
+def init_app(app):
+    @app.after_request
+    def _lembrar_escrita(resposta):
+        # Próximas telas deste usuário leem do primário até a réplica alcançar
+        if g.get('escreveu') and configurada():
+            session['escrita_em'] = time.time()
+        return resposta
@@ -0,0 +1,182 @@
+from sqlalchemy import Numeric, func, extract, literal, select, insert, delete, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import date, timedelta
+from decimal import Decimal
+from models import (db, Vendas, Cobrancas, Consultas, Procedimentos, ResumoMensal,
+                    vendas_arquivo, cobrancas_arquivo, consultas_arquivo, procedimentos_arquivo)
+import dinheiro
+import periodos
+
+# categoria -> (modelo, coluna de data, coluna de valor bruto em centavos ou None)
+CATEGORIAS = {
+    'vendas': (Vendas, 'data_venda', 'valor_total_centavos'),
+    'cobrancas': (Cobrancas, 'data_negociacao', 'valor_negociado_centavos'),
+    'consultas': (Consultas, 'data_consulta', None),
+    'procedimentos': (Procedimentos, 'data_procedimento', None),
+}
+
+# Itens dos anos arquivados (arquivo.py): mesmas colunas, só leitura
+ARQUIVO = {
+    'vendas': vendas_arquivo,
+    'cobrancas': cobrancas_arquivo,
+    'consultas': consultas_arquivo,
+    'procedimentos': procedimentos_arquivo,
+}
+
+_CATEGORIA_POR_MODELO = {modelo: cat for cat, (modelo, _, _) in CATEGORIAS.items()}
+
+
+def fontes(categoria):
+    """[(colunas, arquivado)] da tabela original e da de arquivo, para consultas de leitura."""
+    return [(CATEGORIAS[categoria][0].__table__.c, False), (ARQUIVO[categoria].c, True)]
+
+
+def categoria_de(item):
+    return _CATEGORIA_POR_MODELO[type(item)]
+
+
+def marcar_alterado(user_id):
+    """Registra na sessão que os totais do usuário mudaram (None = todos); ver cache.py e sincronizacao.py."""
+    db.session.info.setdefault('usuarios_alterados', set()).add(user_id)
+
+
+def somar(user_id, ano, mes, categoria, qtd, bruto, comissao):
+    """Soma os deltas (bruto e comissão em centavos) ao resumo de um usuário/mês/categoria."""
+    # INSERT ... ON CONFLICT DO UPDATE tem a mesma API no SQLite e no PostgreSQL
+    dialeto = db.session.get_bind().dialect.name
+    ins = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+    stmt = ins(ResumoMensal).values(user_id=user_id, ano=ano, mes=mes, categoria=categoria,
+                                    qtd=qtd, bruto_centavos=bruto, comissao_centavos=comissao,
+                                    bruto=dinheiro.reais(bruto), comissao=dinheiro.reais(comissao))
+    soma = {coluna: ResumoMensal.__table__.c[coluna] + stmt.excluded[coluna]
+            for coluna in ('qtd', 'bruto_centavos', 'comissao_centavos', *ResumoMensal.LEGADO.values())}
+    stmt = stmt.on_conflict_do_update(index_elements=['user_id', 'ano', 'mes', 'categoria'], set_=soma)
+    db.session.execute(stmt)
+    marcar_alterado(user_id)
+
+
+def _aplicar(item, sinal):
+    categoria = categoria_de(item)
+    _, col_data, col_bruto = CATEGORIAS[categoria]
+    data = getattr(item, col_data)
+    bruto = getattr(item, col_bruto) if col_bruto else 0
+    somar(item.user_id, data.year, data.month, categoria,
+          sinal, sinal * (bruto or 0), sinal * (item.comissao_centavos or 0))
+
+
+def adicionar(item):
+    """Soma o item ao resumo mensal (na mesma transação da sessão)."""
+    _aplicar(item, 1)
+
+
+def remover(item):
+    """Subtrai o item do resumo mensal. Em edições, chamar antes de alterar os campos."""
+    _aplicar(item, -1)
+
+
+def _agregados(user_id=None, inicio=None, fim=None):
+    # Consulta de origem: agrega as quatro tabelas (e as de arquivo) por usuário/ano/mês
+    selects = []
+    for categoria, (modelo, col_data, col_bruto) in CATEGORIAS.items():
+        partes = []
+        for c, _ in fontes(categoria):
+            data = c[col_data]
+            q = select(c.user_id, data.label('data'), (c[col_bruto] if col_bruto else literal(0)).label('bruto'),
+                       c.comissao_centavos.label('comissao')).where(data.isnot(None))
+            if user_id is not None:
+                q = q.where(c.user_id == user_id)
+            if inicio is not None:
+                q = q.where(periodos.no_intervalo(data, inicio, fim))
+            partes.append(q)
+        itens = union_all(*partes).subquery()
+        ano, mes = extract('year', itens.c.data), extract('month', itens.c.data)
+        selects.append(select(
+            itens.c.user_id,
+            ano.label('ano'),
+            mes.label('mes'),
+            literal(categoria).label('categoria'),
+            func.count().label('qtd'),
+            func.coalesce(func.sum(itens.c.bruto), 0).label('bruto'),
+            func.coalesce(func.sum(itens.c.comissao), 0).label('comissao'),
+        ).group_by(itens.c.user_id, ano, mes))
+    return selects
+
+
+def _inserir_agregados(q):
+    # Grava também as colunas em reais da versão anterior (ver ResumoMensal.LEGADO)
+    a = q.subquery()
+    centavos = literal(Decimal('0.01'), Numeric(14, 2))
+    db.session.execute(insert(ResumoMensal).from_select(
+        ['user_id', 'ano', 'mes', 'categoria', 'qtd', 'bruto_centavos', 'comissao_centavos', 'bruto', 'comissao'],
+        select(a.c.user_id, a.c.ano, a.c.mes, a.c.categoria, a.c.qtd, a.c.bruto, a.c.comissao,
+               a.c.bruto * centavos, a.c.comissao * centavos)))
+
+
+def reconstruir(user_id=None):
+    """Recalcula o resumo do zero (todos os usuários ou apenas um)."""
+    apagar = delete(ResumoMensal)
+    if user_id is not None:
+        apagar = apagar.where(ResumoMensal.user_id == user_id)
+    db.session.execute(apagar)
+    marcar_alterado(user_id)
+    for q in _agregados(user_id):
+        _inserir_agregados(q)
+    db.session.commit()
+
+
+def reconstruir_periodo(inicio, fim, user_id=None):
+    """Recalcula o resumo dos meses que contêm datas em [inicio, fim). Não faz commit."""
+    inicio = date(inicio.year, inicio.month, 1)
+    ultimo = fim - timedelta(days=1)
+    fim = periodos.intervalo_mes(ultimo.year, ultimo.month)[1]
+    chave_mes = ResumoMensal.ano * 100 + ResumoMensal.mes
+    apagar = delete(ResumoMensal).where(chave_mes >= inicio.year * 100 + inicio.month,
+                                        chave_mes < fim.year * 100 + fim.month)
+    if user_id is not None:
+        apagar = apagar.where(ResumoMensal.user_id == user_id)
+    db.session.execute(apagar)
+    marcar_alterado(user_id)
+    for q in _agregados(user_id, inicio, fim):
+        _inserir_agregados(q)
+
+
+def verificar(user_id=None):
+    """Compara o resumo com as tabelas de origem. Retorna a lista de divergências."""
+    esperado = {}
+    for q in _agregados(user_id):
+        for uid, ano, mes, categoria, qtd, bruto, comissao in db.session.execute(q):
+            esperado[(uid, int(ano), int(mes), categoria)] = (qtd, int(bruto), int(comissao))
+
+    atual = {}
+    q = db.session.query(ResumoMensal)
+    if user_id is not None:
+        q = q.filter_by(user_id=user_id)
+    for r in q:
+        if r.qtd == 0 and not r.bruto_centavos and not r.comissao_centavos:
+            continue
+        atual[(r.user_id, r.ano, r.mes, r.categoria)] = (r.qtd, r.bruto_centavos, r.comissao_centavos)
+
+    divergencias = []
+    for chave in sorted(set(esperado) | set(atual)):
+        if esperado.get(chave) != atual.get(chave):
+            divergencias.append((chave, esperado.get(chave), atual.get(chave)))
+    return divergencias
+
+
+def esta_vazio():
+    return db.session.query(ResumoMensal.id).first() is None
+
+
+# --- Leituras usadas pelas telas ---
+
+def total_mes(user_id, ano, mes):
+    total = db.session.query(func.sum(ResumoMensal.comissao_centavos)).filter_by(user_id=user_id, ano=ano, mes=mes).scalar()
+    return int(total or 0)
+
+
+def totais_categoria(user_id, categoria):
+    """(qtd, comissão, bruto) acumulados de uma categoria, em centavos, sem carregar os itens."""
+    qtd, comissao, bruto = db.session.query(
+        func.sum(ResumoMensal.qtd), func.sum(ResumoMensal.comissao_centavos), func.sum(ResumoMensal.bruto_centavos)
+    ).filter_by(user_id=user_id, categoria=categoria).one()
+    return int(qtd or 0), int(comissao or 0), int(bruto or 0)
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Hash de senhas fora da thread da requisição, com limite de concorrência.
+#
+# O scrypt/pbkdf2 do hashlib libera o GIL, então num pool pequeno de threads o hash não
+# trava as outras requisições do worker (gunicorn gthread). O semáforo limita quantos hashes
+# podem estar em andamento ou na fila; acima disso a requisição desiste com Ocupado em vez de
+# acumular threads esperando. O método (SENHA_METODO) pode ser trocado a qualquer momento:
+# hashes antigos são refeitos no próximo login que acertar a senha.
+# Tentativas erradas são limitadas por nome de usuário, na memória de cada processo: com N workers
+# do gunicorn um atacante consegue até N x SENHA_TENTATIVAS tentativas por janela. É um freio
+# contra adivinhação, não um bloqueio de conta; para um limite global o contador teria de ir
+# para o banco.
+
+
+class Ocupado(Exception):
+    """Muitos hashes em andamento; o cliente deve tentar de novo em instantes."""
+
+
+class _Tentativas:
+    def __init__(self, maximo, janela, max_itens=10000):
+        self.maximo = maximo
+        self.janela = janela
+        self.max_itens = max_itens
+        self._falhas = OrderedDict()  # usuario -> [instantes das falhas dentro da janela]
+        self._lock = threading.Lock()
+
+    def _recentes(self, chave, agora):
+        return [t for t in self._falhas.get(chave, ()) if t > agora - self.janela]
+
+    def bloqueado(self, chave):
+        with self._lock:
+            return len(self._recentes(chave, time.time())) >= self.maximo
+
+    def falhou(self, chave):
+        with self._lock:
+            agora = time.time()
+            self._falhas[chave] = self._recentes(chave, agora) + [agora]
+            self._falhas.move_to_end(chave)
+            while len(self._falhas) > self.max_itens:
+                self._falhas.popitem(last=False)
+
+    def limpar(self, chave):
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+
+_config = {'metodo': None, 'prefixo': None, 'espera': 5.0}
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='senhas')
+_vagas = threading.BoundedSemaphore(8)
+_tentativas = _Tentativas(maximo=5, janela=300)
+
+
+def configurar(metodo=None, threads=2, max_pendentes=8, espera=5.0, tentativas=5, janela=300):
+    global _pool, _vagas
+    _config['metodo'] = metodo
+    _config['prefixo'] = _prefixo(metodo)
+    _config['espera'] = espera
+    _pool.shutdown(wait=False)
+    _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='senhas')
+    _vagas = threading.BoundedSemaphore(max_pendentes)
+    _tentativas.maximo = tentativas
+    _tentativas.janela = janela
+
+
+def _prefixo(metodo):
+    """Prefixo "metodo:parametros" que o werkzeug grava no hash (ex.: "scrypt:32768:8:1"), sem calcular um hash."""
+    nome, *args = (metodo or 'scrypt').split(':')
+    if nome == 'scrypt' and len(args) in (0, 3):
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if nome == 'pbkdf2' and len(args) <= 2:
+        hash_name = args[0] if args else 'sha256'
+        iteracoes = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iteracoes}'
+    raise ValueError(f'SENHA_METODO inválido: {metodo}')
+
+
+def _gerar(senha):
+    if _config['metodo']:
+        return generate_password_hash(senha, method=_config['metodo'])
+    return generate_password_hash(senha)
+
+
+def _no_pool(funcao, *args):
+    if not _vagas.acquire(timeout=_config['espera']):
+        raise Ocupado()
+    try:
+        return _pool.submit(funcao, *args).result()
+    finally:
+        _vagas.release()
+
+
+def gerar_hash(senha):
+    return _no_pool(_gerar, senha)
+
+
+def verificar(hash_senha, senha):
+    return _no_pool(check_password_hash, hash_senha, senha)
+
+
+def precisa_rehash(hash_senha):
+    prefixo = _config['prefixo'] or _prefixo(_config['metodo'])
+    return hash_senha.split('$', 1)[0] != prefixo
+
+
+def _chave(usuario):
+    return (usuario or '').strip().lower()
+
+
+def bloqueado(usuario):
+    return _tentativas.bloqueado(_chave(usuario))
+
+
+def falhou(usuario):
+    _tentativas.falhou(_chave(usuario))
+
+
+def acertou(usuario):
+    _tentativas.limpar(_chave(usuario))
+
+
+def init_app(app):
+    configurar(metodo=app.config.get('SENHA_METODO'),
+               threads=app.config.get('SENHA_THREADS', 2),
+               max_pendentes=app.config.get('SENHA_MAX_PENDENTES', 8),
+               espera=app.config.get('SENHA_ESPERA', 5.0),
+               tentativas=app.config.get('SENHA_TENTATIVAS', 5),
+               janela=app.config.get('SENHA_JANELA', 300))
@@ -0,0 +1,314 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, event, insert, literal, or_, select, union_all, update
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from models import db, ChaveSincronizacao, ItemExcluido, Consultas, Procedimentos, Vendas, Cobrancas
+import comissoes
+import dinheiro
+import resumo
+
+# API de sincronização para lançamento offline (celular): /api/sync.
+#
+# Envio: muitos itens das quatro categorias num POST só, cada um com uma chave de idempotência
+# escolhida pelo aparelho. Uma chave já gravada devolve o item criado antes em vez de duplicar;
+# itens inválidos voltam com o erro e não gravam a chave (podem ser corrigidos e reenviados).
+#
+# Recebimento: o que mudou depois de um cursor, em páginas, pela coluna atualizado_em das
+# quatro tabelas (índice user_id, atualizado_em, id) mais as exclusões (itens_excluidos).
+# O cursor é "instante_ramo_id_base": a posição (instante, ramo, id) até onde já foi entregue,
+# na ordem (instante, ramo, id), e a base, o instante até onde o aparelho estava em dia quando
+# começou a paginar. Sem mais páginas, a posição avança até o fim da janela consultada, mesmo
+# sem mudanças; a validade (RETENCAO) conta da base, não do último registro entregue.
+# Registros dos últimos MARGEM segundos ainda não são entregues: uma transação em andamento
+# pode gravar com um instante anterior ao do commit, e o cursor já teria passado por ele.
+# Transações longas (importação, recálculo de regras) carimbam de novo, no commit, o que
+# gravaram (_carimbar_no_commit), então MARGEM só precisa cobrir esse último UPDATE e o commit.
+
+MAX_ITENS = 500
+LIMITE = 500
+MARGEM = timedelta(seconds=5)
+RETENCAO = timedelta(days=30)  # chaves e exclusões; cursores mais antigos precisam sincronizar do zero
+
+EXCLUSOES = 'exclusoes'
+FIM_DA_JANELA = '~'  # ramo depois de todos: posição "tudo até este instante já foi entregue"
+
+# categoria -> campos devolvidos no recebimento (além de id e atualizado_em)
+CAMPOS = {
+    'vendas': ('nome_cliente', 'data_venda', 'tipo_venda', 'valor_total_centavos', 'comissao_centavos'),
+    'cobrancas': ('nome_cliente', 'data_negociacao', 'valor_negociado_centavos', 'comissao_centavos'),
+    'consultas': ('nome_cliente', 'data_consulta', 'status', 'comissao_centavos'),
+    'procedimentos': ('nome_cliente', 'data_procedimento', 'tipo_procedimento', 'comissao_centavos'),
+}
+
+
+class ErroSincronizacao(Exception):
+    pass
+
+
+class CursorExpirado(ErroSincronizacao):
+    pass
+
+
+# --- Envio -------------------------------------------------------------------------
+
+def _data(entrada, campo):
+    texto = entrada.get(campo)
+    if not texto:
+        return datetime.utcnow().date()
+    try:
+        return datetime.strptime(str(texto), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{campo} inválida "{texto}" (use AAAA-MM-DD)')
+
+
+def _valor(entrada, campo):
+    # Centavos (inteiro) ou reais, como nos formulários
+    if entrada.get(f'{campo}_centavos') is not None:
+        valor = entrada[f'{campo}_centavos']
+        if not isinstance(valor, int) or isinstance(valor, bool):
+            raise ValueError(f'{campo}_centavos deve ser inteiro')
+        return valor
+    if entrada.get(campo) is None:
+        raise ValueError(f'{campo} ausente')
+    return dinheiro.centavos(entrada[campo])
+
+
+def _montar(categoria, user_id, entrada):
+    # Mesmo que os formulários de cada categoria fazem (ValueError se inválido)
+    cliente = str(entrada.get('nome_cliente') or '').strip()
+    if not cliente:
+        raise ValueError('nome_cliente vazio')
+    if categoria == 'vendas':
+        tipo = entrada.get('tipo_venda')
+        if tipo not in comissoes.TIPOS_VENDA:
+            raise ValueError(f'tipo_venda inválido "{tipo}" (use {", ".join(comissoes.TIPOS_VENDA)})')
+        data, valor = _data(entrada, 'data_venda'), _valor(entrada, 'valor_total')
+        return Vendas(user_id=user_id, nome_cliente=cliente, tipo_venda=tipo, data_venda=data,
+                      valor_total_centavos=valor, comissao_centavos=comissoes.calcular('vendas', data, valor, tipo))
+    if categoria == 'cobrancas':
+        data, valor = _data(entrada, 'data_negociacao'), _valor(entrada, 'valor_negociado')
+        return Cobrancas(user_id=user_id, nome_cliente=cliente, data_negociacao=data, valor_negociado_centavos=valor,
+                         comissao_centavos=comissoes.calcular('cobrancas', data, valor))
+    if categoria == 'consultas':
+        data = _data(entrada, 'data_consulta')
+        return Consultas(user_id=user_id, nome_cliente=cliente, status='Realizada', data_consulta=data,
+                         comissao_centavos=comissoes.calcular('consultas', data))
+    if categoria == 'procedimentos':
+        tipo = entrada.get('tipo_procedimento') or 'Cirurgia'
+        data = _data(entrada, 'data_procedimento')
+        return Procedimentos(user_id=user_id, nome_cliente=cliente, tipo_procedimento=tipo, data_procedimento=data,
+                             comissao_centavos=comissoes.calcular('procedimentos', data, tipo=tipo))
+    raise ValueError(f'categoria inválida "{categoria}"')
+
+
+def _enviar(user_id, itens):
+    chaves = [str(i.get('chave')) for i in itens]
+    ja_gravadas = {c.chave: c for c in ChaveSincronizacao.query.filter(
+        ChaveSincronizacao.user_id == user_id, ChaveSincronizacao.chave.in_(set(chaves)))}
+    resultados = []
+    criados = {}  # chave -> (categoria, item) criados nesta chamada
+    for chave, entrada in zip(chaves, itens):
+        if chave in ja_gravadas:
+            gravada = ja_gravadas[chave]
+            resultados.append({'chave': chave, 'status': 'duplicado', 'categoria': gravada.categoria,
+                               'id': gravada.item_id})
+            continue
+        if chave in criados:
+            # Mesma chave repetida no próprio lote
+            resultados.append({'chave': chave, 'status': 'duplicado', 'categoria': criados[chave][0]})
+            continue
+        categoria = entrada.get('categoria')
+        try:
+            item = _montar(categoria, user_id, entrada)
+        except (ValueError, TypeError) as e:
+            resultados.append({'chave': chave, 'status': 'erro', 'erro': str(e)})
+            continue
+        db.session.add(item)
+        resumo.adicionar(item)
+        criados[chave] = (categoria, item)
+        resultados.append({'chave': chave, 'status': 'criado', 'categoria': categoria})
+    db.session.flush()
+    for chave, (categoria, item) in criados.items():
+        db.session.add(ChaveSincronizacao(user_id=user_id, chave=chave, categoria=categoria, item_id=item.id))
+    for r in resultados:
+        if 'id' not in r and r['status'] != 'erro':
+            r['id'] = criados[r['chave']][1].id
+    db.session.commit()
+    return resultados
+
+
+def enviar(user_id, itens):
+    """Cria os itens enviados. Retorna [{chave, status: criado|duplicado|erro, categoria, id | erro}] na ordem."""
+    if not isinstance(itens, list) or not itens:
+        raise ErroSincronizacao('Envie {"itens": [...]} com ao menos um item.')
+    if len(itens) > MAX_ITENS:
+        raise ErroSincronizacao(f'No máximo {MAX_ITENS} itens por envio.')
+    for entrada in itens:
+        if not isinstance(entrada, dict) or not entrada.get('chave') or len(str(entrada['chave'])) > 100:
+            raise ErroSincronizacao('Cada item precisa de uma "chave" (até 100 caracteres).')
+    try:
+        return _enviar(user_id, itens)
+    except IntegrityError:
+        # Outro envio com as mesmas chaves gravou antes (reenvio simultâneo): agora elas são duplicadas
+        db.session.rollback()
+        return _enviar(user_id, itens)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# --- Recebimento -------------------------------------------------------------------
+
+def codificar_cursor(instante, ramo, id, base):
+    return f'{instante.isoformat()}_{ramo}_{id}_{base.isoformat()}'
+
+
+def decodificar_cursor(cursor):
+    """(instante, ramo, id, base). Cursores antigos, sem base, valem a partir da própria posição."""
+    try:
+        partes = cursor.split('_')
+        instante, ramo, id = partes[:3]
+        base = partes[3] if len(partes) == 4 else instante
+        if len(partes) not in (3, 4):
+            raise ValueError
+        return datetime.fromisoformat(instante), ramo, int(id), datetime.fromisoformat(base)
+    except (AttributeError, ValueError):
+        raise ErroSincronizacao('Cursor inválido.')
+
+
+def _depois(coluna_instante, coluna_id, ramo, posicao):
+    # (instante, ramo, id) > posicao, com o ramo fixo nesta parte do UNION (usa o índice)
+    instante, ramo_cursor, id_cursor, _ = posicao
+    if ramo > ramo_cursor:
+        return coluna_instante >= instante
+    if ramo < ramo_cursor:
+        return coluna_instante > instante
+    return or_(coluna_instante > instante, and_(coluna_instante == instante, coluna_id > id_cursor))
+
+
+def _ramos():
+    ramos = [(cat, modelo.atualizado_em, modelo.id, modelo.user_id) for cat, (modelo, _, _) in resumo.CATEGORIAS.items()]
+    ramos.append((EXCLUSOES, ItemExcluido.excluido_em, ItemExcluido.id, ItemExcluido.user_id))
+    return ramos
+
+
+def mudancas(user_id, cursor=None, limite=LIMITE):
+    """Itens criados/alterados e exclusões depois do cursor. Retorna {itens, excluidos, cursor, mais}."""
+    ate = datetime.utcnow() - MARGEM
+    posicao = decodificar_cursor(cursor) if cursor else None
+    # Exclusões mais antigas que RETENCAO são apagadas (limpar_antigos): um aparelho em dia só
+    # até antes disso pode ter perdido alguma
+    if posicao and posicao[3] < datetime.utcnow() - RETENCAO:
+        raise CursorExpirado('Cursor expirado: sincronize do zero (sem cursor).')
+    partes = []
+    for ramo, instante, id, dono in _ramos():
+        filtros = [dono == user_id, instante <= ate]
+        if posicao:
+            filtros.append(_depois(instante, id, ramo, posicao))
+        partes.append(select(instante.label('instante'), literal(ramo).label('ramo'), id.label('id'))
+                      .where(*filtros).order_by(instante, id).limit(limite + 1).subquery().select())
+    todas = union_all(*partes).subquery()
+    chaves = db.session.execute(select(todas).order_by(todas.c.instante, todas.c.ramo, todas.c.id)
+                                .limit(limite + 1)).all()
+    mais = len(chaves) > limite
+    chaves = chaves[:limite]
+
+    itens, excluidos = [], []
+    por_ramo = {}
+    for instante, ramo, id in chaves:
+        por_ramo.setdefault(ramo, []).append(id)
+    for exclusao in ItemExcluido.query.filter(ItemExcluido.id.in_(por_ramo.pop(EXCLUSOES, []))):
+        excluidos.append({'categoria': exclusao.categoria, 'id': exclusao.item_id,
+                          'excluido_em': exclusao.excluido_em.isoformat()})
+    for categoria, ids in por_ramo.items():
+        modelo = resumo.CATEGORIAS[categoria][0]
+        for item in modelo.query.filter(modelo.id.in_(ids)):
+            registro = {'categoria': categoria, 'id': item.id, 'atualizado_em': item.atualizado_em.isoformat()}
+            for campo in CAMPOS[categoria]:
+                valor = getattr(item, campo)
+                registro[campo] = valor.isoformat() if hasattr(valor, 'isoformat') else valor
+            itens.append(registro)
+    itens.sort(key=lambda r: (r['atualizado_em'], r['categoria'], r['id']))
+    excluidos.sort(key=lambda r: r['excluido_em'])
+
+    if mais:
+        # Continua de onde parou; a base é a do início da paginação (sem cursor: a janela atual)
+        novo_cursor = codificar_cursor(*chaves[-1], posicao[3] if posicao else ate)
+    elif posicao and posicao[0] >= ate:
+        novo_cursor = cursor
+    else:
+        # Em dia até o fim da janela, mesmo que nada tenha mudado
+        novo_cursor = codificar_cursor(ate, FIM_DA_JANELA, 0, ate)
+    return {'itens': itens, 'excluidos': excluidos, 'cursor': novo_cursor, 'mais': mais}
+
+
+# --- Exclusões e limpeza -----------------------------------------------------------
+
+def registrar_exclusoes(categoria, user_id, ids):
+    """Anota itens excluídos por DELETE em massa (em_lote.py). Não faz commit."""
+    if ids:
+        db.session.execute(insert(ItemExcluido), [{'user_id': user_id, 'categoria': categoria, 'item_id': i}
+                                                  for i in ids])
+
+
+def limpar_antigos():
+    """Apaga chaves de idempotência e exclusões mais antigas que RETENCAO."""
+    limite = datetime.utcnow() - RETENCAO
+    db.session.execute(delete(ChaveSincronizacao).where(ChaveSincronizacao.criada_em < limite))
+    db.session.execute(delete(ItemExcluido).where(ItemExcluido.excluido_em < limite))
+    db.session.commit()
+
+
+# --- Carimbo no commit --------------------------------------------------------------
+
+def _carimbos():
+    colunas = [modelo.__table__.c.atualizado_em for modelo, _, _ in resumo.CATEGORIAS.values()]
+    return colunas + [ItemExcluido.__table__.c.excluido_em]
+
+
+def _inicio_transacao(session, transacao, conexao):
+    session.info.setdefault('inicio_transacao', datetime.utcnow())
+
+
+def _fim_transacao(session, transacao):
+    if transacao.parent is None:
+        session.info.pop('inicio_transacao', None)
+
+
+def _carimbar_no_commit(session):
+    # O que a transação gravou leva o instante do fim dela, não o de cada INSERT/UPDATE: numa
+    # importação de vários segundos as primeiras linhas ficariam atrás de cursores já entregues.
+    # Os usuários são os marcados pelas escritas (resumo.marcar_alterado); a marca "todos" (None)
+    # não alarga o UPDATE para linhas de outros usuários gravadas por outras transações: quem
+    # altera itens de vários usuários marca cada dono. Transações curtas (formulários) já ficam
+    # dentro de MARGEM e não pagam o UPDATE extra.
+    inicio = session.info.get('inicio_transacao')
+    usuarios = sorted(u for u in session.info.get('usuarios_alterados', ()) if u is not None)
+    if inicio is None or not usuarios:
+        return
+    session.flush()
+    agora = datetime.utcnow()
+    if agora - inicio < MARGEM / 5:
+        return
+    for coluna in _carimbos():
+        session.execute(update(coluna.table).where(coluna >= inicio, coluna.table.c.user_id.in_(usuarios))
+                        .values({coluna.name: agora}))
+
+
+if not event.contains(Session, 'before_commit', _carimbar_no_commit):
+    event.listen(Session, 'after_begin', _inicio_transacao)
+    event.listen(Session, 'after_transaction_end', _fim_transacao)
+    event.listen(Session, 'before_commit', _carimbar_no_commit)
+
+
+def _registrar(categoria, modelo):
+    tabela = ItemExcluido.__table__
+
+    @event.listens_for(modelo, 'after_delete')
+    def _excluido(mapper, conexao, item):
+        conexao.execute(insert(tabela).values(user_id=item.user_id, categoria=categoria, item_id=item.id,
+                                              excluido_em=datetime.utcnow()))
+
+
+for _categoria, (_modelo, _, _) in resumo.CATEGORIAS.items():
+    _registrar(_categoria, _modelo)
@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, or_, select, update
+from models import db, Tarefa, ResumoMensal
+from relatorio import MESES_NOMES
+from resumo import CATEGORIAS
+import arquivo
+import comissoes
+import dinheiro
+import exportacao
+import periodos
+import resumo
+import sincronizacao
+
+# Fila de tarefas em segundo plano, guardada na tabela tarefas.
+#
+# As rotas só enfileiram (enfileirar) e consultam o status; "flask worker" (processo separado,
+# ver Procfile e gunicorn.conf.py) reserva uma tarefa por vez com um UPDATE condicional, então
+# vários workers podem rodar juntos. A reserva expira (TAREFAS_RESERVA) e é renovada a cada
+# atualização de progresso: se o worker morrer, a tarefa volta para a fila. Falhas são
+# repetidas com espera crescente até max_tentativas. Cada usuário tem no máximo
+# TAREFAS_POR_USUARIO tarefas executando e TAREFAS_MAX_PENDENTES na fila.
+
+log = logging.getLogger(__name__)
+
+ATIVAS = ('pendente', 'executando')
+
+TIPOS = {}  # nome -> (funcao, descricao, parametros aceitos, somente_admin)
+
+_config = {
+    'diretorio': os.path.join(os.path.abspath(os.path.dirname(__file__)), 'arquivos_tarefas'),
+    'por_usuario': 1,
+    'max_pendentes': 5,
+    'tentativas': 3,
+    'reserva': 900,
+    'retencao_dias': 7,
+}
+
+
+class LimiteTarefas(Exception):
+    """O usuário já tem tarefas demais na fila."""
+
+
+def tarefa(nome, descricao, parametros=(), somente_admin=False):
+    def registrar(funcao):
+        TIPOS[nome] = (funcao, descricao, tuple(parametros), somente_admin)
+        return funcao
+    return registrar
+
+
+def configurar(diretorio=None, por_usuario=1, max_pendentes=5, tentativas=3, reserva=900, retencao_dias=7):
+    if diretorio:
+        _config['diretorio'] = diretorio
+    _config.update(por_usuario=por_usuario, max_pendentes=max_pendentes, tentativas=tentativas,
+                   reserva=reserva, retencao_dias=retencao_dias)
+
+
+def init_app(app):
+    configurar(app.config.get('TAREFAS_DIR'), app.config.get('TAREFAS_POR_USUARIO', 1),
+               app.config.get('TAREFAS_MAX_PENDENTES', 5), app.config.get('TAREFAS_TENTATIVAS', 3),
+               app.config.get('TAREFAS_RESERVA', 900), app.config.get('TAREFAS_RETENCAO_DIAS', 7))
+
+
+# --- Fila ----------------------------------------------------------------------
+
+def enfileirar(tipo, user_id=None, **parametros):
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+    if user_id is not None:
+        ativas = Tarefa.query.filter(Tarefa.user_id == user_id, Tarefa.status.in_(ATIVAS)).count()
+        if ativas >= _config['max_pendentes']:
+            raise LimiteTarefas()
+    item = Tarefa(user_id=user_id, tipo=tipo, parametros=json.dumps(parametros),
+                  max_tentativas=_config['tentativas'])
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def como_dict(item):
+    return {
+        'id': item.id, 'tipo': item.tipo, 'descricao': TIPOS.get(item.tipo, (None, item.tipo))[1],
+        'parametros': json.loads(item.parametros or '{}'), 'status': item.status,
+        'progresso': item.progresso, 'mensagem': item.mensagem, 'tem_arquivo': bool(item.arquivo),
+        'tentativas': item.tentativas,
+        'criada_em': item.criada_em.isoformat() if item.criada_em else None,
+        'concluida_em': item.concluida_em.isoformat() if item.concluida_em else None,
+    }
+
+
+def caminho_arquivo(item):
+    return os.path.join(_config['diretorio'], item.arquivo) if item.arquivo else None
+
+
+def _liberar_abandonadas(agora):
+    # Reserva vencida = worker morreu no meio; volta para a fila (ou falha se esgotou as tentativas)
+    vencidas = (Tarefa.status == 'executando', Tarefa.reservada_ate < agora)
+    db.session.execute(update(Tarefa).where(*vencidas, Tarefa.tentativas >= Tarefa.max_tentativas)
+                       .values(status='falhou', mensagem='Worker interrompido', concluida_em=agora)
+                       .execution_options(synchronize_session=False))
+    db.session.execute(update(Tarefa).where(*vencidas)
+                       .values(status='pendente', worker=None, reservada_ate=None)
+                       .execution_options(synchronize_session=False))
+
+
+def reservar(worker):
+    """Reserva a próxima tarefa pronta para este worker. Retorna a Tarefa ou None."""
+    agora = datetime.utcnow()
+    _liberar_abandonadas(agora)
+    db.session.commit()
+    # Usuários que já estão no limite de tarefas executando ficam de fora desta rodada
+    lotados = (select(Tarefa.user_id).where(Tarefa.status == 'executando', Tarefa.user_id.is_not(None))
+               .group_by(Tarefa.user_id).having(func.count() >= _config['por_usuario']))
+    candidatas = (select(Tarefa.id)
+                  .where(Tarefa.status == 'pendente', Tarefa.executar_apos <= agora,
+                         or_(Tarefa.user_id.is_(None), Tarefa.user_id.not_in(lotados)))
+                  .order_by(Tarefa.executar_apos, Tarefa.id).limit(5))
+    for tarefa_id in db.session.execute(candidatas).scalars().all():
+        # UPDATE condicional: se outro worker pegou antes, rowcount é 0 e tentamos a próxima
+        resultado = db.session.execute(
+            update(Tarefa).where(Tarefa.id == tarefa_id, Tarefa.status == 'pendente')
+            .values(status='executando', worker=worker, iniciada_em=agora, tentativas=Tarefa.tentativas + 1,
+                    reservada_ate=agora + timedelta(seconds=_config['reserva']))
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        if resultado.rowcount == 1:
+            return db.session.get(Tarefa, tarefa_id)
+    return None
+
+
+class Contexto:
+    """O que a função da tarefa recebe: parâmetros, progresso e arquivo de resultado."""
+
+    def __init__(self, item):
+        self.id = item.id
+        self.user_id = item.user_id
+        self.arquivo = None
+        self.linhas = 0  # registros já entregues por _com_progresso
+        self._ultimo = 0
+
+    def progresso(self, percentual, mensagem=None, forcar=False):
+        # Transação própria e curta (no máximo 1 por segundo); também renova a reserva
+        agora = time.monotonic()
+        if not forcar and agora - self._ultimo < 1:
+            return
+        self._ultimo = agora
+        valores = {'progresso': max(0, min(int(percentual), 99)),
+                   'reservada_ate': datetime.utcnow() + timedelta(seconds=_config['reserva'])}
+        if mensagem is not None:
+            valores['mensagem'] = mensagem[:500]
+        with db.engine.begin() as conn:
+            conn.execute(update(Tarefa.__table__).where(Tarefa.__table__.c.id == self.id).values(**valores))
+
+    def caminho(self, nome):
+        os.makedirs(_config['diretorio'], exist_ok=True)
+        self.arquivo = f'{self.id}_{nome}'
+        return os.path.join(_config['diretorio'], self.arquivo)
+
+
+def executar(item):
+    funcao = TIPOS[item.tipo][0]
+    parametros = json.loads(item.parametros or '{}')
+    ctx = Contexto(item)
+    tarefa_id, tentativas, maximo = item.id, item.tentativas, item.max_tentativas
+    inicio = time.perf_counter()
+    try:
+        mensagem = funcao(ctx, **parametros)
+        db.session.commit()
+        valores = {'status': 'concluida', 'progresso': 100, 'mensagem': (mensagem or 'Concluída')[:500],
+                   'arquivo': ctx.arquivo}
+        log.info('Tarefa %s (%s) concluída em %.1fs', tarefa_id, item.tipo, time.perf_counter() - inicio)
+    except Exception as e:
+        db.session.rollback()
+        log.exception('Tarefa %s (%s) falhou na tentativa %s', tarefa_id, item.tipo, tentativas)
+        if tentativas < maximo:
+            espera = 30 * 2 ** (tentativas - 1)
+            valores = {'status': 'pendente', 'executar_apos': datetime.utcnow() + timedelta(seconds=espera),
+                       'mensagem': f'Erro: {e}. Nova tentativa em {espera}s.'[:500]}
+        else:
+            valores = {'status': 'falhou', 'mensagem': f'Erro: {e}'[:500]}
+    if valores['status'] != 'pendente':
+        valores['concluida_em'] = datetime.utcnow()
+    valores.update(worker=None, reservada_ate=None)
+    db.session.execute(update(Tarefa).where(Tarefa.id == tarefa_id).values(**valores)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def limpar_antigas():
+    """Apaga tarefas terminadas (e seus arquivos) mais antigas que TAREFAS_RETENCAO_DIAS."""
+    limite = datetime.utcnow() - timedelta(days=_config['retencao_dias'])
+    antigas = Tarefa.query.filter(Tarefa.status.in_(('concluida', 'falhou')), Tarefa.concluida_em < limite).all()
+    for item in antigas:
+        caminho = caminho_arquivo(item)
+        if caminho and os.path.exists(caminho):
+            os.remove(caminho)
+        db.session.delete(item)
+    db.session.commit()
+    return len(antigas)
+
+
+def rodar_worker(nome=None, intervalo=2.0, uma_vez=False):
+    """Laço do worker: reserva, executa, repete. SIGTERM termina depois da tarefa atual."""
+    nome = nome or f'{socket.gethostname()}:{os.getpid()}'
+    parar = []
+    signal.signal(signal.SIGTERM, lambda *_: parar.append(True))
+    ultima_limpeza = 0
+    while not parar:
+        if time.monotonic() - ultima_limpeza > 3600:
+            limpar_antigas()
+            sincronizacao.limpar_antigos()
+            ultima_limpeza = time.monotonic()
+        item = reservar(nome)
+        if item is None:
+            if uma_vez:
+                break
+            time.sleep(intervalo)
+            continue
+        executar(item)
+        db.session.remove()
+
+
+# --- Tipos de tarefa ---------------------------------------------------------------
+
+def _data(valor):
+    return date.fromisoformat(valor) if valor else None
+
+
+def _estimar_linhas(user_id, categorias, inicio, fim):
+    # Pelo resumo mensal (meses inteiros, fim exclusivo): só para a barra de progresso
+    q = db.session.query(func.sum(ResumoMensal.qtd)).filter(ResumoMensal.user_id == user_id,
+                                                            ResumoMensal.categoria.in_(categorias))
+    chave = ResumoMensal.ano * 100 + ResumoMensal.mes
+    if inicio:
+        q = q.filter(chave >= inicio.year * 100 + inicio.month)
+    if fim:
+        ultimo = fim - timedelta(days=1)
+        q = q.filter(chave <= ultimo.year * 100 + ultimo.month)
+    return int(q.scalar() or 0)
+
+
+def _com_progresso(ctx, registros, total, inicio_pct=0, fim_pct=99):
+    for i, r in enumerate(registros, 1):
+        ctx.linhas = i
+        if i % 1000 == 0:
+            ctx.progresso(inicio_pct + (fim_pct - inicio_pct) * min(i / max(total, 1), 1), f'{i} de ~{total} linhas')
+        yield r
+
+
+@tarefa('exportacao', 'Exportação do histórico', parametros=('categoria', 'formato', 'inicio', 'fim'))
+def _exportacao(ctx, categoria='todas', formato='csv', inicio=None, fim=None):
+    categorias = list(CATEGORIAS) if categoria == 'todas' else [categoria]
+    inicio, fim = _data(inicio), _data(fim)
+    gerador, _ = exportacao.FORMATOS[formato]
+    total = _estimar_linhas(ctx.user_id, categorias, inicio, fim)
+    registros = _com_progresso(ctx, exportacao.linhas(ctx.user_id, categorias, inicio, fim), total)
+    # fim é exclusivo; o nome leva o último dia exportado (março termina em 31/03, não em 01/04)
+    ultimo_dia = fim - timedelta(days=1) if fim else 'hoje'
+    nome = f"comissoes_{categoria}_{inicio or 'inicio'}_{ultimo_dia}.{formato}"
+    with open(ctx.caminho(nome), 'w', encoding='utf-8', newline='') as arquivo:
+        for pedaco in gerador(registros):
+            arquivo.write(pedaco)
+    return f'{ctx.linhas} linhas exportadas'
+
+
+@tarefa('extrato_anual', 'Extrato anual de comissões', parametros=('ano',))
+def _extrato_anual(ctx, ano):
+    ano = int(ano)
+    inicio, fim = periodos.intervalo_ano(ano)
+    meses = {}
+    for r in ResumoMensal.query.filter_by(user_id=ctx.user_id, ano=ano):
+        mes = meses.setdefault(r.mes, {c: 0 for c in CATEGORIAS})
+        mes[r.categoria] += r.comissao_centavos
+    total = _estimar_linhas(ctx.user_id, list(CATEGORIAS), inicio, inicio.replace(month=12))
+
+    with open(ctx.caminho(f'extrato_{ano}.csv'), 'w', encoding='utf-8', newline='') as arquivo:
+        # Primeiro o resumo mês a mês, depois o detalhamento item a item
+        arquivo.write(f'Extrato de comissões {ano}\n')
+        arquivo.write('mes;' + ';'.join(CATEGORIAS) + ';total\n')
+        total_ano = 0
+        for mes in sorted(meses):
+            valores = [meses[mes][c] for c in CATEGORIAS]
+            total_ano += sum(valores)
+            arquivo.write(';'.join([MESES_NOMES[mes]] + [dinheiro.formatar(v) for v in valores]
+                                   + [dinheiro.formatar(sum(valores))]) + '\n')
+        arquivo.write(f'Total do ano;;;;;{dinheiro.formatar(total_ano)}\n')
+        arquivo.write('\n')
+        registros = _com_progresso(ctx, exportacao.linhas(ctx.user_id, list(CATEGORIAS), inicio, fim), total)
+        for pedaco in exportacao.gerar_csv(registros):
+            arquivo.write(pedaco)
+    return f'Extrato {ano}: R$ {dinheiro.formatar(total_ano)}'
+
+
+@tarefa('recalcular', 'Recalcular comissões', parametros=('inicio', 'fim', 'usuario', 'categoria'),
+        somente_admin=True)
+def _recalcular(ctx, inicio, fim, usuario=None, categoria=None):
+    # fim inclusivo, como no "flask recalcular"
+    ctx.progresso(5, 'Recalculando', forcar=True)
+    alteradas = comissoes.recalcular_periodo(_data(inicio), _data(fim) + timedelta(days=1),
+                                             int(usuario) if usuario else None, categoria or None)
+    db.session.commit()
+    return f'{alteradas} item(ns) recalculado(s)'
+
+
+@tarefa('verificar_integridade', 'Verificação de integridade', somente_admin=True)
+def _verificar_integridade(ctx):
+    problemas = []
+    hoje = date.today()
+    for i, (categoria, (modelo, col_data, _)) in enumerate(CATEGORIAS.items()):
+        ctx.progresso(i * 15, f'Datas de {categoria}', forcar=True)
+        data = getattr(modelo, col_data)
+        nulas = modelo.query.filter(data.is_(None)).count()
+        futuras = modelo.query.filter(data > hoje + timedelta(days=365)).count()
+        if nulas:
+            problemas.append(f'{categoria}: {nulas} linha(s) sem data')
+        if futuras:
+            problemas.append(f'{categoria}: {futuras} linha(s) com data mais de um ano no futuro')
+    ctx.progresso(60, 'Conferindo o resumo mensal', forcar=True)
+    divergencias = resumo.verificar()
+    for (uid, ano, mes, categoria), esperado, atual in divergencias:
+        problemas.append(f'resumo user {uid} {mes:02d}/{ano} {categoria}: esperado={esperado} atual={atual}')
+
+    with open(ctx.caminho('integridade.txt'), 'w', encoding='utf-8') as arquivo:
+        arquivo.write('\n'.join(problemas) + '\n' if problemas else 'Nenhum problema encontrado.\n')
+    return f'{len(problemas)} problema(s) encontrado(s)' if problemas else 'Nenhum problema encontrado'
+
+
+@tarefa('arquivar', 'Arquivar ano fechado', parametros=('ano',), somente_admin=True)
+def _arquivar(ctx, ano):
+    ano = int(ano)
+    total = db.session.query(func.sum(ResumoMensal.qtd)).filter(ResumoMensal.ano == ano).scalar() or 0
+    linhas = arquivo.arquivar_ano(ano, log=log.info,
+                                  progresso=lambda n: ctx.progresso(99 * n / max(total, 1), f'{n} de ~{total} linhas'))
+    return f'{ano}: {linhas} linha(s) arquivada(s)'
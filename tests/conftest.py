@@ -0,0 +1,63 @@
+import contextvars
+import os
+import sys
+import tempfile
+import pytest
+from flask.testing import FlaskClient
+
+# Banco SQLite temporário: as variáveis precisam existir antes do import do app (config.py)
+_DIR = tempfile.mkdtemp(prefix='comissoes_testes_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DIR, 'testes.db')
+os.environ['CACHE_SQLITE_PATH'] = os.path.join(_DIR, 'cache.db')
+os.environ['TAREFAS_DIR'] = os.path.join(_DIR, 'tarefas')
+os.environ['SENHA_METODO'] = 'pbkdf2:sha256:1000'
+os.environ['METRICAS_ATIVAS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENHA = 'senha-de-teste'
+
+
+class ClienteIsolado(FlaskClient):
+    # Cada requisição com o seu próprio contexto da aplicação (g, sessão do banco), como num
+    # servidor de verdade, e não o contexto aberto pelo teste
+    def open(self, *args, **kwargs):
+        return contextvars.Context().run(super().open, *args, **kwargs)
+
+
+@pytest.fixture
+def app():
+    from app import app as aplicacao
+    from models import db
+    from cache import cache
+    import identidade
+    import migracoes
+    aplicacao.config['TESTING'] = True
+    aplicacao.test_client_class = ClienteIsolado
+    with aplicacao.app_context():
+        db.session.remove()
+        db.drop_all()
+        migracoes.aplicar(log=lambda *_: None)
+        cache.limpar()
+        identidade._versoes._itens.clear()
+        yield aplicacao
+        db.session.remove()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+def criar_usuario(nome='Vendedor Teste', senha=SENHA):
+    from models import db, User
+    user = User(username=nome, full_name=nome)
+    user.set_password(senha)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def entrar(cliente, nome='Vendedor Teste', senha=SENHA):
+    resp = cliente.post('/login', data={'full_name': nome, 'password': senha})
+    assert resp.status_code == 302
+    return resp
@@ -0,0 +1,52 @@
+from conftest import criar_usuario, entrar
+from models import db
+import analise
+import resumo
+
+
+def _comissoes(user_id, meses):
+    for (ano, mes, categoria), comissao in meses.items():
+        resumo.somar(user_id, ano, mes, categoria, 1, 0, comissao)
+    db.session.commit()
+
+
+def test_crescimento_mes_a_mes_e_ano_a_ano(app):
+    user_id = criar_usuario()
+    # Sem lançamentos em jan/2024 nem em abr/2023 e abr/2024
+    _comissoes(user_id, {(2023, 3, 'vendas'): 10000, (2024, 2, 'vendas'): 8000,
+                         (2024, 3, 'vendas'): 10000, (2024, 3, 'consultas'): 2000})
+
+    dados = analise.montar(user_id, 2024, 4, meses=3)
+
+    campos = ('ano', 'mes', 'comissao', 'mes_anterior', 'ano_anterior', 'crescimento_mes', 'crescimento_ano',
+              'acumulado_12m', 'posicao')
+    assert [tuple(linha[c] for c in campos) for linha in dados['meses']] == [
+        # fev/2024: jan/2024 vazio (sem base para %), fev/2023 antes do início do histórico
+        (2024, 2, 8000, 0, None, None, None, 18000, 2),
+        # mar/2024: +50% sobre fev (8000 -> 12000), +20% sobre mar/2023 (10000 -> 12000)
+        (2024, 3, 12000, 8000, 10000, 50.0, 20.0, 20000, 1),
+        # abr/2024 vazio: -100% sobre mar, abr/2023 também vazio
+        (2024, 4, 0, 12000, 0, -100.0, None, 20000, 3),
+    ]
+    assert dados['total'] == 20000
+    assert (dados['melhor']['mes'], dados['pior']['mes']) == (3, 4)
+    assert dados['inicio'] == {'ano': 2024, 'mes': 2}
+
+
+def test_acumulado_so_com_doze_meses_de_historico(app):
+    user_id = criar_usuario()
+    _comissoes(user_id, {(2024, 1, 'cobrancas'): 300, (2024, 2, 'cobrancas'): 600})
+    dados = analise.montar(user_id, 2024, 2, meses=2)
+    assert [(l['comissao'], l['crescimento_mes'], l['acumulado_12m']) for l in dados['meses']] == [
+        (300, None, None), (600, 100.0, None)]
+
+
+def test_analise_sem_lancamentos(app, cliente):
+    criar_usuario()
+    entrar(cliente)
+    resp = cliente.get('/geral/analise?ano=2024&mes=6&meses=2')
+    assert resp.status_code == 200
+    dados = resp.get_json()
+    assert [(l['mes'], l['comissao'], l['crescimento_mes'], l['crescimento_ano']) for l in dados['meses']] == [
+        (5, 0, None, None), (6, 0, None, None)]
+    assert dados['total'] == 0
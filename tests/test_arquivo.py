@@ -0,0 +1,72 @@
+from datetime import date
+from sqlalchemy import func, select, text
+from sqlalchemy.schema import CreateTable
+from conftest import criar_usuario, entrar
+from models import db, Vendas, VersaoEsquema, vendas_arquivo, Lancamento
+import arquivo
+import esquema
+import migracoes
+
+ANO_FECHADO = date.today().year - 1
+
+
+def _nova_venda(cliente, data):
+    resp = cliente.post('/vendas', data={'tipo_venda': 'PIX', 'valor_total': '100,00',
+                                         'nome_cliente': 'Cliente', 'data_venda': data.isoformat()})
+    assert resp.status_code == 302
+
+
+def test_ids_nao_sao_reaproveitados_depois_de_arquivar(app, cliente):
+    criar_usuario()
+    entrar(cliente)
+    _nova_venda(cliente, date.today())
+    _nova_venda(cliente, date(ANO_FECHADO, 3, 1))
+    _nova_venda(cliente, date(ANO_FECHADO, 4, 1))
+    assert [v.id for v in Vendas.query.order_by(Vendas.id)] == [1, 2, 3]
+
+    assert arquivo.arquivar_ano(ANO_FECHADO, log=lambda *_: None) == 2
+    _nova_venda(cliente, date.today())
+    db.session.remove()
+    assert [v.id for v in Vendas.query.order_by(Vendas.id)] == [1, 4]
+    assert db.session.query(func.count()).select_from(Lancamento).scalar() == 4
+
+    # Os ids arquivados voltam sem colidir com os novos
+    assert arquivo.restaurar_ano(ANO_FECHADO, log=lambda *_: None) == 2
+    assert [v.id for v in Vendas.query.order_by(Vendas.id)] == [1, 2, 3, 4]
+
+
+def test_migracao_recria_tabela_antiga_com_autoincrement(app):
+    user_id = criar_usuario()
+    tabela = Vendas.__table__
+    antiga = str(CreateTable(tabela).compile(dialect=db.engine.dialect)).replace('AUTOINCREMENT', '')
+    db.session.remove()
+    tabela.drop(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(text(antiga))
+        for index in tabela.indexes:
+            index.create(conn)
+        conn.execute(text("INSERT INTO vendas (id, user_id, nome_cliente, data_venda, tipo_venda, valor_total, "
+                          "comissao_calculada) VALUES (1, :u, 'A', '2020-01-01', 'PIX', 1, 0)"), {'u': user_id})
+        conn.execute(vendas_arquivo.insert().values(id=7, user_id=user_id, nome_cliente='B', data_venda=date(2019, 1, 1),
+                                                    tipo_venda='PIX', valor_total=1, comissao_calculada=0))
+    assert esquema.sqlite_sem_autoincrement(tabela)
+    db.session.query(VersaoEsquema).filter_by(versao=12).delete()
+    db.session.commit()
+
+    # No deploy o passo fica pendente: recriar a tabela bloqueia as escritas
+    mensagens = []
+    migracoes.simular(mensagens.append)
+    assert '  offline: recria vendas (1 linha(s)) com as escritas bloqueadas' in mensagens
+    assert migracoes.aplicar(log=lambda *_: None) == 0
+    assert [m[0] for m in migracoes.pendentes()] == [12]
+
+    assert migracoes.aplicar(log=lambda *_: None, offline=True) == 1
+    assert not esquema.sqlite_sem_autoincrement(tabela)
+    assert db.session.execute(select(Vendas.nome_cliente)).scalars().all() == ['A']
+    indices = {i['name'] for i in db.inspect(db.engine).get_indexes('vendas')}
+    assert {i.name for i in tabela.indexes} <= indices
+    nova = Vendas(user_id=user_id, nome_cliente='C', tipo_venda='PIX', valor_total_centavos=100,
+                  comissao_centavos=0, data_venda=date.today())
+    db.session.add(nova)
+    db.session.commit()
+    assert nova.id == 8
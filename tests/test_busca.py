@@ -0,0 +1,45 @@
+from datetime import date
+import pytest
+from sqlalchemy import inspect, text
+from conftest import criar_usuario
+from models import db, Vendas, Consultas
+import busca
+import lancamentos
+
+NOMES = ['José Álvares', 'Alvaro Lima', 'Maria Salvares', "Ana D'Alvares"]
+
+
+@pytest.fixture
+def clientes(app):
+    user_id = criar_usuario()
+    for i, nome in enumerate(NOMES):
+        db.session.add(Vendas(user_id=user_id, nome_cliente=nome, tipo_venda='PIX', valor_total_centavos=1000,
+                              comissao_centavos=50, data_venda=date(2024, 3, i + 1)))
+    db.session.add(Consultas(user_id=user_id, nome_cliente='Joana Alvares', status='Realizada',
+                             comissao_centavos=30, data_consulta=date(2024, 4, 1)))
+    db.session.commit()
+    lancamentos.reconstruir()
+    db.session.commit()
+    return user_id
+
+
+@pytest.mark.parametrize('termo, esperados', [
+    ('alvares', ['Joana Alvares', "Ana D'Alvares", 'José Álvares']),
+    ('ÁLV', ['Joana Alvares', "Ana D'Alvares", 'Alvaro Lima', 'José Álvares']),
+    ('jose alv', ['José Álvares']),
+    ('lvares', []),
+])
+def test_busca_pelo_comeco_de_qualquer_palavra(clientes, termo, esperados):
+    assert [r['nome_cliente'] for r in busca.buscar(clientes, termo)] == esperados
+
+
+def test_busca_so_do_usuario(clientes):
+    outro = criar_usuario('Outro Vendedor')
+    assert busca.buscar(outro, 'alvares') == []
+
+
+def test_indices_de_busca_das_categorias_removidos(app):
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE INDEX ix_vendas_user_nome_busca ON vendas (user_id, nome_busca)'))
+    busca.remover_indices_das_categorias()
+    assert 'ix_vendas_user_nome_busca' not in {i['name'] for i in inspect(db.engine).get_indexes('vendas')}
@@ -0,0 +1,40 @@
+from datetime import date
+import pytest
+from conftest import criar_usuario, entrar
+from test_consultas_sql import contar_comandos
+from models import db, Vendas
+from cache import cache, SQLiteCompartilhado
+import resumo
+
+
+def test_escrita_de_outro_processo_invalida_o_cache(app, monkeypatch):
+    user_id = criar_usuario()
+    hoje = date.today()
+    calcular = lambda: resumo.total_mes(user_id, hoje.year, hoje.month)
+    assert cache.obter(user_id, 'home', (hoje.year, hoje.month), calcular) == 0
+
+    # O commit acontece "em outro worker": a invalidação local deste processo não roda
+    monkeypatch.setattr(cache, 'invalidar', lambda user_id: None)
+    monkeypatch.setattr(cache, 'limpar', lambda: None)
+    # e a próxima leitura já passou do intervalo em que a geração lida do banco é reaproveitada
+    monkeypatch.setattr(cache, 'intervalo_geracao', 0)
+    item = Vendas(user_id=user_id, nome_cliente='A', tipo_venda='PIX', valor_total_centavos=10000,
+                  comissao_centavos=500, data_venda=hoje)
+    db.session.add(item)
+    resumo.adicionar(item)
+    db.session.commit()
+
+    assert cache.obter(user_id, 'home', (hoje.year, hoje.month), calcular) == 500
+
+
+@pytest.mark.parametrize('backend', ['memoria', 'sqlite'])
+def test_acerto_no_cache_nao_consulta_o_banco(app, cliente, monkeypatch, tmp_path, backend):
+    if backend == 'sqlite':
+        monkeypatch.setattr(cache, 'backend', SQLiteCompartilhado(str(tmp_path / 'cache.db')))
+    criar_usuario()
+    entrar(cliente)
+    for url in ('/', '/geral'):
+        assert cliente.get(url).status_code == 200
+        with contar_comandos() as comandos:
+            assert cliente.get(url).status_code == 200
+        assert comandos == []
@@ -0,0 +1,59 @@
+from datetime import date
+from conftest import criar_usuario
+from models import db, RegraComissao, Vendas, Cobrancas
+from cache import cache, incrementar_geracao, REGRAS
+import comissoes
+import dinheiro
+import resumo
+
+VIRADA = date(2024, 3, 15)
+
+
+def _itens(user_id):
+    # Itens dos dois lados da vigência da nova regra, gravados com a regra antiga
+    for dia in (date(2024, 3, 14), VIRADA, date(2024, 3, 16)):
+        for tipo in comissoes.TIPOS_VENDA:
+            valor = 12345 + dia.day
+            db.session.add(Vendas(user_id=user_id, nome_cliente='A', tipo_venda=tipo, valor_total_centavos=valor,
+                                  comissao_centavos=comissoes.calcular('vendas', dia, valor, tipo), data_venda=dia))
+        db.session.add(Cobrancas(user_id=user_id, nome_cliente='B', valor_negociado_centavos=99999,
+                                 comissao_centavos=comissoes.calcular('cobrancas', dia, 99999), data_negociacao=dia))
+    db.session.commit()
+    resumo.reconstruir()
+    db.session.commit()
+
+
+def test_recalcular_em_sql_igual_ao_calculo_em_python(app):
+    _itens(criar_usuario())
+    runner = app.test_cli_runner()
+    for args in (['--categoria', 'vendas', '--tipo', 'PIX', '--taxa', '0.25'],
+                 ['--categoria', 'vendas', '--taxa', '0.1'],
+                 ['--categoria', 'cobrancas', '--taxa', '0.045']):
+        resultado = runner.invoke(args=['nova-regra', '--modo', 'percentual', '--desde', VIRADA.isoformat(), *args])
+        assert resultado.exit_code == 0, resultado.output
+    resultado = runner.invoke(args=['recalcular', '--inicio', '2024-03-01', '--fim', '2024-03-31'])
+    assert resultado.exit_code == 0, resultado.output
+
+    db.session.expire_all()
+    vendas = Vendas.query.all()
+    assert [v.comissao_centavos for v in vendas] == [
+        comissoes.calcular('vendas', v.data_venda, v.valor_total_centavos, v.tipo_venda) for v in vendas]
+    cobrancas = Cobrancas.query.all()
+    assert [c.comissao_centavos for c in cobrancas] == [
+        comissoes.calcular('cobrancas', c.data_negociacao, c.valor_negociado_centavos) for c in cobrancas]
+    # A nova regra geral de vendas não vale para o PIX, que tem a sua
+    assert [v.comissao_centavos for v in vendas if v.data_venda >= VIRADA and v.tipo_venda == 'PIX'] == [
+        dinheiro.dividir(v.valor_total_centavos * 2500, 10000) for v in vendas
+        if v.data_venda >= VIRADA and v.tipo_venda == 'PIX']
+    assert resumo.verificar() == []
+
+
+def test_regra_cadastrada_em_outro_processo(app, monkeypatch):
+    assert comissoes.calcular('cobrancas', VIRADA, 10000) == 300
+    monkeypatch.setattr(cache, 'intervalo_geracao', 0)
+    # Outro processo grava a regra; este não passa por invalidar_cache()
+    db.session.add(RegraComissao(categoria='cobrancas', modo='percentual', taxa=0.05, divisor=1,
+                                 vigente_desde=VIRADA))
+    incrementar_geracao(db.session, [REGRAS])
+    db.session.commit()
+    assert comissoes.calcular('cobrancas', VIRADA, 10000) == 500
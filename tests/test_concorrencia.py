@@ -0,0 +1,57 @@
+import threading
+from datetime import date
+from sqlalchemy import func, text
+from conftest import criar_usuario, entrar
+from models import db, Vendas
+import resumo
+
+ESCRITORES = 4
+LEITORES = 4
+VENDAS_POR_ESCRITOR = 25
+LEITURAS_POR_LEITOR = 40
+
+
+def test_leituras_e_escritas_simultaneas_no_sqlite_wal(app):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    criar_usuario()
+    clientes = [app.test_client() for _ in range(ESCRITORES + LEITORES)]
+    for cliente in clientes:
+        entrar(cliente)
+    erros = []
+    largada = threading.Barrier(len(clientes))
+
+    def escritor(cliente, n):
+        largada.wait()
+        try:
+            for i in range(VENDAS_POR_ESCRITOR):
+                resp = cliente.post('/vendas', data={'tipo_venda': 'PIX', 'valor_total': '100,00',
+                                                     'nome_cliente': f'Cliente {n}-{i}',
+                                                     'data_venda': date.today().isoformat()})
+                if resp.status_code != 302:
+                    erros.append(f'POST /vendas: {resp.status_code}')
+        except Exception as e:  # OperationalError ("database is locked") sobe pelo test client
+            erros.append(repr(e))
+
+    def leitor(cliente):
+        largada.wait()
+        try:
+            for i in range(LEITURAS_POR_LEITOR):
+                url = ('/', '/geral', '/vendas')[i % 3]
+                resp = cliente.get(url)
+                if resp.status_code != 200:
+                    erros.append(f'GET {url}: {resp.status_code}')
+        except Exception as e:
+            erros.append(repr(e))
+
+    threads = [threading.Thread(target=escritor, args=(c, n)) for n, c in enumerate(clientes[:ESCRITORES])]
+    threads += [threading.Thread(target=leitor, args=(c,)) for c in clientes[ESCRITORES:]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert erros == []
+    db.session.remove()
+    assert db.session.query(func.count(Vendas.id)).scalar() == ESCRITORES * VENDAS_POR_ESCRITOR
+    assert resumo.verificar() == []
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import event, insert
+from conftest import criar_usuario, entrar
+from models import db, Vendas, Cobrancas, Consultas, Procedimentos
+from cache import cache
+import lancamentos
+import resumo
+
+_PASSADO = date.today() - timedelta(days=60)
+
+# Nº de comandos SQL por tela, sem o cache: fixo, não cresce com o número de itens (sem N+1).
+# /geral: uma consulta do relatório (resumo e histórico) e uma do detalhamento do mês.
+TELAS = {'/': 1, '/geral': 2, f'/geral?ano={_PASSADO.year}&mes={_PASSADO.month}': 2,
+         '/vendas': 2, '/cobrancas': 2, '/consultas': 2, '/procedimentos': 2,
+         '/vendas/mais': 1, '/buscar?q=cliente': 1}
+
+
+@contextmanager
+def contar_comandos():
+    comandos = []
+
+    def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+        comandos.append(sql)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        yield comandos
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+
+def _popular(user_id, qtd):
+    hoje = date.today()
+    comuns = lambda i: {'user_id': user_id, 'nome_cliente': f'Cliente {i}', 'comissao_centavos': 100}
+    db.session.execute(insert(Vendas), [dict(comuns(i), tipo_venda='PIX', valor_total_centavos=1000,
+                                             data_venda=hoje - timedelta(days=i % 90)) for i in range(qtd)])
+    db.session.execute(insert(Cobrancas), [dict(comuns(i), valor_negociado_centavos=1000,
+                                                data_negociacao=hoje - timedelta(days=i % 90)) for i in range(qtd)])
+    db.session.execute(insert(Consultas), [dict(comuns(i), status='Realizada',
+                                                data_consulta=hoje - timedelta(days=i % 90)) for i in range(qtd)])
+    db.session.execute(insert(Procedimentos), [dict(comuns(i), tipo_procedimento='Cirurgia',
+                                                    data_procedimento=hoje - timedelta(days=i % 90)) for i in range(qtd)])
+    db.session.commit()
+    resumo.reconstruir()
+    lancamentos.reconstruir()
+    db.session.commit()
+
+
+def _comandos(cliente, url):
+    with contar_comandos() as comandos:
+        resp = cliente.get(url)
+    assert resp.status_code == 200
+    return len(comandos)
+
+
+@pytest.mark.parametrize('url', list(TELAS))
+def test_comandos_sql_por_tela_nao_crescem_com_os_itens(app, cliente, monkeypatch, url):
+    monkeypatch.setattr(cache, 'backend', None)
+    user_id = criar_usuario()
+    entrar(cliente)
+    _popular(user_id, 5)
+    poucos = _comandos(cliente, url)
+    _popular(user_id, 200)
+    muitos = _comandos(cliente, url)
+    assert muitos == poucos == TELAS[url]
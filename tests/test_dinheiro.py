@@ -0,0 +1,45 @@
+import io
+import pytest
+from conftest import criar_usuario
+from models import Cobrancas, Vendas
+import dinheiro
+import importacao
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('1.234,56', 123456), ('1234,56', 123456), ('R$ 1.234,5', 123450), ('1.234.567,89', 123456789),
+    ('1234.56', 123456), ('-1.234,56', -123456), (1234.5, 123450), ('0,005', 1), (1.234, 123),
+    ('1234.567', 123457), ('12.34', 1234), ('1.5', 150),
+])
+def test_centavos(valor, esperado):
+    assert dinheiro.centavos(valor) == esperado
+
+
+@pytest.mark.parametrize('valor', ['1,234.56', '1.234.56,7', '12.34,56', '1.2345,67', ',5.1', 'abc', '',
+                                   '1.234', 'R$ 1.234', '-1.234', '1.234.567'])
+def test_centavos_recusa_formatos_ambiguos(valor):
+    with pytest.raises(ValueError):
+        dinheiro.centavos(valor)
+
+
+def test_importacao_reporta_valor_no_formato_americano(app):
+    user_id = criar_usuario()
+    csv = ('nome_cliente;data_venda;tipo_venda;valor_total\n'
+           'Ana;2024-03-01;PIX;1.234,56\n'
+           'Bia;2024-03-02;PIX;"1,234.56"\n').encode()
+    inseridos, erros = importacao.importar_arquivo('vendas', user_id, io.BytesIO(csv), 'vendas.csv')
+    assert inseridos == 1
+    assert [numero for numero, _ in erros] == [3]
+    assert [v.valor_total_centavos for v in Vendas.query] == [123456]
+
+
+def test_importacao_recusa_valor_negativo_e_ambiguo(app):
+    user_id = criar_usuario()
+    csv = ('nome_cliente;data_negociacao;valor_negociado\n'
+           'Ana;2024-03-01;-100,00\n'
+           'Bia;2024-03-02;1.234\n'
+           'Cida;2024-03-03;R$ 1.234,00\n').encode()
+    inseridos, erros = importacao.importar_arquivo('cobrancas', user_id, io.BytesIO(csv), 'cobrancas.csv')
+    assert inseridos == 1
+    assert [numero for numero, _ in erros] == [2, 3]
+    assert [c.valor_negociado_centavos for c in Cobrancas.query] == [123400]
@@ -0,0 +1,115 @@
+from datetime import date
+import pytest
+from conftest import criar_usuario, entrar
+from models import db, Lancamento, Vendas, Cobrancas, Consultas, Procedimentos
+import comissoes
+import em_lote
+import lancamentos
+import resumo
+
+MESES = (date(2024, 1, 10), date(2024, 2, 20), date(2024, 3, 5))
+
+
+def _criar(user_id, categoria, data, i):
+    if categoria == 'vendas':
+        tipo = comissoes.TIPOS_VENDA[i % 3]
+        valor = 10000 + i * 111
+        return Vendas(user_id=user_id, nome_cliente=f'Cliente {i}', tipo_venda=tipo, data_venda=data,
+                      valor_total_centavos=valor, comissao_centavos=comissoes.calcular('vendas', data, valor, tipo))
+    if categoria == 'cobrancas':
+        valor = 50000 + i * 333
+        return Cobrancas(user_id=user_id, nome_cliente=f'Cliente {i}', data_negociacao=data,
+                         valor_negociado_centavos=valor, comissao_centavos=comissoes.calcular('cobrancas', data, valor))
+    if categoria == 'consultas':
+        return Consultas(user_id=user_id, nome_cliente=f'Cliente {i}', status='Realizada', data_consulta=data,
+                         comissao_centavos=comissoes.calcular('consultas', data))
+    return Procedimentos(user_id=user_id, nome_cliente=f'Cliente {i}', tipo_procedimento='Cirurgia',
+                         data_procedimento=data, comissao_centavos=comissoes.calcular('procedimentos', data))
+
+
+@pytest.fixture
+def itens(app):
+    """{(user_id, categoria): [ids]} com itens em três meses para dois usuários."""
+    donos = [criar_usuario(), criar_usuario('Outro Vendedor')]
+    criados = {}
+    for user_id in donos:
+        for categoria in resumo.CATEGORIAS:
+            lista = [_criar(user_id, categoria, MESES[i % 3], i) for i in range(6)]
+            db.session.add_all(lista)
+            db.session.flush()
+            criados[(user_id, categoria)] = [item.id for item in lista]
+    db.session.commit()
+    resumo.reconstruir()
+    lancamentos.reconstruir()
+    db.session.commit()
+    return criados
+
+
+def _consistente():
+    db.session.expire_all()
+    assert resumo.verificar() == []
+    assert lancamentos.verificar() == []
+
+
+def _no_livro(categoria, item):
+    modelo, col_data, _ = resumo.CATEGORIAS[categoria]
+    return db.session.query(Lancamento.data, Lancamento.comissao_centavos).filter_by(
+        categoria=categoria, item_id=item.id).one() == (getattr(item, col_data), item.comissao_centavos)
+
+
+@pytest.mark.parametrize('categoria', list(resumo.CATEGORIAS))
+def test_excluir_em_lote_entre_meses(itens, categoria):
+    dono, outro = sorted({u for u, _ in itens})
+    modelo = resumo.CATEGORIAS[categoria][0]
+    meus = itens[(dono, categoria)]
+    # Ids de outro usuário são ignorados
+    assert em_lote.excluir(categoria, dono, meus[:4] + itens[(outro, categoria)][:2]) == 4
+    assert sorted(i for (i,) in db.session.query(modelo.id).filter_by(user_id=dono)) == meus[4:]
+    assert db.session.query(modelo.id).filter_by(user_id=outro).count() == 6
+    _consistente()
+
+
+@pytest.mark.parametrize('categoria, campos', [
+    ('vendas', {'data_venda': '2024-04-02', 'tipo_venda': 'Talão'}),
+    ('vendas', {'tipo_venda': 'PIX'}),
+    ('cobrancas', {'data_negociacao': '2024-04-02', 'nome_cliente': 'Novo Nome'}),
+    ('consultas', {'data_consulta': '2023-12-31'}),
+    ('procedimentos', {'data_procedimento': '2024-02-29', 'tipo_procedimento': 'Exame'}),
+])
+def test_atualizar_em_lote_entre_meses(itens, categoria, campos):
+    dono, outro = sorted({u for u, _ in itens})
+    # Regra nova a partir de abril: mudar a data também muda a comissão
+    comissoes.adicionar_regra(categoria, None, 'percentual' if categoria in ('vendas', 'cobrancas') else 'fixo',
+                              0.07 if categoria in ('vendas', 'cobrancas') else 35, date(2024, 4, 1))
+    modelo, col_data, col_bruto = resumo.CATEGORIAS[categoria]
+    ids = itens[(dono, categoria)][:5] + itens[(outro, categoria)][:1]
+    assert em_lote.atualizar(categoria, dono, ids, campos) == 5
+
+    db.session.expire_all()
+    for item in db.session.query(modelo).filter(modelo.id.in_(ids)):
+        if item.user_id == outro:
+            assert getattr(item, col_data) in MESES
+            continue
+        for campo, texto in campos.items():
+            assert str(getattr(item, campo)) == texto
+        tipo = getattr(item, comissoes.COLUNA_TIPO[categoria]) if comissoes.COLUNA_TIPO[categoria] else None
+        valor = getattr(item, col_bruto) if col_bruto else 0
+        assert item.comissao_centavos == comissoes.calcular(categoria, getattr(item, col_data), valor, tipo)
+        assert _no_livro(categoria, item)
+    _consistente()
+
+
+def test_lote_pela_tela(itens, cliente):
+    dono = min(u for u, _ in itens)
+    entrar(cliente)
+    ids = itens[(dono, 'vendas')]
+    resp = cliente.post('/vendas/lote', data={'acao': 'editar', 'ids': ids[:3], 'data_venda': '2024-05-01'},
+                        headers={'Accept': 'application/json'})
+    assert resp.get_json() == {'afetados': 3}
+    resp = cliente.post('/vendas/lote', data={'acao': 'excluir', 'ids': ids[2:]},
+                        headers={'Accept': 'application/json'})
+    assert resp.get_json() == {'afetados': 4}
+    resp = cliente.post('/vendas/lote', data={'acao': 'editar', 'ids': ids[:1]},
+                        headers={'Accept': 'application/json'})
+    assert resp.status_code == 400
+    _consistente()
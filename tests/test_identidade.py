@@ -0,0 +1,43 @@
+from conftest import criar_usuario, entrar
+from models import db, User
+import identidade
+
+NOVA_SENHA = 'outra-senha'
+
+
+def _trocar_senha_em_outro_worker(user_id):
+    # Commit feito por outro processo: o cache de versões deste não fica sabendo
+    user = db.session.get(User, user_id)
+    user.set_password(NOVA_SENHA)
+    db.session.commit()
+    return user.versao_sessao
+
+
+def test_login_depois_de_trocar_senha_em_outro_worker(app, cliente):
+    user_id = criar_usuario()
+    entrar(cliente)
+    versao_antiga = identidade._versoes.get(user_id)[0]
+    assert _trocar_senha_em_outro_worker(user_id) == versao_antiga + 1
+
+    entrar(cliente, senha=NOVA_SENHA)
+    assert identidade._versoes.get(user_id)[0] == versao_antiga + 1
+    assert cliente.get('/').status_code == 200
+
+
+def test_sessao_nova_aceita_em_worker_com_versao_antiga_no_cache(app, cliente):
+    user_id = criar_usuario()
+    versao_antiga = db.session.get(User, user_id).versao_sessao
+    _trocar_senha_em_outro_worker(user_id)
+    entrar(cliente, senha=NOVA_SENHA)
+    # A próxima requisição cai num worker que guardou a versão anterior
+    identidade._versoes.set(user_id, versao_antiga, 'Vendedor Teste')
+    assert cliente.get('/').status_code == 200
+
+
+def test_sessao_antiga_continua_recusada(app, cliente):
+    user_id = criar_usuario()
+    entrar(cliente)
+    _trocar_senha_em_outro_worker(user_id)
+    identidade.senha_alterada(db.session.get(User, user_id))
+    resp = cliente.get('/')
+    assert resp.status_code == 302 and '/login' in resp.headers['Location']
@@ -0,0 +1,104 @@
+from datetime import date
+from sqlalchemy import select, text
+from conftest import criar_usuario
+from models import db, ResumoMensal, Vendas
+import migracoes
+import resumo
+
+# resumo_mensal como a versão anterior criava (totais em reais)
+RESUMO_ANTIGO = '''CREATE TABLE resumo_mensal (
+    id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), ano INTEGER NOT NULL,
+    mes INTEGER NOT NULL, categoria VARCHAR(20) NOT NULL, qtd INTEGER NOT NULL, bruto NUMERIC(14, 2) NOT NULL,
+    comissao NUMERIC(14, 2) NOT NULL, CONSTRAINT uq_resumo_mensal UNIQUE (user_id, ano, mes, categoria))'''
+
+# Gravação de um processo da versão anterior durante o deploy
+SOMA_ANTIGA = '''INSERT INTO resumo_mensal (user_id, ano, mes, categoria, qtd, bruto, comissao)
+    VALUES (:u, 2024, 3, 'vendas', 1, 10.5, 0.5)
+    ON CONFLICT (user_id, ano, mes, categoria) DO UPDATE
+    SET qtd = qtd + excluded.qtd, bruto = bruto + excluded.bruto, comissao = comissao + excluded.comissao'''
+
+
+def test_resumo_em_centavos_sem_recriar_a_tabela(app):
+    user_id = criar_usuario()
+    db.session.remove()
+    ResumoMensal.__table__.drop(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(text(RESUMO_ANTIGO))
+        conn.execute(text("INSERT INTO resumo_mensal VALUES (7, :u, 2024, 3, 'vendas', 2, 1234.56, 61.73)"),
+                     {'u': user_id})
+
+    migracoes._dinheiro_em_centavos()
+
+    linha = db.session.get(ResumoMensal, 7)
+    assert (linha.qtd, linha.bruto_centavos, linha.comissao_centavos) == (2, 123456, 6173)
+    assert float(linha.bruto) == 1234.56
+
+    # Processos antigos continuam gravando; os novos mantêm as duas versões dos totais
+    with db.engine.begin() as conn:
+        conn.execute(text(SOMA_ANTIGA), {'u': user_id})
+    item = Vendas(user_id=user_id, nome_cliente='A', tipo_venda='PIX', valor_total_centavos=1000,
+                  comissao_centavos=50, data_venda=date(2024, 3, 10))
+    db.session.add(item)
+    resumo.adicionar(item)
+    db.session.commit()
+    db.session.remove()
+    bruto, comissao = db.session.execute(select(ResumoMensal.bruto, ResumoMensal.comissao)
+                                         .where(ResumoMensal.id == 7)).one()
+    assert (float(bruto), float(comissao)) == (1255.06, 62.73)
+
+
+def test_reconstruir_grava_as_colunas_antigas(app):
+    user_id = criar_usuario()
+    db.session.add(Vendas(user_id=user_id, nome_cliente='A', tipo_venda='PIX', valor_total_centavos=123456,
+                          comissao_centavos=6173, data_venda=date(2024, 3, 10)))
+    db.session.commit()
+    resumo.reconstruir()
+    linha = ResumoMensal.query.one()
+    assert (linha.bruto_centavos, linha.comissao_centavos) == (123456, 6173)
+    assert (float(linha.bruto), float(linha.comissao)) == (1234.56, 61.73)
+
+
+# Esquema da primeira versão do sistema (sem centavos, resumo, livro ou versões de migração)
+ESQUEMA_ORIGINAL = [
+    '''CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(150) NOT NULL UNIQUE,
+        full_name VARCHAR(200) NOT NULL, password_hash VARCHAR(256) NOT NULL)''',
+    '''CREATE TABLE vendas (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        nome_cliente VARCHAR(150) NOT NULL, data_venda DATE NOT NULL, tipo_venda VARCHAR(50) NOT NULL,
+        valor_total NUMERIC(10, 2) NOT NULL, comissao_calculada NUMERIC(10, 2) NOT NULL)''',
+    '''CREATE TABLE cobrancas (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        nome_cliente VARCHAR(150) NOT NULL, data_negociacao DATE NOT NULL, valor_negociado NUMERIC(10, 2) NOT NULL,
+        comissao_calculada NUMERIC(10, 2) NOT NULL)''',
+    '''CREATE TABLE consultas (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        nome_cliente VARCHAR(150) NOT NULL, data_consulta DATE NOT NULL, status VARCHAR(50),
+        comissao_calculada NUMERIC(10, 2) NOT NULL)''',
+    '''CREATE TABLE procedimentos (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        nome_cliente VARCHAR(150) NOT NULL, data_procedimento DATE NOT NULL, tipo_procedimento VARCHAR(100),
+        comissao_calculada NUMERIC(10, 2) NOT NULL)''',
+]
+
+DADOS_ORIGINAIS = [
+    "INSERT INTO users VALUES (1, 'Ana', 'Ana', 'x')",
+    "INSERT INTO vendas VALUES (1, 1, 'Cliente A', '2024-03-05', 'PIX', 1000.00, 50.00)",
+    "INSERT INTO vendas VALUES (2, 1, 'Cliente B', '2024-04-01', 'Boleto', 250.50, 12.53)",
+    "INSERT INTO cobrancas VALUES (1, 1, 'Cliente C', '2024-03-20', 800.00, 40.00)",
+    "INSERT INTO consultas VALUES (1, 1, 'Cliente D', '2024-03-21', 'Realizada', 30.00)",
+    "INSERT INTO procedimentos VALUES (1, 1, 'Cliente E', '2023-12-31', 'Cirurgia', 150.00)",
+]
+
+
+def test_migrar_banco_da_primeira_versao_preserva_os_totais(app):
+    db.session.remove()
+    db.drop_all()
+    with db.engine.begin() as conn:
+        for sql in ESQUEMA_ORIGINAL + DADOS_ORIGINAIS:
+            conn.execute(text(sql))
+
+    migracoes.aplicar(log=lambda *_: None)
+
+    assert resumo.verificar() == []
+    totais = {(r.ano, r.mes, r.categoria): (r.qtd, r.bruto_centavos, r.comissao_centavos)
+              for r in ResumoMensal.query}
+    assert totais == {(2024, 3, 'vendas'): (1, 100000, 5000), (2024, 4, 'vendas'): (1, 25050, 1253),
+                      (2024, 3, 'cobrancas'): (1, 80000, 4000), (2024, 3, 'consultas'): (1, 0, 3000),
+                      (2023, 12, 'procedimentos'): (1, 0, 15000)}
+    assert resumo.total_mes(1, 2024, 3) == 12000
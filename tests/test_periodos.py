@@ -0,0 +1,29 @@
+import pytest
+from conftest import criar_usuario, entrar
+
+ADMIN = 'Lusiane Gomes Simão'
+
+
+@pytest.mark.parametrize('url', ['/geral?mes=13&ano=2024', '/geral?mes=-1&ano=2024', '/geral?mes=1&ano=10000',
+                                 '/exportar?mes=13&ano=2024', '/exportar?ano=10000', '/exportar?fim=9999-12-31'])
+def test_periodo_invalido_responde_400(app, cliente, url):
+    criar_usuario()
+    entrar(cliente)
+    resp = cliente.get(url)
+    resp.close()
+    assert resp.status_code == 400
+
+
+def test_periodo_invalido_na_equipe_responde_400(app, cliente):
+    criar_usuario(ADMIN)
+    entrar(cliente, ADMIN)
+    assert cliente.get('/admin/equipe?mes=13&ano=2024').status_code == 400
+    assert cliente.get('/admin/equipe/1?inicio=2024-01-01&fim=9999-12-30').status_code == 400
+    assert cliente.get('/admin/equipe?mes=12&ano=2024').status_code == 200
+
+
+def test_geral_sem_filtro_usa_o_mes_atual(app, cliente):
+    criar_usuario()
+    entrar(cliente)
+    assert cliente.get('/geral').status_code == 200
+    assert cliente.get('/geral?mes=12&ano=2024').status_code == 200
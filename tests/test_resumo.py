@@ -0,0 +1,82 @@
+from datetime import date
+from sqlalchemy import delete, insert, update
+from conftest import criar_usuario
+from models import db, ResumoMensal, Vendas, Cobrancas, Consultas, Procedimentos, consultas_arquivo
+import resumo
+
+
+def _itens(ana, bia):
+    db.session.execute(insert(Vendas), [
+        {'user_id': ana, 'nome_cliente': 'A', 'tipo_venda': 'PIX', 'data_venda': date(2024, 1, 31),
+         'valor_total_centavos': 10000, 'comissao_centavos': 167},
+        {'user_id': ana, 'nome_cliente': 'B', 'tipo_venda': 'Talão', 'data_venda': date(2024, 1, 2),
+         'valor_total_centavos': 2550, 'comissao_centavos': 1275},
+        {'user_id': ana, 'nome_cliente': 'C', 'tipo_venda': 'Cartão', 'data_venda': date(2024, 2, 1),
+         'valor_total_centavos': 9999, 'comissao_centavos': 500},
+        {'user_id': bia, 'nome_cliente': 'D', 'tipo_venda': 'PIX', 'data_venda': date(2024, 1, 15),
+         'valor_total_centavos': 1200, 'comissao_centavos': 20},
+    ])
+    db.session.execute(insert(Cobrancas), [
+        {'user_id': ana, 'nome_cliente': 'E', 'data_negociacao': date(2023, 12, 31),
+         'valor_negociado_centavos': 50000, 'comissao_centavos': 1500},
+    ])
+    db.session.execute(insert(Consultas), [
+        {'user_id': ana, 'nome_cliente': 'F', 'status': 'Realizada', 'data_consulta': date(2024, 1, 10),
+         'comissao_centavos': 2000},
+    ])
+    # Ano arquivado: continua no resumo
+    db.session.execute(insert(consultas_arquivo), [
+        {'id': 99, 'user_id': ana, 'nome_cliente': 'G', 'status': 'Realizada', 'data_consulta': date(2022, 5, 5),
+         'comissao_centavos': 2000, 'comissao_calculada': 20},
+    ])
+    db.session.execute(insert(Procedimentos), [
+        {'user_id': bia, 'nome_cliente': 'H', 'tipo_procedimento': 'Cirurgia', 'data_procedimento': date(2024, 2, 29),
+         'comissao_centavos': 20000},
+    ])
+    db.session.commit()
+
+
+def _resumo():
+    return {(r.user_id, r.ano, r.mes, r.categoria): (r.qtd, r.bruto_centavos, r.comissao_centavos)
+            for r in ResumoMensal.query}
+
+
+def test_reconstruir_e_verificar_com_categorias_e_meses(app):
+    ana, bia = criar_usuario(), criar_usuario('Bia')
+    _itens(ana, bia)
+    assert len(resumo.verificar()) == 7  # resumo ainda vazio
+
+    resumo.reconstruir()
+
+    assert resumo.verificar() == []
+    assert _resumo() == {
+        (ana, 2024, 1, 'vendas'): (2, 12550, 1442),
+        (ana, 2024, 2, 'vendas'): (1, 9999, 500),
+        (ana, 2023, 12, 'cobrancas'): (1, 50000, 1500),
+        (ana, 2024, 1, 'consultas'): (1, 0, 2000),
+        (ana, 2022, 5, 'consultas'): (1, 0, 2000),
+        (bia, 2024, 1, 'vendas'): (1, 1200, 20),
+        (bia, 2024, 2, 'procedimentos'): (1, 0, 20000),
+    }
+    assert resumo.total_mes(ana, 2024, 1) == 3442
+
+
+def test_verificar_aponta_divergencias_e_reconstruir_por_usuario(app):
+    ana, bia = criar_usuario(), criar_usuario('Bia')
+    _itens(ana, bia)
+    resumo.reconstruir()
+    db.session.execute(update(ResumoMensal).where(ResumoMensal.user_id == ana, ResumoMensal.mes == 2)
+                       .values(comissao_centavos=0))
+    db.session.execute(delete(ResumoMensal).where(ResumoMensal.user_id == bia, ResumoMensal.mes == 1))
+    db.session.commit()
+
+    assert resumo.verificar() == [
+        ((ana, 2024, 2, 'vendas'), (1, 9999, 500), (1, 9999, 0)),
+        ((bia, 2024, 1, 'vendas'), (1, 1200, 20), None),
+    ]
+    assert resumo.verificar(bia) == [((bia, 2024, 1, 'vendas'), (1, 1200, 20), None)]
+
+    resumo.reconstruir(bia)
+    assert resumo.verificar() == [((ana, 2024, 2, 'vendas'), (1, 9999, 500), (1, 9999, 0))]
+    resumo.reconstruir(ana)
+    assert resumo.verificar() == []
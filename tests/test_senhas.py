@@ -0,0 +1,27 @@
+import pytest
+from werkzeug.security import generate_password_hash
+import senhas
+
+
+@pytest.mark.parametrize('metodo', [None, 'scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512',
+                                    'pbkdf2:sha256:1000'])
+def test_prefixo_igual_ao_gravado_pelo_werkzeug(metodo):
+    gerado = generate_password_hash('x', method=metodo) if metodo else generate_password_hash('x')
+    assert senhas._prefixo(metodo) == gerado.split('$', 1)[0]
+
+
+@pytest.mark.parametrize('metodo', ['bcrypt', 'scrypt:1:2', 'pbkdf2:sha256:1000:3'])
+def test_prefixo_de_metodo_invalido(metodo):
+    with pytest.raises(ValueError):
+        senhas._prefixo(metodo)
+
+
+def test_configurar_nao_calcula_hash(monkeypatch):
+    monkeypatch.setattr(senhas, 'generate_password_hash', pytest.fail)
+    metodo = senhas._config['metodo']
+    try:
+        senhas.configurar(metodo='scrypt:16384:8:1')
+        assert not senhas.precisa_rehash('scrypt:16384:8:1$sal$hash')
+        assert senhas.precisa_rehash('pbkdf2:sha256:1000$sal$hash')
+    finally:
+        senhas.configurar(metodo=metodo)
@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import update
+from conftest import criar_usuario, entrar
+from models import db, Vendas
+import comissoes
+import resumo
+import sincronizacao
+
+
+def _venda(user_id, cliente='Cliente'):
+    item = Vendas(user_id=user_id, nome_cliente=cliente, tipo_venda='PIX', valor_total_centavos=1000,
+                  comissao_centavos=0, data_venda=date.today())
+    db.session.add(item)
+    resumo.adicionar(item)
+    return item
+
+
+def _envelhecer(dias):
+    db.session.execute(update(Vendas).values(atualizado_em=datetime.utcnow() - timedelta(days=dias)))
+    db.session.commit()
+
+
+def test_vendedor_sem_mudancas_nao_recebe_cursor_expirado(app, cliente):
+    user_id = criar_usuario()
+    entrar(cliente)
+    _venda(user_id, 'A')
+    _venda(user_id, 'B')
+    db.session.commit()
+    _envelhecer(40)
+
+    # Sincronização do zero em páginas de 1: todos os registros têm mais de RETENCAO
+    primeira = cliente.get('/api/sync?limite=1').get_json()
+    assert primeira['mais'] and len(primeira['itens']) == 1
+    segunda = cliente.get(f'/api/sync?limite=1&cursor={primeira["cursor"]}')
+    assert segunda.status_code == 200
+    dados = segunda.get_json()
+    assert not dados['mais'] and [i['nome_cliente'] for i in dados['itens']] == ['B']
+
+    # Sem mudanças: o cursor avança até a janela atual e continua válido
+    delta = cliente.get(f'/api/sync?cursor={dados["cursor"]}')
+    assert delta.status_code == 200
+    assert delta.get_json()['itens'] == []
+    _, _, _, base = sincronizacao.decodificar_cursor(delta.get_json()['cursor'])
+    assert base > datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_cursor_com_base_antiga_expira(app, cliente):
+    criar_usuario()
+    entrar(cliente)
+    antigo = datetime.utcnow() - sincronizacao.RETENCAO - timedelta(days=1)
+    cursor = sincronizacao.codificar_cursor(antigo, sincronizacao.FIM_DA_JANELA, 0, antigo)
+    assert cliente.get(f'/api/sync?cursor={cursor}').status_code == 410
+
+
+def test_transacao_longa_e_carimbada_no_commit(app, monkeypatch):
+    monkeypatch.setattr(sincronizacao, 'MARGEM', timedelta(seconds=1))
+    user_id = criar_usuario()
+    cedo = datetime.utcnow() - timedelta(seconds=30)
+
+    item = _venda(user_id)
+    db.session.flush()
+    # Transação que começou e gravou há 30 s (ex.: importação grande) e só agora faz commit
+    db.session.info['inicio_transacao'] = cedo
+    db.session.execute(update(Vendas).where(Vendas.id == item.id).values(atualizado_em=cedo))
+    # Um aparelho sincronizou no meio dela, sem ver a linha ainda não confirmada
+    cursor = sincronizacao.codificar_cursor(cedo + timedelta(seconds=10), sincronizacao.FIM_DA_JANELA, 0,
+                                            cedo + timedelta(seconds=10))
+    antes_do_commit = datetime.utcnow()
+    db.session.commit()
+
+    assert db.session.get(Vendas, item.id).atualizado_em >= antes_do_commit
+    monkeypatch.setattr(sincronizacao, 'MARGEM', timedelta(0))
+    dados = sincronizacao.mudancas(user_id, cursor)
+    assert [i['id'] for i in dados['itens']] == [item.id]
+
+
+def test_carimbo_so_nos_donos_dos_itens_alterados(app, monkeypatch):
+    monkeypatch.setattr(sincronizacao, 'MARGEM', timedelta(seconds=1))
+    donos = [criar_usuario(), criar_usuario('Outro Vendedor'), criar_usuario('Terceiro Vendedor')]
+    itens = [_venda(user_id) for user_id in donos]
+    db.session.commit()
+    ids = [item.id for item in itens]
+    cedo = datetime.utcnow() - timedelta(seconds=30)
+    # O item do terceiro, fora do período, foi gravado por outra transação durante a nossa
+    db.session.execute(update(Vendas).where(Vendas.id == ids[2])
+                       .values(data_venda=date(2000, 1, 1), atualizado_em=cedo + timedelta(seconds=5)))
+    db.session.commit()
+
+    # Recálculo de todos os usuários que começou há 30 s
+    db.session.connection()
+    db.session.info['inicio_transacao'] = cedo
+    hoje = date.today()
+    comissoes.recalcular_periodo(hoje, hoje + timedelta(days=1))
+    db.session.execute(update(Vendas).where(Vendas.id.in_(ids[:2])).values(atualizado_em=cedo))
+    antes_do_commit = datetime.utcnow()
+    db.session.commit()
+
+    carimbos = dict(db.session.query(Vendas.id, Vendas.atualizado_em))
+    assert all(carimbos[i] >= antes_do_commit for i in ids[:2])
+    assert carimbos[ids[2]] == cedo + timedelta(seconds=5)
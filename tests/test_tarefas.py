@@ -0,0 +1,30 @@
+from datetime import date
+from conftest import criar_usuario, entrar
+from models import db, Tarefa, Cobrancas
+import resumo
+import tarefas
+
+
+def test_exportacao_em_segundo_plano(app, cliente):
+    user_id = criar_usuario()
+    # O resumo conta o mês inteiro (5 itens); o período pedido tem 3
+    for dia in (date(2024, 3, 5), date(2024, 3, 10), date(2024, 3, 20), date(2024, 3, 31), date(2024, 4, 1)):
+        db.session.add(Cobrancas(user_id=user_id, nome_cliente='Ana', valor_negociado_centavos=1000,
+                                 comissao_centavos=30, data_negociacao=dia))
+    db.session.commit()
+    resumo.reconstruir()
+    db.session.commit()
+    entrar(cliente)
+
+    resp = cliente.post('/tarefas', data={'tipo': 'exportacao', 'inicio': '2024-03-10', 'fim': '2024-03-31'},
+                        headers={'Accept': 'application/json'})
+    assert resp.status_code == 202
+    tarefas.executar(tarefas.reservar('teste'))
+
+    item = db.session.get(Tarefa, resp.get_json()['id'])
+    db.session.refresh(item)
+    assert item.status == 'concluida'
+    assert item.mensagem == '3 linhas exportadas'
+    assert item.arquivo.endswith('comissoes_todas_2024-03-10_2024-03-31.csv')
+    with open(tarefas.caminho_arquivo(item), encoding='utf-8') as arquivo:
+        assert len(arquivo.read().splitlines()) == 1 + 3